@@ -1,109 +1,367 @@
 from __future__ import annotations
 
 import argparse
+import os
 import sys
 
-from lib.openai_client import responses_create, output_text
-from lib import render
-from experiments.cfg_math import run_cfg_math, default_math_cases
-from experiments.cfg_sql import run_cfg_sql, default_sql_cases
-from datetime import datetime
+from dataclasses import asdict
 from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Optional, Tuple
 import time
-from tqdm import tqdm
+
+from lib.pricing import Budget, Spend, load_prices, price_for
+from lib.response_cache import DEFAULT_CACHE_PATH
+from lib import render
+from experiments.results_store import DEFAULT_RESULTS_DB
+
+if TYPE_CHECKING:
+    from experiments.cfg_sql import SqlLimits
+    from experiments.checkpoint import Checkpoint
+    from experiments.pipeline import PipelineConfig
+    from experiments.results_store import ResultsStore
+    from lib.mock_server import Latency
+
+# The SDK, the experiment modules (and with them lark, tqdm and the grammars)
+# are imported by the commands that use them, so --help, compare and
+# cfg-report start without paying for them.
 
 
 def cmd_ping(args: argparse.Namespace) -> int:
+    from lib.openai_client import output_text, responses_create
+
     resp = responses_create(input="Say a short friendly hello.", model=args.model)
     render.print_text(output_text(resp))
     return 0
 
 
 def cmd_cfg_math(args: argparse.Namespace) -> int:
+    from experiments.cfg_math import run_cfg_math
+
     prompt = args.prompt or "add four plus four"
     expected = args.expect
     t0 = time.perf_counter()
-    res = run_cfg_math(prompt=prompt, expected=expected, model=args.model)
+    res = run_cfg_math(
+        prompt=prompt,
+        expected=expected,
+        model=args.model,
+        stream=args.stream or args.early_abort,
+        early_abort=args.early_abort,
+    )
     dt = time.perf_counter() - t0
     render.show_arith_validation(
         res.prompt, res.expression, res.parsed_ok, res.value, res.expected
     )
     render.show_run_stats(
-        res.model or args.model, dt, res.usage_input_tokens, res.usage_output_tokens
+        res.model or args.model,
+        dt,
+        res.usage_input_tokens,
+        res.usage_output_tokens,
+        res.timings,
+        cached_tokens=res.usage_cached_tokens,
+        reasoning_tokens=res.usage_reasoning_tokens,
     )
     return 0
 
 
-def cmd_cfg_math_suite(args: argparse.Namespace) -> int:
-    cases = default_math_cases()
+def _suite_models(args: argparse.Namespace) -> list[str]:
     # Determine models to run: prefer explicit --models if provided, else use args.model or defaults
     models_arg = getattr(args, "models", None)
     if models_arg:
-        models = [m.strip() for m in str(models_arg).split(",") if m.strip()]
-    else:
-        models = [args.model] if args.model else ["gpt-5", "gpt-5-mini", "gpt-5-nano"]
-
-    rows = []  # list of tuples (model, result, duration)
-    total = len(models) * len(cases)
-    for model in models:
-        for prompt, expected in tqdm(cases, desc=f"math:{model}"):
-            t0 = time.perf_counter()
-            res = run_cfg_math(prompt=prompt, expected=expected, model=model)
-            dt = time.perf_counter() - t0
-            rows.append((model, res, dt))
-
-    # Prepare Markdown
-    lines = []
-    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    lines.append(f"# CFG Math Suite Report\n")
-    lines.append(f"Generated: {ts}\n")
-    lines.append("")
-    lines.append(
-        "| # | Model | Prompt | Expression | Parsed | Value | Expected | Check | Time (s) |"
-    )
-    lines.append("|---:|:---:|---|---|:---:|---:|---:|:---:|------:|")
-    for i, (model, r, sec) in enumerate(rows, 1):
-        parsed = "yes" if r.parsed_ok else "no"
-        val = (
-            ""
-            if r.value is None
-            else (str(int(r.value)) if float(r.value).is_integer() else f"{r.value}")
+        return [m.strip() for m in str(models_arg).split(",") if m.strip()]
+    return [args.model] if args.model else ["gpt-5", "gpt-5-mini", "gpt-5-nano"]
+
+
+def _open_checkpoint(
+    args: argparse.Namespace, kind: str, options: dict
+) -> Checkpoint:
+    """Resume the checkpoint named by --resume, or start a new run.
+
+    On resume the models and options recorded in the checkpoint header win
+    over the command line, so the finished pairs stay comparable.
+    """
+    from experiments.checkpoint import Checkpoint, checkpoint_path, new_run_id
+
+    if args.resume:
+        ckpt = Checkpoint.open(checkpoint_path(args.out_dir, args.resume))
+        if ckpt.kind != kind:
+            raise SystemExit(f"run {args.resume} is a {ckpt.kind} run, not {kind}")
+        return ckpt
+    run_id = new_run_id()
+    models = _suite_models(args)
+    _require_prices(models, args.budget)
+    header = {"run_id": run_id, "kind": kind, "models": models, **options}
+    return Checkpoint.create(checkpoint_path(args.out_dir, run_id), header)
+
+
+def _shard_arg(spec: str) -> str:
+    from experiments.cases import parse_shard
+
+    try:
+        parse_shard(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+    return spec
+
+
+def _check_sampling(args: argparse.Namespace) -> None:
+    """Repeated samples need independent in-process calls."""
+    if args.workers > 0:
+        raise SystemExit("--samples runs in-process; it cannot be combined with --workers")
+    # A cached or shared response would be counted as several samples
+    if args.cache != "off":
+        raise SystemExit(
+            f"--samples needs fresh responses; it cannot be combined with --cache {args.cache}"
         )
-        exp = (
-            ""
-            if r.expected is None
-            else (
-                str(int(r.expected))
-                if float(r.expected).is_integer()
-                else f"{r.expected}"
-            )
+    if args.coalesce:
+        raise SystemExit(
+            "--samples needs independent responses; it cannot be combined with --coalesce"
         )
-        check = (
-            ""
-            if r.expected is None
-            else (
-                "pass"
-                if (r.value is not None and abs(r.value - r.expected) < 1e-9)
-                else "fail"
+
+
+def _case_selection(args: argparse.Namespace) -> dict:
+    if args.samples:
+        _check_sampling(args)
+    if args.samples and not 1 <= args.min_samples <= args.samples:
+        raise SystemExit("--min-samples must be between 1 and --samples")
+    return {
+        "cases": args.cases,
+        "shard": args.shard,
+        "limit": args.limit,
+        "sample_seed": args.sample_seed,
+        "stream": args.stream or args.early_abort,
+        "early_abort": args.early_abort,
+        "samples": args.samples,
+        "min_samples": args.min_samples,
+        "ci_width": args.ci_width,
+    }
+
+
+def _select(header: dict) -> dict:
+    from experiments.cases import parse_shard
+
+    shard = header.get("shard")
+    return {
+        "shard": parse_shard(shard) if shard else None,
+        "limit": header.get("limit"),
+        "sample_seed": header.get("sample_seed"),
+    }
+
+
+def _budget_arg(spec: str) -> Budget:
+    try:
+        return Budget.parse(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def _require_prices(models: list[str], budget: Optional[Budget]) -> None:
+    if budget is None or budget.usd is None:
+        return
+    unpriced = [m for m in models if price_for(m) is None]
+    if unpriced:
+        raise SystemExit(
+            f"no price for {', '.join(unpriced)}; add it with --prices to use a dollar --budget"
+        )
+
+
+def _open_spend(ckpt: Checkpoint, args: argparse.Namespace) -> Optional[Spend]:
+    """Spend of the run so far, when --budget is given; a resumed run counts its earlier calls."""
+    from experiments.checkpoint import result_from_dict
+
+    budget = args.budget
+    if budget is None:
+        return None
+    _require_prices(ckpt.header["models"], budget)
+    spend = Spend(budget)
+    for r in ckpt.records():
+        spend.add_result(r["model"], result_from_dict(ckpt.kind, r["result"]))
+    return spend
+
+
+def _run_checkpointed(
+    ckpt: Checkpoint, cases: Iterable, args, desc: str, spend: Optional[Spend] = None
+) -> bool:
+    """Run the pairs missing from `ckpt`; returns False if interrupted or out of budget."""
+    from experiments.sampling import SamplingPolicy, run_sampled
+    from experiments.suite import run_suite
+    from experiments.work_queue import run_distributed, suite_runners
+
+    if spend is not None and spend.exhausted():
+        ckpt.close()
+        return False
+    if ckpt.header.get("samples"):
+        _check_sampling(args)
+        run, arun = suite_runners(ckpt.header)
+        try:
+            run_sampled(
+                ckpt,
+                cases,
+                run,
+                arun,
+                SamplingPolicy.from_header(ckpt.header),
+                concurrency=args.concurrency,
+                prewarm=args.prewarm,
+                desc=desc,
+                spend=spend,
             )
+            return spend is None or not spend.exhausted()
+        except KeyboardInterrupt:
+            return False
+        finally:
+            ckpt.close()
+    if args.workers > 0:
+        return run_distributed(
+            ckpt,
+            cases,
+            workers=args.workers,
+            concurrency=args.concurrency,
+            desc=desc,
+            lease_s=args.lease,
+            cache=(args.cache, args.cache_path),
+            hedge=args.hedge,
+            coalesce=args.coalesce,
+            rate_limit=args.rate_limit,
+            pipeline=args.pipeline,
+            spend=spend,
         )
-        expr = (r.expression or "").replace("|", "\\|")
-        lines.append(
-            f"| {i} | {model} | {r.prompt} | `{expr}` | {parsed} | {val} | {exp} | {check} | {sec:.2f} |"
+    run, arun = suite_runners(ckpt.header)
+
+    def on_row(i: int, row: tuple) -> None:
+        ckpt.append(i, row)
+        if spend is not None:
+            spend.add_result(row[0], row[2])
+
+    try:
+        run_suite(
+            ckpt.header["models"],
+            cases,
+            run,
+            arun,
+            concurrency=args.concurrency,
+            prewarm=args.prewarm,
+            desc=desc,
+            skip=ckpt.done(),
+            on_row=on_row,
+            collect=False,
+            stop=spend.exhausted if spend is not None else None,
         )
+        return spend is None or not spend.exhausted()
+    except KeyboardInterrupt:
+        return False
+    finally:
+        ckpt.close()
+
+
+def _report_lines(header: dict, records: list) -> list:
+    from experiments.checkpoint import checkpoint_groups, checkpoint_rows
+    from experiments.report import math_report_lines, sampled_report_lines, sql_report_lines
+
+    run_id = header["run_id"]
+    dataset = header.get("dataset")
+    if header.get("samples"):
+        groups = checkpoint_groups(header, records)
+        return sampled_report_lines(
+            header["kind"], groups, run_id=run_id, dataset=dataset, ci_width=header.get("ci_width")
+        )
+    rows = checkpoint_rows(header, records)
+    if header["kind"] == "math":
+        return math_report_lines(rows, run_id=run_id)
+    return sql_report_lines(rows, dataset=dataset, run_id=run_id)
+
+
+def _render_stored(store: ResultsStore, run_id: str, out_dir: str | Path) -> Tuple[Path, int]:
+    """Write the Markdown report of a stored run; returns its path and result count."""
+    from experiments.report import write_report
+
+    header, _checkpoint = store.run(run_id)
+    records = list(store.records(run_id))
+    return write_report(_report_lines(header, records), out_dir, run_id), len(records)
 
-    out_dir = Path(args.out_dir)
-    out_dir.mkdir(parents=True, exist_ok=True)
-    out_file = out_dir / f"run-{datetime.now().strftime('%Y%m%d-%H%M%S')}.md"
-    out_file.write_text("\n".join(lines), encoding="utf-8")
-    render.print_text(f"Saved report to {out_file}")
-    return 0
+
+def _write_suite_report(ckpt: Checkpoint, out_dir: str | Path, results_db: str) -> Path:
+    from experiments.results_store import ResultsStore
+
+    store = ResultsStore(results_db)
+    try:
+        store.import_checkpoint(ckpt.path)
+        return _render_stored(store, ckpt.header["run_id"], out_dir)[0]
+    finally:
+        store.close()
+
+
+def _finish_suite(
+    ckpt: Checkpoint, args: argparse.Namespace, completed: bool, spend: Optional[Spend] = None
+) -> int:
+    from experiments.cfg_sql import execution_cache_stats
+    from experiments.pipeline import pipeline_report, pipeline_stats
+    from lib.openai_client import cache_stats, coalesce_stats, connection_stats, rate_limit_stats
+
+    out_file = _write_suite_report(ckpt, args.out_dir, args.results_db)
+    conn = connection_stats()
+    cache = cache_stats()
+    msg = (
+        f"Saved report to {out_file}\n"
+        f"Connections: opened={conn['opened']}, reused={conn['reused']}\n"
+        f"Cache: hits={cache['hits']}, misses={cache['misses']}"
+    )
+    executions = execution_cache_stats()
+    if executions["hits"] or executions["misses"]:
+        msg += f"\nSQL execution cache: hits={executions['hits']}, misses={executions['misses']}"
+    for model, r in rate_limit_stats().items():
+        if r["rpm"] or r["tpm"]:
+            msg += (
+                f"\nRate limit {model}: rpm={r['rpm'] or 0:.0f}, tpm={r['tpm'] or 0:.0f}, "
+                f"throttled={r['throttled']} ({r['waited_s']:.1f}s)"
+            )
+    stages = pipeline_stats()
+    if any(s.items for s in stages if s.name != "generate"):
+        msg += "\n" + pipeline_report(stages)
+    flights = coalesce_stats()
+    if flights["leaders"]:
+        msg += f"\nCoalesced: {flights['coalesced']} calls shared {flights['leaders']} requests"
+    if spend is not None:
+        msg += f"\nSpent: {spend.tokens} tokens, ${spend.usd:.4f} of budget {spend.budget}"
+    if not completed and spend is not None and spend.exhausted():
+        msg += (
+            f"\nBudget exhausted; partial report written. Continue with "
+            f"--resume {ckpt.header['run_id']} and a larger --budget"
+        )
+    elif not completed:
+        msg += f"\nInterrupted; continue with --resume {ckpt.header['run_id']}"
+    render.print_text(msg)
+    if completed:
+        return 0
+    return 1 if spend is not None and spend.exhausted() else 130
+
+
+def cmd_cfg_math_suite(args: argparse.Namespace) -> int:
+    from experiments.cases import iter_math_cases, select_cases
+    from experiments.cfg_math import default_math_cases
+
+    ckpt = _open_checkpoint(args, "math", _case_selection(args))
+    if ckpt.header.get("cases"):
+        cases = iter_math_cases(ckpt.header["cases"], **_select(ckpt.header))
+    else:
+        cases = list(select_cases(default_math_cases(), **_select(ckpt.header)))
+    spend = _open_spend(ckpt, args)
+    completed = _run_checkpointed(ckpt, cases, args, desc="math", spend=spend)
+    return _finish_suite(ckpt, args, completed, spend)
 
 
 def cmd_cfg_sql(args: argparse.Namespace) -> int:
+    from experiments.cfg_sql import run_cfg_sql
+
     prompt = args.prompt or "select id and name for users older than 30, limit 3"
     t0 = time.perf_counter()
-    res = run_cfg_sql(prompt=prompt, model=args.model, expected_rows=args.expect_rows)
+    res = run_cfg_sql(
+        prompt=prompt,
+        model=args.model,
+        expected_rows=args.expect_rows,
+        dataset=args.dataset,
+        limits=_sql_limits(args),
+        stream=args.stream or args.early_abort,
+        early_abort=args.early_abort,
+    )
     dt = time.perf_counter() - t0
     render.show_sql_validation(
         res.prompt,
@@ -111,62 +369,289 @@ def cmd_cfg_sql(args: argparse.Namespace) -> int:
         res.parsed_ok,
         res.executed_ok,
         list(res.columns),
-        len(res.rows),
+        res.row_count,
         res.error,
         res.expected_rows,
+        truncated=res.truncated,
     )
     render.show_run_stats(
-        res.model or args.model, dt, res.usage_input_tokens, res.usage_output_tokens
+        res.model or args.model,
+        dt,
+        res.usage_input_tokens,
+        res.usage_output_tokens,
+        res.timings,
+        cached_tokens=res.usage_cached_tokens,
+        reasoning_tokens=res.usage_reasoning_tokens,
     )
     return 0
 
 
 def cmd_cfg_sql_suite(args: argparse.Namespace) -> int:
-    cases = default_sql_cases()
-    models_arg = getattr(args, "models", None)
-    if models_arg:
-        models = [m.strip() for m in str(models_arg).split(",") if m.strip()]
+    from experiments.cases import iter_sql_cases, select_cases
+    from experiments.cfg_sql import default_sql_cases
+
+    ckpt = _open_checkpoint(
+        args,
+        "sql",
+        {
+            "dataset": args.dataset,
+            "limits": asdict(_sql_limits(args)),
+            **_case_selection(args),
+        },
+    )
+    dataset = ckpt.header.get("dataset")
+    if ckpt.header.get("cases"):
+        cases = iter_sql_cases(ckpt.header["cases"], dataset, **_select(ckpt.header))
     else:
-        models = [args.model] if args.model else ["gpt-5", "gpt-5-mini", "gpt-5-nano"]
-
-    rows = []  # (model, prompt, result, seconds)
-    for model in models:
-        for prompt, expected_rows in tqdm(cases, desc=f"sql:{model}"):
-            t0 = time.perf_counter()
-            res = run_cfg_sql(prompt=prompt, model=model, expected_rows=expected_rows)
-            dt = time.perf_counter() - t0
-            rows.append((model, prompt, expected_rows, res, dt))
-
-    # Markdown
-    lines = []
-    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    lines.append("# CFG SQL Suite Report\n")
-    lines.append(f"Generated: {ts}\n")
-    lines.append("")
-    lines.append(
-        "| # | Model | Prompt | Query | Parsed | Executed | Columns | Rows | Expected | Check | Time (s) |"
-    )
-    lines.append("|---:|:---:|---|---|:---:|:---:|---|---:|---:|:---:|------:|")
-    for i, (model, prompt, exp_rows, r, sec) in enumerate(rows, 1):
-        parsed = "yes" if r.parsed_ok else "no"
-        executed = "yes" if r.executed_ok else "no"
-        cols = ",".join(r.columns) if r.columns else ""
-        q = (r.query or "").replace("|", "\\|")
-        exp = "" if exp_rows is None else str(exp_rows)
-        check = (
-            ""
-            if exp_rows is None
-            else ("pass" if (r.executed_ok and len(r.rows) == exp_rows) else "fail")
-        )
-        lines.append(
-            f"| {i} | {model} | {prompt} | `{q}` | {parsed} | {executed} | {cols} | {len(r.rows)} | {exp} | {check} | {sec:.2f} |"
-        )
+        cases = list(select_cases(default_sql_cases(dataset), **_select(ckpt.header)))
+    spend = _open_spend(ckpt, args)
+    completed = _run_checkpointed(ckpt, cases, args, desc="sql", spend=spend)
+    return _finish_suite(ckpt, args, completed, spend)
+
+
+def cmd_cfg_report(args: argparse.Namespace) -> int:
+    from experiments.results_store import ResultsStore
+
+    store = ResultsStore(args.results_db)
+    try:
+        path = Path(args.checkpoint)
+        if path.exists():
+            run_id, _added = store.import_checkpoint(path)
+        else:
+            run_id = args.checkpoint
+            try:
+                _header, checkpoint = store.run(run_id)
+            except KeyError:
+                raise SystemExit(f"{run_id}: no such checkpoint or stored run") from None
+            path = Path(checkpoint or ".")
+        # Checkpoints live in <out-dir>/runs/, reports next to that directory
+        out_file, n = _render_stored(store, run_id, args.out_dir or path.parent.parent)
+    finally:
+        store.close()
+    render.print_text(f"Rendered {n} results to {out_file}")
+    return 0
+
+
+def cmd_compare(args: argparse.Namespace) -> int:
+    from experiments.results_store import ResultsStore, compare_lines
+
+    store = ResultsStore(args.results_db)
+    try:
+        lines = compare_lines(store, args.run_a, args.run_b, top=args.top)
+    except KeyError as e:
+        raise SystemExit(
+            f"run {e.args[0]} is not in {args.results_db}; import it with cfg-report <checkpoint>"
+        ) from None
+    except ValueError as e:
+        raise SystemExit(str(e)) from None
+    finally:
+        store.close()
+    text = "\n".join(lines)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+    render.print_markdown(text)
+    return 0
+
 
-    out_dir = Path(args.out_dir)
-    out_dir.mkdir(parents=True, exist_ok=True)
-    out_file = out_dir / f"run-{datetime.now().strftime('%Y%m%d-%H%M%S')}.md"
-    out_file.write_text("\n".join(lines), encoding="utf-8")
-    render.print_text(f"Saved report to {out_file}")
+def cmd_cfg_worker(args: argparse.Namespace) -> int:
+    from experiments.pipeline import pipeline_report, pipeline_stats
+    from experiments.work_queue import run_worker
+
+    stats = run_worker(
+        args.queue,
+        concurrency=args.concurrency,
+        worker_id=args.worker_id,
+        lease_s=args.lease,
+        wait=args.wait,
+    )
+    msg = f"Worker finished: done={stats.done}, failed={stats.failed}"
+    stages = pipeline_stats()
+    if any(s.items for s in stages if s.name != "generate"):
+        msg += "\n" + pipeline_report(stages)
+    render.print_text(msg)
+    return 0
+
+
+def _add_stream_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream the response, validating the tool input as it arrives (records ttft)",
+    )
+    p.add_argument(
+        "--early-abort",
+        action="store_true",
+        help="Stream and close the response as soon as the output can no longer parse",
+    )
+
+
+def _add_sampling_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        "--samples",
+        type=int,
+        default=0,
+        help="Repeat each (model, case) up to N times, stopping once its pass-rate "
+        "interval is narrow enough (default: 0, one run per pair)",
+    )
+    p.add_argument(
+        "--min-samples",
+        type=int,
+        default=3,
+        help="Samples every pair gets before early stopping (default: 3)",
+    )
+    p.add_argument(
+        "--ci-width",
+        type=float,
+        default=0.3,
+        help="Stop sampling a pair once its 95%% Wilson interval is at most this wide "
+        "(default: 0.3)",
+    )
+
+
+def _add_budget_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        "--budget",
+        type=_budget_arg,
+        default=None,
+        help="Stop starting new calls once the run has used this many tokens (500k, 2M) "
+        "or dollars ($5, 5usd); calls in flight finish and a partial report is written",
+    )
+
+
+def _add_worker_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Run cases in N worker processes fed from a SQLite queue next to the "
+        "checkpoint; --concurrency applies per worker (default: 0, in-process)",
+    )
+    p.add_argument(
+        "--lease",
+        type=float,
+        default=120.0,
+        help="Seconds a worker holds a task before others may claim it (default: 120)",
+    )
+
+
+def _sql_limits(args: argparse.Namespace) -> SqlLimits:
+    from experiments.cfg_sql import SqlLimits
+
+    return SqlLimits(
+        timeout_s=args.sql_timeout,
+        max_vm_steps=args.max_vm_steps,
+        max_rows=args.max_rows,
+    )
+
+
+def _add_case_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        "--cases",
+        default=None,
+        help="Read cases lazily from a .jsonl or .csv file instead of the built-in list",
+    )
+    p.add_argument(
+        "--shard",
+        type=_shard_arg,
+        default=None,
+        metavar="I/N",
+        help="Run only cases whose index is I mod N (0 <= I < N)",
+    )
+    p.add_argument(
+        "--limit",
+        type=int,
+        default=None,
+        help="Run at most this many cases (of the shard, if given)",
+    )
+    p.add_argument(
+        "--sample-seed",
+        type=int,
+        default=None,
+        help="With --limit, take a seeded uniform sample instead of the first cases",
+    )
+
+
+def _add_sql_limit_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        "--sql-timeout",
+        type=float,
+        default=None,
+        help="Abort query execution after this many seconds (default: none)",
+    )
+    p.add_argument(
+        "--max-vm-steps",
+        type=int,
+        default=None,
+        help="Abort query execution after this many SQLite VM steps (default: none)",
+    )
+    p.add_argument(
+        "--max-rows",
+        type=int,
+        default=None,
+        help="Stop fetching after this many rows and mark the result truncated",
+    )
+
+
+def cmd_cfg_sql_dataset(args: argparse.Namespace) -> int:
+    from experiments.sql_dataset import generate_dataset
+
+    out = args.out or f".cache/datasets/users-{args.users}-seed-{args.seed}.sqlite"
+    t0 = time.perf_counter()
+    path = generate_dataset(
+        out, users=args.users, orders=args.orders, seed=args.seed, indexes=args.indexes
+    )
+    dt = time.perf_counter() - t0
+    render.print_text(f"Wrote {path} in {dt:.1f}s")
+    return 0
+
+
+def _latency_arg(spec: str) -> Latency:
+    from lib.mock_server import Latency
+
+    try:
+        return Latency.parse(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def _pipeline_arg(spec: str) -> PipelineConfig:
+    from experiments.pipeline import PipelineConfig
+
+    try:
+        return PipelineConfig.parse(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def _rate_limits_arg(spec: str) -> tuple:
+    from lib.mock_server import parse_rate_limits
+
+    try:
+        return parse_rate_limits(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def cmd_mock_server(args: argparse.Namespace) -> int:
+    from lib.mock_server import MockConfig, run_mock_server
+
+    config = MockConfig(
+        latency=args.latency,
+        per_token_s=args.per_token_ms / 1000.0,
+        rate_limit_rate=args.rate_limit_rate,
+        error_rate=args.error_rate,
+        retry_after_s=args.retry_after if args.retry_after >= 0 else None,
+        invalid_rate=args.invalid_rate,
+        reasoning_tokens=args.reasoning_tokens,
+        prompt_cache_min_tokens=args.prompt_cache_min_tokens,
+        rate_limits=args.rate_limits,
+        seed=args.seed,
+    )
+    stats = run_mock_server(config, host=args.host, port=args.port)
+    render.print_text(
+        f"Requests: {stats.requests} (ok={stats.ok}, 429={stats.rate_limited}, "
+        f"5xx={stats.errors}, invalid outputs={stats.invalid}, streamed={stats.streams})"
+    )
     return 0
 
 
@@ -175,6 +660,62 @@ def build_parser() -> argparse.ArgumentParser:
     p.add_argument(
         "--model", default=None, help="Override model (default from env or gpt-5)"
     )
+    p.add_argument(
+        "--cache",
+        choices=["off", "on", "replay"],
+        default=os.getenv("OPENAI_RESPONSE_CACHE", "off"),
+        help="Response cache mode: off, on (read-through) or replay (cache only)",
+    )
+    p.add_argument(
+        "--replay",
+        dest="cache",
+        action="store_const",
+        const="replay",
+        help="Serve responses only from the cache (shorthand for --cache replay)",
+    )
+    p.add_argument(
+        "--hedge",
+        action="store_true",
+        help="Fire a second request when a call outlives the model's observed p95",
+    )
+    p.add_argument(
+        "--coalesce",
+        action="store_true",
+        default=os.getenv("OPENAI_COALESCE", "") not in ("", "0", "false"),
+        help="Share one request between concurrent identical calls (not for sampling runs)",
+    )
+    p.add_argument(
+        "--results-db",
+        default=DEFAULT_RESULTS_DB,
+        help=f"SQLite store that suite results are imported into and reports rendered from "
+        f"(default: {DEFAULT_RESULTS_DB})",
+    )
+    p.add_argument(
+        "--prices",
+        default=os.getenv("OPENAI_PRICES"),
+        help="JSON file of per-model prices (USD per 1M tokens) that overrides or extends "
+        'the built-in table, e.g. {"gpt-5": {"input": 1.25, "cached_input": 0.125, "output": 10}}',
+    )
+    p.add_argument(
+        "--rate-limit",
+        action="store_true",
+        default=os.getenv("OPENAI_RATE_LIMIT", "") not in ("", "0", "false"),
+        help="Throttle each model to the RPM/TPM limits reported in x-ratelimit-* headers "
+        "and dispatch suite pairs to whichever model has budget",
+    )
+    p.add_argument(
+        "--pipeline",
+        type=_pipeline_arg,
+        default=os.getenv("CFG_PIPELINE"),
+        metavar="V,E[,Q]|off",
+        help="Concurrent SQL suites: validate on V threads and execute on E threads, "
+        "fed by queues of Q (default: 2,4,64); off parses and executes inline",
+    )
+    p.add_argument(
+        "--cache-path",
+        default=DEFAULT_CACHE_PATH,
+        help=f"Response cache database (default: {DEFAULT_CACHE_PATH})",
+    )
     sp = p.add_subparsers(dest="command", required=True)
 
     ping = sp.add_parser("ping", help="Basic Responses API sanity check")
@@ -187,6 +728,7 @@ def build_parser() -> argparse.ArgumentParser:
     cfg_math.add_argument(
         "--expect", type=float, help="Expected numeric result (optional)", default=None
     )
+    _add_stream_args(cfg_math)
     cfg_math.set_defaults(func=cmd_cfg_math)
 
     suite = sp.add_parser(
@@ -203,6 +745,29 @@ def build_parser() -> argparse.ArgumentParser:
         default="gpt-5,gpt-5-mini,gpt-5-nano",
         help="Comma-separated list of models to test (default: gpt-5,gpt-5-mini,gpt-5-nano)",
     )
+    suite.add_argument(
+        "--resume",
+        metavar="RUN_ID",
+        default=None,
+        help="Continue the run checkpointed under <out-dir>/runs/RUN_ID.jsonl",
+    )
+    suite.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Max in-flight requests; >1 switches to the asyncio engine (default: 1)",
+    )
+    suite.add_argument(
+        "--prewarm",
+        type=int,
+        default=0,
+        help="Open N pooled connections before the first case (default: 0)",
+    )
+    _add_case_args(suite)
+    _add_stream_args(suite)
+    _add_sampling_args(suite)
+    _add_budget_args(suite)
+    _add_worker_args(suite)
     suite.set_defaults(func=cmd_cfg_math_suite)
 
     cfg_sql = sp.add_parser(
@@ -216,6 +781,13 @@ def build_parser() -> argparse.ArgumentParser:
         default=None,
         help="Expected row count (optional)",
     )
+    cfg_sql.add_argument(
+        "--dataset",
+        default=None,
+        help="Generated .sqlite dataset to run against (default: built-in sample)",
+    )
+    _add_sql_limit_args(cfg_sql)
+    _add_stream_args(cfg_sql)
     cfg_sql.set_defaults(func=cmd_cfg_sql)
 
     sql_suite = sp.add_parser(
@@ -231,14 +803,197 @@ def build_parser() -> argparse.ArgumentParser:
         default="gpt-5,gpt-5-mini,gpt-5-nano",
         help="Comma-separated list of models to test (default: gpt-5,gpt-5-mini,gpt-5-nano)",
     )
+    sql_suite.add_argument(
+        "--resume",
+        metavar="RUN_ID",
+        default=None,
+        help="Continue the run checkpointed under <out-dir>/runs/RUN_ID.jsonl",
+    )
+    sql_suite.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Max in-flight requests; >1 switches to the asyncio engine (default: 1)",
+    )
+    sql_suite.add_argument(
+        "--prewarm",
+        type=int,
+        default=0,
+        help="Open N pooled connections before the first case (default: 0)",
+    )
+    sql_suite.add_argument(
+        "--dataset",
+        default=None,
+        help="Generated .sqlite dataset to run against; expected rows are "
+        "recomputed from the reference queries (default: built-in sample)",
+    )
+    _add_sql_limit_args(sql_suite)
+    _add_case_args(sql_suite)
+    _add_stream_args(sql_suite)
+    _add_sampling_args(sql_suite)
+    _add_budget_args(sql_suite)
+    _add_worker_args(sql_suite)
     sql_suite.set_defaults(func=cmd_cfg_sql_suite)
 
+    worker = sp.add_parser(
+        "cfg-worker", help="Run tasks from a suite work queue (e.g. on another host)"
+    )
+    worker.add_argument(
+        "--queue", required=True, help="Path to a runs/<run-id>.queue.sqlite file"
+    )
+    worker.add_argument(
+        "--concurrency", type=int, default=1, help="Max in-flight requests (default: 1)"
+    )
+    worker.add_argument(
+        "--worker-id", default=None, help="Lease owner name (default: <host>:<pid>)"
+    )
+    worker.add_argument(
+        "--lease",
+        type=float,
+        default=120.0,
+        help="Seconds a claimed task stays leased between heartbeats (default: 120)",
+    )
+    worker.add_argument(
+        "--wait",
+        action="store_true",
+        help="Keep polling for new tasks instead of exiting when the queue is empty",
+    )
+    worker.set_defaults(func=cmd_cfg_worker)
+
+    report = sp.add_parser(
+        "cfg-report", help="Render a Markdown report from a suite checkpoint"
+    )
+    report.add_argument(
+        "checkpoint",
+        help="Path to a runs/<run-id>.jsonl checkpoint (imported into the results store "
+        "first), or the id of a run already in the store",
+    )
+    report.add_argument(
+        "--out-dir",
+        default=None,
+        help="Output directory (default: the directory containing runs/)",
+    )
+    report.set_defaults(func=cmd_cfg_report)
+
+    compare = sp.add_parser(
+        "compare", help="Pass-rate, latency and cost deltas between two stored runs"
+    )
+    compare.add_argument("run_a", help="Baseline run id")
+    compare.add_argument("run_b", help="Run id to compare against the baseline")
+    compare.add_argument(
+        "--top",
+        type=int,
+        default=20,
+        help="Changed cases to list; 0 skips the per-case comparison (default: 20)",
+    )
+    compare.add_argument("--out", default=None, help="Also write the comparison to this Markdown file")
+    compare.set_defaults(func=cmd_compare)
+
+    dataset = sp.add_parser(
+        "cfg-sql-dataset", help="Generate a synthetic users/orders SQLite dataset"
+    )
+    dataset.add_argument("--users", type=int, default=1000, help="Number of users")
+    dataset.add_argument(
+        "--orders", type=int, default=None, help="Number of orders (default: 3x users)"
+    )
+    dataset.add_argument("--seed", type=int, default=0, help="Random seed")
+    dataset.add_argument(
+        "--no-indexes",
+        dest="indexes",
+        action="store_false",
+        help="Skip indexes on orders.user_id, users.city and users.age",
+    )
+    dataset.add_argument(
+        "--out",
+        default=None,
+        help="Output path (default: .cache/datasets/users-<N>-seed-<S>.sqlite)",
+    )
+    dataset.set_defaults(func=cmd_cfg_sql_dataset)
+
+    mock = sp.add_parser(
+        "mock-server",
+        help="Serve a local grammar-sampling stand-in for the Responses API",
+    )
+    mock.add_argument("--host", default="127.0.0.1")
+    mock.add_argument("--port", type=int, default=8765)
+    mock.add_argument(
+        "--latency",
+        type=_latency_arg,
+        default="fixed:0",
+        help="Delay per request: fixed:S, uniform:LO,HI, exp:MEAN or lognormal:MEDIAN,SIGMA (seconds)",
+    )
+    mock.add_argument(
+        "--per-token-ms", type=float, default=0.0, help="Extra delay per output token"
+    )
+    mock.add_argument(
+        "--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered 429"
+    )
+    mock.add_argument(
+        "--error-rate", type=float, default=0.0, help="Fraction of requests answered 500/502/503"
+    )
+    mock.add_argument(
+        "--retry-after",
+        type=float,
+        default=1.0,
+        help="Retry-After sent with 429s, in seconds (negative: omit the header)",
+    )
+    mock.add_argument(
+        "--invalid-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of tool inputs corrupted so they no longer parse",
+    )
+    mock.add_argument(
+        "--reasoning-tokens", type=int, default=0, help="Mean reasoning tokens per response"
+    )
+    mock.add_argument(
+        "--prompt-cache-min-tokens",
+        type=int,
+        default=1024,
+        help="Smallest static prompt prefix reported as cached on repeat requests",
+    )
+    mock.add_argument(
+        "--rate-limits",
+        type=_rate_limits_arg,
+        default=(),
+        metavar="MODEL=RPM:TPM,...",
+        help="Per-model quotas, answered with x-ratelimit-* headers and 429s "
+        '(e.g. "*=600:200000,gpt-5=60:20000")',
+    )
+    mock.add_argument("--seed", type=int, default=None, help="Random seed")
+    mock.set_defaults(func=cmd_mock_server)
+
     return p
 
 
 def main(argv: list[str] | None = None) -> int:
     parser = build_parser()
     args = parser.parse_args(argv)
+    if args.cache != "off" or args.hedge or args.coalesce or args.rate_limit:
+        from lib.openai_client import (
+            configure_cache,
+            configure_coalescing,
+            configure_policy,
+            configure_rate_limiting,
+        )
+
+        if args.cache != "off":
+            configure_cache(args.cache, args.cache_path)
+        if args.hedge:
+            configure_policy(hedge=True)
+        if args.coalesce:
+            configure_coalescing(True)
+        if args.rate_limit:
+            configure_rate_limiting(True)
+    if args.pipeline is not None:
+        from experiments.pipeline import configure_pipeline
+
+        configure_pipeline(args.pipeline)
+    if args.prices:
+        try:
+            load_prices(args.prices)
+        except (OSError, ValueError) as e:
+            raise SystemExit(f"--prices: {e}")
     return args.func(args)
 
 
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import csv
+import json
+import random
+from contextlib import closing
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from experiments.cfg_sql import expected_row_count, open_db
+
+
+"""
+Case files for the suites.
+
+A case file is JSONL (one object per line) or CSV with a header row:
+
+    math: {"prompt": "...", "expected": 8}            expected may be omitted
+    sql:  {"prompt": "...", "expected_rows": 3}       or
+          {"prompt": "...", "reference": "SELECT ..."} rows counted on the dataset
+
+Files are read lazily. A case keeps its 0-based position among the
+file's records as its id, so shards and samples of the same file checkpoint and report
+under stable indices.
+"""
+
+T = TypeVar("T")
+CaseRecord = Dict[str, Any]
+
+
+def iter_case_records(path: str | Path) -> Iterator[CaseRecord]:
+    """Yield one dict per case from a .jsonl/.ndjson or .csv file."""
+    p = Path(path)
+    suffix = p.suffix.lower()
+    if suffix == ".csv":
+        with open(p, newline="", encoding="utf-8") as fh:
+            for rec in csv.DictReader(fh):
+                yield {k: (v if v != "" else None) for k, v in rec.items()}
+    elif suffix in (".jsonl", ".ndjson"):
+        with open(p, encoding="utf-8") as fh:
+            for n, line in enumerate(fh, 1):
+                if not line.strip():
+                    continue
+                rec = json.loads(line)
+                if not isinstance(rec, dict):
+                    raise ValueError(f"{p}:{n}: expected a JSON object per line")
+                yield rec
+    else:
+        raise ValueError(f"unsupported case file (want .jsonl or .csv): {p}")
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """Parse "i/N" (0 <= i < N) into (i, N)."""
+    try:
+        i_s, n_s = spec.split("/")
+        i, n = int(i_s), int(n_s)
+    except ValueError:
+        raise ValueError(f"shard must look like i/N, got {spec!r}") from None
+    if n < 1 or not 0 <= i < n:
+        raise ValueError(f"shard index out of range: {spec!r}")
+    return i, n
+
+
+def select_cases(
+    items: Iterable[T],
+    shard: Optional[Tuple[int, int]] = None,
+    limit: Optional[int] = None,
+    sample_seed: Optional[int] = None,
+) -> Iterator[Tuple[int, T]]:
+    """Yield (index, item) for the selected items, in index order.
+
+    `shard=(i, N)` keeps every item whose index is i mod N. `limit` keeps
+    the first `limit` of those, or with `sample_seed` a uniform random
+    sample of that size (reservoir sampling, so memory stays O(limit)).
+    """
+    selected: Iterator[Tuple[int, T]] = enumerate(items)
+    if shard is not None:
+        k, n = shard
+        selected = ((i, x) for i, x in selected if i % n == k)
+    if limit is None:
+        yield from selected
+    elif sample_seed is None:
+        yield from islice(selected, limit)
+    else:
+        yield from _reservoir(selected, limit, random.Random(sample_seed))
+
+
+def _reservoir(
+    items: Iterator[Tuple[int, T]], k: int, rng: random.Random
+) -> Iterator[Tuple[int, T]]:
+    sample: List[Tuple[int, T]] = []
+    for seen, item in enumerate(items):
+        if seen < k:
+            sample.append(item)
+        else:
+            j = rng.randint(0, seen)
+            if j < k:
+                sample[j] = item
+    sample.sort(key=lambda x: x[0])
+    return iter(sample)
+
+
+def _opt_float(value: Any) -> Optional[float]:
+    return None if value is None else float(value)
+
+
+def math_case(rec: CaseRecord) -> Tuple[str, Optional[float]]:
+    return rec["prompt"], _opt_float(rec.get("expected"))
+
+
+def iter_math_cases(
+    path: str | Path, **selection: Any
+) -> Iterator[Tuple[int, Tuple[str, Optional[float]]]]:
+    for i, rec in select_cases(iter_case_records(path), **selection):
+        yield i, math_case(rec)
+
+
+def iter_sql_cases(
+    path: str | Path, dataset: Optional[str] = None, **selection: Any
+) -> Iterator[Tuple[int, Tuple[str, Optional[int]]]]:
+    """SQL cases from `path`; `reference` queries are counted on `dataset`.
+
+    Only selected cases are counted, so sharding and sampling also cut
+    the reference-query work.
+    """
+    selected = select_cases(iter_case_records(path), **selection)
+    with closing(_LazyDb(dataset)) as db:
+        for i, rec in selected:
+            yield i, _sql_case(rec, db)
+
+
+class _LazyDb:
+    # Opened on the first reference query; files with expected_rows never touch the DB
+    def __init__(self, dataset: Optional[str]) -> None:
+        self.dataset = dataset
+        self._con = None
+
+    def count(self, reference: str) -> int:
+        if self._con is None:
+            self._con = open_db(self.dataset)
+        return expected_row_count(self._con, reference)
+
+    def close(self) -> None:
+        if self._con is not None:
+            self._con.close()
+
+
+def _sql_case(rec: CaseRecord, db: _LazyDb) -> Tuple[str, Optional[int]]:
+    if rec.get("expected_rows") is not None:
+        return rec["prompt"], int(rec["expected_rows"])
+    if rec.get("reference"):
+        return rec["prompt"], db.count(rec["reference"])
+    return rec["prompt"], None
+
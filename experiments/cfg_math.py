@@ -1,11 +1,25 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Any, Optional, List, Tuple
+import operator
+from dataclasses import dataclass, field
+from fractions import Fraction
+from typing import Any, Callable, Dict, Iterable, Optional, List, Tuple, Union
 
-from lark import Lark
+from lark import Lark, Token, Transformer
+from lark.exceptions import LarkError
 
-from lib.openai_client import responses_create, output_text, extract_usage
+from lib.grammar import PrefixValidator, load_parser
+from lib.metrics import request_timings, timed
+from lib.openai_client import (
+    RequestStats,
+    aborted_usage,
+    custom_tool_input,
+    extract_usage_details,
+    responses_create,
+    responses_create_async,
+    responses_stream,
+    responses_stream_async,
+)
 
 
 # Lark grammar: + - * / with parentheses and integers, ignoring inline spaces
@@ -20,43 +34,134 @@ start: expr
 """
 
 
-def safe_eval_arith(expr: str) -> Optional[float]:
-    import ast
+_arith_parser: Optional[Lark] = None
 
-    try:
-        node = ast.parse(expr, mode="eval")
-    except SyntaxError:
-        return None
 
-    def eval_node(n: ast.AST) -> float:
-        if isinstance(n, ast.Expression):
-            return eval_node(n.body)
-        if isinstance(n, ast.BinOp) and isinstance(
-            n.op, (ast.Add, ast.Sub, ast.Mult, ast.Div)
-        ):
-            left = eval_node(n.left)
-            right = eval_node(n.right)
-            if isinstance(n.op, ast.Add):
-                return left + right
-            if isinstance(n.op, ast.Sub):
-                return left - right
-            if isinstance(n.op, ast.Mult):
-                return left * right
-            return left / right
-        if isinstance(n, ast.UnaryOp) and isinstance(n.op, (ast.UAdd, ast.USub)):
-            val = eval_node(n.operand)
-            return val if isinstance(n.op, ast.UAdd) else -val
-        if isinstance(n, ast.Constant) and isinstance(n.value, (int, float)):
-            return float(n.value)
-        raise ValueError("Unsupported expression")
+def _parser() -> Lark:
+    # Built (or loaded from the table cache) on first use, not at import
+    global _arith_parser
+    if _arith_parser is None:
+        _arith_parser = load_parser(ARITH_LARK, start="start")
+    return _arith_parser
 
-    try:
-        return eval_node(node)
-    except Exception:
-        return None
 
+def __getattr__(name: str) -> Any:
+    # `cfg_math.parser` stays available to callers without an import-time build
+    if name == "parser":
+        return _parser()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+Number = Union[float, Fraction]
+_OPS = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+}
+
+
+class ArithDivisionByZero(ZeroDivisionError):
+    """Raised when an expression divides by a (sub)expression equal to zero."""
+
+
+class _DivByZero:
+    # Carried up instead of raising, so the rest of the input is still validated
+    def __init__(self, column: Optional[int]) -> None:
+        self.column = column
+
+
+class ArithEvaluator(Transformer):
+    """Evaluates ARITH_LARK while the LALR parser reduces, so no tree is built.
+
+    Needs keep_all_tokens so the operators reach the callbacks. Reductions
+    run in the parser's own loop, so deep nesting does not recurse.
+    """
+
+    def __init__(self, num: Callable[[int], Number] = float) -> None:
+        super().__init__()
+        self.num = num
+
+    def _value(self, x: Any) -> Number:
+        return self.num(int(x)) if isinstance(x, Token) else x
 
-parser = Lark(ARITH_LARK, start="start", parser="earley")
+    def start(self, children: List[Any]) -> Number:
+        return self._value(children[0])
+
+    def factor(self, children: List[Any]) -> Number:
+        # "(" expr ")"; a bare INT factor is inlined by ?factor
+        return self._value(children[1])
+
+    def expr(self, children: List[Any]) -> Any:
+        acc = self._value(children[0])
+        for i in range(1, len(children), 2):
+            op, rhs = children[i], self._value(children[i + 1])
+            if isinstance(acc, _DivByZero):
+                continue
+            if isinstance(rhs, _DivByZero):
+                acc = rhs
+            elif op == "/" and rhs == 0:
+                acc = _DivByZero(op.column)
+            else:
+                acc = _OPS[op](acc, rhs)
+        return acc
+
+    term = expr
+
+
+_evaluators: Dict[bool, Lark] = {}
+
+
+def _evaluator(exact: bool) -> Lark:
+    ev = _evaluators.get(exact)
+    if ev is None:
+        ev = _evaluators[exact] = load_parser(
+            ARITH_LARK,
+            start="start",
+            keep_all_tokens=True,
+            transformer=ArithEvaluator(Fraction if exact else float),
+        )
+    return ev
+
+
+def evaluate(expr: str, exact: bool = False) -> Number:
+    """Validate and evaluate `expr` in a single parse.
+
+    Returns a float, or a Fraction with `exact`. Raises a LarkError if the
+    expression does not match the grammar and ArithDivisionByZero on x/0.
+    """
+    value = _evaluator(exact).parse(expr)
+    if isinstance(value, _DivByZero):
+        raise ArithDivisionByZero(f"division by zero at column {value.column}")
+    return value
+
+
+@dataclass
+class MathEval:
+    parsed_ok: bool
+    value: Optional[Number] = None
+    error: Optional[str] = None
+
+
+def evaluate_many(exprs: Iterable[str], exact: bool = False) -> List[MathEval]:
+    """Validate and evaluate many expressions, e.g. to re-score stored outputs."""
+    out: List[MathEval] = []
+    for expr in exprs:
+        try:
+            out.append(MathEval(parsed_ok=True, value=evaluate(expr, exact=exact)))
+        except ArithDivisionByZero as e:
+            out.append(MathEval(parsed_ok=True, error=str(e)))
+        except LarkError as e:
+            out.append(MathEval(parsed_ok=False, error=type(e).__name__))
+    return out
+
+
+def safe_eval_arith(expr: str) -> Optional[float]:
+    """Float value of `expr`, or None if it does not parse or divides by zero."""
+    try:
+        return float(evaluate(expr))
+    except (LarkError, ZeroDivisionError):
+        return None
 
 
 @dataclass
@@ -69,54 +174,69 @@ class MathRunResult:
     model: Optional[str] = None
     usage_input_tokens: Optional[int] = None
     usage_output_tokens: Optional[int] = None
+    # Per-phase wall time in seconds (api, backoff, extract, parse); parse
+    # includes evaluation, which happens in the same pass
+    timings: Dict[str, float] = field(default_factory=dict)
+    retries: int = 0
+    error: Optional[str] = None
+    usage_cached_tokens: Optional[int] = None
+    usage_reasoning_tokens: Optional[int] = None
+    # Streaming with early abort: the stream was cut once the prefix was invalid
+    aborted: bool = False
+    # Answered from the response cache (--cache/--replay): no API call was billed
+    from_cache: bool = False
+    # usage_* of an aborted stream estimated from the request and the deltas
+    usage_estimated: bool = False
 
 
-def run_cfg_math(
-    prompt: str, expected: Optional[float] = None, model: Optional[str] = None
-) -> MathRunResult:
-    tools = [
-        {
-            "type": "custom",
-            "name": "math_exp",
-            "description": "Creates valid mathematical expressions",
-            "format": {
-                "type": "grammar",
-                "syntax": "lark",
-                "definition": ARITH_LARK,
-            },
-        }
-    ]
+MATH_TOOLS: List[dict] = [
+    {
+        "type": "custom",
+        "name": "math_exp",
+        "description": "Creates valid mathematical expressions",
+        "format": {
+            "type": "grammar",
+            "syntax": "lark",
+            "definition": ARITH_LARK,
+        },
+    }
+]
+
+
+def _math_request(prompt: str) -> Tuple[str, List[dict]]:
     # Ask the model to use the tool to produce only an expression
     inp = f"Use the math_exp tool to produce only one expression for: {prompt}"
-    resp = responses_create(input=inp, tools=tools, model=model)
+    return inp, MATH_TOOLS
+
+
+def _math_result(
+    prompt: str,
+    expected: Optional[float],
+    model: Optional[str],
+    resp: Any,
+    stats: Optional[RequestStats] = None,
+) -> MathRunResult:
     used_model = getattr(resp, "model", None) or model
-    in_tok, out_tok = extract_usage(resp)
+    usage = extract_usage_details(resp)
+    timings = request_timings(stats)
 
     # Extract expression text from custom tool call if present; fallback to output_text
-    expr: str = ""
-    out = getattr(resp, "output", None)
-    if isinstance(out, list):
-        for item in out:
-            typ = getattr(item, "type", None) or getattr(item, "object", None)
-            if typ == "custom_tool_call" and getattr(item, "name", None) == "math_exp":
-                candidate = getattr(item, "input", None)
-                if isinstance(candidate, str):
-                    expr = candidate
-                    break
-    if not expr:
-        txt = output_text(resp)
-        if isinstance(txt, str):
-            expr = txt
-    expr = expr.strip()
+    with timed(timings, "extract"):
+        expr = custom_tool_input(resp, "math_exp")
 
     parsed_ok = False
     value: Optional[float] = None
+    error: Optional[str] = None
+    # Validation and evaluation share one parse, timed as "parse"
     try:
-        parser.parse(expr)
+        with timed(timings, "parse"):
+            value = evaluate(expr)
+        parsed_ok = True
+    except ArithDivisionByZero as e:
         parsed_ok = True
-        value = safe_eval_arith(expr)
-    except Exception:
-        parsed_ok = False
+        error = str(e)
+    except LarkError as e:
+        error = type(e).__name__
 
     return MathRunResult(
         prompt=prompt,
@@ -125,9 +245,101 @@ def run_cfg_math(
         value=value,
         expected=expected,
         model=used_model,
-        usage_input_tokens=in_tok,
-        usage_output_tokens=out_tok,
+        usage_input_tokens=usage.input_tokens,
+        usage_output_tokens=usage.output_tokens,
+        usage_cached_tokens=usage.cached_tokens,
+        usage_reasoning_tokens=usage.reasoning_tokens,
+        timings=timings,
+        retries=stats.retries if stats is not None else 0,
+        error=error,
+        from_cache=stats.cached if stats is not None else False,
+    )
+
+
+def _aborted_math_result(
+    prompt: str,
+    expected: Optional[float],
+    model: Optional[str],
+    validator: PrefixValidator,
+    stats: RequestStats,
+) -> MathRunResult:
+    # No final response: the expression is the prefix, and the tokens
+    # streamed so far are billed even though the call was cut
+    usage, estimated = aborted_usage(stats, *_math_request(prompt))
+    return MathRunResult(
+        prompt=prompt,
+        expression=validator.text.strip(),
+        parsed_ok=False,
+        value=None,
+        expected=expected,
+        model=model,
+        usage_input_tokens=usage.input_tokens,
+        usage_output_tokens=usage.output_tokens,
+        usage_cached_tokens=usage.cached_tokens,
+        usage_reasoning_tokens=usage.reasoning_tokens,
+        usage_estimated=estimated,
+        timings=request_timings(stats),
+        retries=stats.retries,
+        error=f"aborted: {validator.error}",
+        aborted=True,
+    )
+
+
+def run_cfg_math(
+    prompt: str,
+    expected: Optional[float] = None,
+    model: Optional[str] = None,
+    stream: bool = False,
+    early_abort: bool = False,
+) -> MathRunResult:
+    """Run one case; `stream` validates the tool input as it arrives.
+
+    With `early_abort` the stream is closed as soon as the expression can
+    no longer parse.
+    """
+    inp, tools = _math_request(prompt)
+    stats = RequestStats()
+    if not stream:
+        resp = responses_create(input=inp, tools=tools, model=model, stats=stats)
+        return _math_result(prompt, expected, model, resp, stats)
+    validator = PrefixValidator(_parser())
+    resp = responses_stream(
+        input=inp,
+        tools=tools,
+        model=model,
+        stats=stats,
+        on_delta=validator.delta_callback(early_abort),
+    )
+    if resp is None:
+        return _aborted_math_result(prompt, expected, model, validator, stats)
+    return _math_result(prompt, expected, model, resp, stats)
+
+
+async def run_cfg_math_async(
+    prompt: str,
+    expected: Optional[float] = None,
+    model: Optional[str] = None,
+    stream: bool = False,
+    early_abort: bool = False,
+) -> MathRunResult:
+    inp, tools = _math_request(prompt)
+    stats = RequestStats()
+    if not stream:
+        resp = await responses_create_async(
+            input=inp, tools=tools, model=model, stats=stats
+        )
+        return _math_result(prompt, expected, model, resp, stats)
+    validator = PrefixValidator(_parser())
+    resp = await responses_stream_async(
+        input=inp,
+        tools=tools,
+        model=model,
+        stats=stats,
+        on_delta=validator.delta_callback(early_abort),
     )
+    if resp is None:
+        return _aborted_math_result(prompt, expected, model, validator, stats)
+    return _math_result(prompt, expected, model, resp, stats)
 
 
 def default_math_cases() -> List[Tuple[str, Optional[float]]]:
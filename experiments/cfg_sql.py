@@ -1,12 +1,34 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Any, List, Optional, Sequence, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, FrozenSet, Hashable, List, Optional, Sequence, Tuple
 
+import hashlib
+import os
+import re
 import sqlite3
+import threading
+import time
+
 from lark import Lark
+from lark.exceptions import LarkError
 
-from lib.openai_client import responses_create, output_text, extract_usage
+from experiments.pipeline import current_pipeline
+from experiments.sql_canonical import canonical_sql
+from experiments.sql_dataset import dataset_version, open_dataset
+from lib.grammar import PrefixValidator, grammar_hash, load_parser
+from lib.metrics import request_timings, timed
+from lib.openai_client import (
+    RequestStats,
+    aborted_usage,
+    custom_tool_input,
+    extract_usage_details,
+    responses_create,
+    responses_create_async,
+    responses_stream,
+    responses_stream_async,
+)
 
 
 """
@@ -55,11 +77,41 @@ SQSTRING: "'" /[^']*/ "'"
 """
 
 
-parser = Lark(SQL_LARK, start="start", parser="earley")
+_parsers: Dict[str, Lark] = {}
 
 
-def _init_sample_db() -> sqlite3.Connection:
-    con = sqlite3.connect(":memory:")
+def _parser() -> Lark:
+    p = _parsers.get("default")
+    if p is None:
+        p = _parsers["default"] = load_parser(SQL_LARK, start="start")
+    return p
+
+
+def _canonical_parser() -> Lark:
+    # Same grammar, but the tree keeps keyword tokens (table and column names)
+    # so the query can be canonicalized; used for the post-hoc parse
+    p = _parsers.get("canonical")
+    if p is None:
+        p = _parsers["canonical"] = load_parser(SQL_LARK, start="start", keep_all_tokens=True)
+    return p
+
+
+def __getattr__(name: str) -> Any:
+    # `parser` and `canonical_parser` are built on first access, not at import
+    if name == "parser":
+        return _parser()
+    if name == "canonical_parser":
+        return _canonical_parser()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+SQL_COLUMNS: Dict[str, FrozenSet[str]] = {
+    "users": frozenset({"id", "name", "age", "city"}),
+    "orders": frozenset({"id", "user_id", "amount", "status"}),
+}
+
+
+def _populate_sample_db(con: sqlite3.Connection) -> None:
     cur = con.cursor()
     cur.execute(
         """
@@ -105,9 +157,254 @@ def _init_sample_db() -> sqlite3.Connection:
         "INSERT INTO orders(id, user_id, amount, status) VALUES(?, ?, ?, ?)", orders
     )
     con.commit()
+
+
+def _init_sample_db() -> sqlite3.Connection:
+    con = sqlite3.connect(":memory:")
+    _populate_sample_db(con)
     return con
 
 
+# The fixture is built once per process as a named shared-cache in-memory
+# database. Runs attach to it with query_only connections, so per-case
+# setup is a connect() regardless of fixture size, and generated SQL
+# cannot modify the shared data.
+_template_lock = threading.Lock()
+_template: Optional[sqlite3.Connection] = None
+_template_pid: Optional[int] = None
+
+
+def _template_uri() -> str:
+    return f"file:cfg_sql_sample_{os.getpid()}?mode=memory&cache=shared"
+
+
+def _sample_template() -> sqlite3.Connection:
+    global _template, _template_pid
+    with _template_lock:
+        # sqlite handles must not cross fork(); rebuild in child processes
+        if _template is None or _template_pid != os.getpid():
+            con = sqlite3.connect(_template_uri(), uri=True, check_same_thread=False)
+            _populate_sample_db(con)
+            _template, _template_pid = con, os.getpid()
+        return _template
+
+
+def open_sample_db() -> sqlite3.Connection:
+    """Return an isolated read-only connection onto the per-process fixture."""
+    _sample_template()
+    con = sqlite3.connect(_template_uri(), uri=True, check_same_thread=False)
+    con.execute("PRAGMA query_only = ON")
+    return con
+
+
+def open_db(dataset: Optional[str] = None) -> sqlite3.Connection:
+    """Open the generated dataset at `dataset`, or the sample fixture if None."""
+    return open_sample_db() if dataset is None else open_dataset(dataset)
+
+
+@dataclass(frozen=True)
+class SqlLimits:
+    """Resource bounds for executing a generated query (None = unbounded)."""
+
+    timeout_s: Optional[float] = None
+    max_vm_steps: Optional[int] = None
+    max_rows: Optional[int] = None
+    sample_rows: int = 20
+
+
+# VM instructions between progress-handler callbacks
+_PROGRESS_INTERVAL = 1000
+_FETCH_BATCH = 512
+
+
+@dataclass
+class SqlExecution:
+    executed_ok: bool
+    columns: List[str]
+    sample: List[Tuple[Any, ...]]
+    row_count: int
+    digest: Optional[str]
+    error: Optional[str] = None
+    timed_out: bool = False
+    truncated: bool = False
+    # EXPLAIN QUERY PLAN detail lines
+    plan: List[str] = field(default_factory=list)
+    # Served from the execution cache rather than run
+    cached: bool = False
+
+
+def execute_query(
+    con: sqlite3.Connection, query: str, limits: SqlLimits = SqlLimits()
+) -> SqlExecution:
+    """Stream a query's rows with fetchmany under a time/VM-step budget.
+
+    Only the first `limits.sample_rows` rows are kept; the full result is
+    summarized by its row count and a SHA-256 digest over the row reprs.
+    Fetching stops once `limits.max_rows` rows have been seen.
+    """
+    deadline = (
+        time.perf_counter() + limits.timeout_s if limits.timeout_s is not None else None
+    )
+    steps = 0
+    interrupted: Optional[str] = None
+
+    def on_progress() -> int:
+        nonlocal steps, interrupted
+        steps += _PROGRESS_INTERVAL
+        if deadline is not None and time.perf_counter() > deadline:
+            interrupted = f"timed out after {limits.timeout_s}s"
+            return 1
+        if limits.max_vm_steps is not None and steps > limits.max_vm_steps:
+            interrupted = f"exceeded {limits.max_vm_steps} VM steps"
+            return 1
+        return 0
+
+    bounded = deadline is not None or limits.max_vm_steps is not None
+    if bounded:
+        con.set_progress_handler(on_progress, _PROGRESS_INTERVAL)
+    cols: List[str] = []
+    sample: List[Tuple[Any, ...]] = []
+    count = 0
+    digest = hashlib.sha256()
+    truncated = False
+    try:
+        cur = con.execute(query)
+        cols = [d[0] for d in cur.description] if cur.description else []
+        while True:
+            want = _FETCH_BATCH
+            if limits.max_rows is not None:
+                want = min(want, limits.max_rows - count)
+                if want <= 0:
+                    truncated = cur.fetchone() is not None
+                    break
+            batch = cur.fetchmany(want)
+            if not batch:
+                break
+            for row in batch:
+                digest.update(repr(row).encode("utf-8"))
+            if len(sample) < limits.sample_rows:
+                sample.extend(batch[: limits.sample_rows - len(sample)])
+            count += len(batch)
+        cur.close()
+    except Exception as e:  # noqa: BLE001
+        return SqlExecution(
+            executed_ok=False,
+            columns=cols,
+            sample=sample,
+            row_count=count,
+            digest=None,
+            error=interrupted or str(e),
+            timed_out=interrupted is not None,
+        )
+    finally:
+        if bounded:
+            con.set_progress_handler(None, 0)
+    return SqlExecution(
+        executed_ok=True,
+        columns=cols,
+        sample=sample,
+        row_count=count,
+        digest=digest.hexdigest(),
+        truncated=truncated,
+    )
+
+
+def explain_query(con: sqlite3.Connection, query: str) -> List[str]:
+    """The EXPLAIN QUERY PLAN detail lines for `query`; empty if it does not compile."""
+    try:
+        return [str(row[-1]) for row in con.execute("EXPLAIN QUERY PLAN " + query)]
+    except Exception:  # noqa: BLE001
+        return []
+
+
+# "SCAN users" is a full table scan; "SCAN users USING INDEX ..." and
+# "SEARCH ..." are not. SQLite < 3.36 writes "SCAN TABLE users".
+_FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+
+
+def full_scan_tables(plan: Sequence[str]) -> List[str]:
+    """Tables a plan reads in full, in plan order."""
+    return [m.group(1) for m in map(_FULL_SCAN.match, plan) if m]
+
+
+class ExecutionCache:
+    """Bounded LRU of query executions, keyed by (dataset version, limits, canonical query).
+
+    Equivalent generated queries (see sql_canonical) run once per dataset;
+    later ones get the stored execution marked `cached`. Timed-out runs
+    are not stored, since they depend on load.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, SqlExecution]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[SqlExecution]:
+        with self._lock:
+            ex = self._entries.get(key)
+            if ex is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return replace(ex, cached=True)
+
+    def put(self, key: Hashable, ex: SqlExecution) -> None:
+        if self.max_entries <= 0 or ex.timed_out:
+            return
+        with self._lock:
+            self._entries[key] = ex
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_exec_cache = ExecutionCache(int(os.getenv("CFG_SQL_EXEC_CACHE_SIZE", "4096")))
+
+
+def configure_execution_cache(max_entries: int) -> None:
+    """Replace the process-wide execution cache (0 disables it)."""
+    global _exec_cache
+    _exec_cache = ExecutionCache(max_entries)
+
+
+def execution_cache_stats() -> Dict[str, int]:
+    return {"hits": _exec_cache.hits, "misses": _exec_cache.misses}
+
+
+def execute_canonical(
+    query: str,
+    canonical: Optional[str],
+    dataset: Optional[str] = None,
+    limits: SqlLimits = SqlLimits(),
+) -> SqlExecution:
+    """Plan and execute `query`, reusing the execution of an equivalent query.
+
+    `query` itself is what runs; `canonical` (None if it did not parse)
+    only keys the cache.
+    """
+    key = None
+    if canonical is not None and _exec_cache.max_entries > 0:
+        version = "sample" if dataset is None else dataset_version(dataset)
+        key = (version, limits, canonical)
+        hit = _exec_cache.get(key)
+        if hit is not None:
+            return hit
+    con = open_db(dataset)
+    try:
+        plan = explain_query(con, query)
+        ex = execute_query(con, query, limits)
+    finally:
+        con.close()
+    ex.plan = plan
+    if key is not None:
+        _exec_cache.put(key, ex)
+    return ex
+
+
 @dataclass
 class SqlRunResult:
     prompt: str
@@ -115,120 +412,346 @@ class SqlRunResult:
     parsed_ok: bool
     executed_ok: bool
     columns: Sequence[str]
+    # A sample of the result (first SqlLimits.sample_rows rows); see row_count
     rows: Sequence[Tuple[Any, ...]]
     error: Optional[str]
     model: Optional[str] = None
     usage_input_tokens: Optional[int] = None
     usage_output_tokens: Optional[int] = None
     expected_rows: Optional[int] = None
+    row_count: int = 0
+    rows_digest: Optional[str] = None
+    timed_out: bool = False
+    truncated: bool = False
+    # Per-phase wall time in seconds (api, backoff, extract, parse, execute)
+    timings: Dict[str, float] = field(default_factory=dict)
+    retries: int = 0
+    usage_cached_tokens: Optional[int] = None
+    usage_reasoning_tokens: Optional[int] = None
+    # Streaming with early abort: the stream was cut once the prefix was
+    # invalid, so the query was neither completed nor executed
+    aborted: bool = False
+    # Normalized form used as the execution cache key (None if unparsed)
+    canonical_query: Optional[str] = None
+    query_plan: List[str] = field(default_factory=list)
+    # Tables the plan reads without an index
+    full_scans: List[str] = field(default_factory=list)
+    execution_cached: bool = False
+    # Why a query that parsed could not be canonicalized (it then ran uncached)
+    canonical_error: Optional[str] = None
+    # Answered from the response cache (--cache/--replay): no API call was billed
+    from_cache: bool = False
+    # usage_* of an aborted stream estimated from the request and the deltas
+    usage_estimated: bool = False
 
 
-def run_cfg_sql(
-    prompt: str, model: Optional[str] = None, expected_rows: Optional[int] = None
-) -> SqlRunResult:
-    tools = [
-        {
-            "type": "custom",
-            "name": "sql_query",
-            "description": "Creates a minimal SQL SELECT query for the users table.",
-            "format": {
-                "type": "grammar",
-                "syntax": "lark",
-                "definition": SQL_LARK,
-            },
-        }
+# Everything static goes first and is built once, so every request starts
+# with the same bytes (tools, then the developer message) and the provider's
+# prompt cache can serve that prefix; only the user task varies.
+SQL_TOOLS: List[dict] = [
+    {
+        "type": "custom",
+        "name": "sql_query",
+        "description": "Creates a minimal SQL SELECT query for the users table.",
+        "format": {
+            "type": "grammar",
+            "syntax": "lark",
+            "definition": SQL_LARK,
+        },
+    }
+]
+SQL_INSTRUCTIONS = (
+    "Use the sql_query tool to output only one SQL statement. "
+    "Use uppercase keywords. Available tables and schema are:\n"
+    "CREATE TABLE users (\n"
+    "  id INTEGER PRIMARY KEY,\n"
+    "  name TEXT NOT NULL,\n"
+    "  age INTEGER NOT NULL,\n"
+    "  city TEXT NOT NULL\n"
+    ");\n"
+    "city: Tokyo, Osaka, Nagoya, Kyoto, Sapporo\n"
+    "CREATE TABLE orders (\n"
+    "  id INTEGER PRIMARY KEY,\n"
+    "  user_id INTEGER NOT NULL,\n"
+    "  amount INTEGER NOT NULL,\n"
+    "  status TEXT NOT NULL,\n"
+    "  FOREIGN KEY(user_id) REFERENCES users(id)\n"
+    ");\n"
+    "status: paid, pending, cancelled\n"
+    "Boolean operators supported: AND, OR, NOT. Use parentheses to group conditions when needed. "
+    "Prefer qualified column names (table.column)."
+)
+SQL_PROMPT_CACHE_KEY = "cfg-sql-" + grammar_hash(SQL_INSTRUCTIONS + SQL_LARK)
+
+
+def _sql_request(prompt: str) -> Tuple[List[dict], List[dict]]:
+    inp = [
+        {"role": "developer", "content": SQL_INSTRUCTIONS},
+        {"role": "user", "content": f"Task: {prompt}"},
     ]
-    instruction = (
-        "Use the sql_query tool to output only one SQL statement. "
-        "Use uppercase keywords. Available tables and schema are:\n"
-        "CREATE TABLE users (\n"
-        "  id INTEGER PRIMARY KEY,\n"
-        "  name TEXT NOT NULL,\n"
-        "  age INTEGER NOT NULL,\n"
-        "  city TEXT NOT NULL\n"
-        ");\n"
-        "city: Tokyo, Osaka, Nagoya, Kyoto, Sapporo\n"
-        "CREATE TABLE orders (\n"
-        "  id INTEGER PRIMARY KEY,\n"
-        "  user_id INTEGER NOT NULL,\n"
-        "  amount INTEGER NOT NULL,\n"
-        "  status TEXT NOT NULL,\n"
-        "  FOREIGN KEY(user_id) REFERENCES users(id)\n"
-        ");\n"
-        "status: paid, pending, cancelled\n"
-        "Boolean operators supported: AND, OR, NOT. Use parentheses to group conditions when needed. "
-        "Prefer qualified column names (table.column)."
-    )
-    inp = f"{instruction} Task: {prompt}"
-    resp = responses_create(input=inp, tools=tools, model=model)
-    used_model = getattr(resp, "model", None) or model
-    in_tok, out_tok = extract_usage(resp)
+    return inp, SQL_TOOLS
 
-    # Extract query text from custom tool call when possible
-    query: str = ""
-    out = getattr(resp, "output", None)
-    if isinstance(out, list):
-        for item in out:
-            typ = getattr(item, "type", None) or getattr(item, "object", None)
-            if typ == "custom_tool_call" and getattr(item, "name", None) == "sql_query":
-                candidate = getattr(item, "input", None)
-                if isinstance(candidate, str):
-                    query = candidate
-                    break
-    if not query:
-        txt = output_text(resp)
-        if isinstance(txt, str):
-            query = txt
-    query = query.strip()
 
-    parsed_ok = False
-    try:
-        parser.parse(query)
-        parsed_ok = True
-    except Exception:
-        parsed_ok = False
+@dataclass
+class _ValidatedSql:
+    query: str
+    parsed_ok: bool
+    # Execution cache key; None if the query did not parse or canonicalize
+    canonical: Optional[str] = None
+    canonical_error: Optional[str] = None
 
-    executed_ok = False
-    cols: List[str] = []
-    rows: List[Tuple[Any, ...]] = []
-    err: Optional[str] = None
-    con = _init_sample_db()
+
+def _validate_sql(resp: Any, timings: Dict[str, float]) -> _ValidatedSql:
+    """Extract the tool input, parse it and canonicalize the parse tree."""
+    # Extract query text from custom tool call when possible
+    with timed(timings, "extract"):
+        query = custom_tool_input(resp, "sql_query")
     try:
-        cur = con.execute(query)
-        cols = [d[0] for d in cur.description] if cur.description else []
-        rows = cur.fetchall()
-        executed_ok = True
-    except Exception as e:  # noqa: BLE001
-        err = str(e)
-        executed_ok = False
-    finally:
-        con.close()
+        with timed(timings, "parse"):
+            tree = _canonical_parser().parse(query)
+    except LarkError:
+        return _ValidatedSql(query, parsed_ok=False)
+    try:
+        with timed(timings, "canonicalize"):
+            canonical = canonical_sql(tree, SQL_COLUMNS)
+    except Exception as e:
+        # A canonicalizer bug must not turn a valid query into a parse failure;
+        # the query still runs, just without the execution cache
+        return _ValidatedSql(query, parsed_ok=True, canonical_error=f"{type(e).__name__}: {e}")
+    return _ValidatedSql(query, parsed_ok=True, canonical=canonical)
+
+
+def _execute_sql(
+    v: _ValidatedSql, dataset: Optional[str], limits: SqlLimits, timings: Dict[str, float]
+) -> SqlExecution:
+    with timed(timings, "execute"):
+        return execute_canonical(v.query, v.canonical, dataset, limits)
+
 
+def _sql_run_result(
+    prompt: str,
+    model: Optional[str],
+    expected_rows: Optional[int],
+    resp: Any,
+    stats: Optional[RequestStats],
+    timings: Dict[str, float],
+    v: _ValidatedSql,
+    ex: SqlExecution,
+) -> SqlRunResult:
+    usage = extract_usage_details(resp)
     return SqlRunResult(
         prompt=prompt,
-        query=query,
-        parsed_ok=parsed_ok,
-        executed_ok=executed_ok,
-        columns=cols,
-        rows=rows,
-        error=err,
-        model=used_model,
-        usage_input_tokens=in_tok,
-        usage_output_tokens=out_tok,
+        query=v.query,
+        parsed_ok=v.parsed_ok,
+        executed_ok=ex.executed_ok,
+        columns=ex.columns,
+        rows=ex.sample,
+        error=ex.error,
+        model=getattr(resp, "model", None) or model,
+        usage_input_tokens=usage.input_tokens,
+        usage_output_tokens=usage.output_tokens,
+        usage_cached_tokens=usage.cached_tokens,
+        usage_reasoning_tokens=usage.reasoning_tokens,
         expected_rows=expected_rows,
+        row_count=ex.row_count,
+        rows_digest=ex.digest,
+        timed_out=ex.timed_out,
+        truncated=ex.truncated,
+        timings=timings,
+        retries=stats.retries if stats is not None else 0,
+        canonical_query=v.canonical,
+        query_plan=ex.plan,
+        full_scans=full_scan_tables(ex.plan),
+        execution_cached=ex.cached,
+        canonical_error=v.canonical_error,
+        from_cache=stats.cached if stats is not None else False,
     )
 
 
-def default_sql_cases() -> List[Tuple[str, Optional[int]]]:
-    return [
-        # 1) 単純条件 + LIMIT（日本語指示）
-        ("30歳を超える利用者の一覧が欲しいです。idとnameだけ、最大3件でお願いします。", 3),
-        # 2) OR/AND と括弧（日本語指示）
-        ("居住地が東京または京都、かつ年齢が33歳以上の人のidとnameをください（上限10件）。", 2),
-        # 3) NOT を含む（日本語指示）
-        ("東京在住は除外し、30歳未満のユーザーを探してください。全てのカラムで、10件まで。", 2),
-        # 4) JOIN + 数値条件（日本語指示）
-        ("注文データと結合して、金額が100より大きい注文について、ユーザー名と金額を5件ほど見たいです。", 5),
-        # 5) JOIN + 複合条件（日本語指示）
-        ("支払い状態が paid で、金額が150以上の注文に限って、ユーザー名と金額を10件まで取得してください。", 4),
-    ]
+def _sql_result(
+    prompt: str,
+    model: Optional[str],
+    expected_rows: Optional[int],
+    resp: Any,
+    dataset: Optional[str] = None,
+    limits: SqlLimits = SqlLimits(),
+    stats: Optional[RequestStats] = None,
+) -> SqlRunResult:
+    timings = request_timings(stats)
+    v = _validate_sql(resp, timings)
+    ex = _execute_sql(v, dataset, limits, timings)
+    return _sql_run_result(prompt, model, expected_rows, resp, stats, timings, v, ex)
+
+
+async def _sql_result_async(
+    prompt: str,
+    model: Optional[str],
+    expected_rows: Optional[int],
+    resp: Any,
+    dataset: Optional[str],
+    limits: SqlLimits,
+    stats: RequestStats,
+) -> SqlRunResult:
+    """_sql_result through the running suite's validate and execute stages, if any."""
+    pipe = current_pipeline()
+    if pipe is None:
+        return _sql_result(prompt, model, expected_rows, resp, dataset, limits, stats)
+    timings = request_timings(stats)
+    v = await pipe.validate.submit(_validate_sql, resp, timings, timings=timings)
+    ex = await pipe.execute.submit(
+        _execute_sql, v, dataset, limits, timings, timings=timings, handoff=True
+    )
+    return _sql_run_result(prompt, model, expected_rows, resp, stats, timings, v, ex)
+
+
+def _aborted_sql_result(
+    prompt: str,
+    model: Optional[str],
+    expected_rows: Optional[int],
+    validator: PrefixValidator,
+    stats: RequestStats,
+) -> SqlRunResult:
+    # The tokens streamed before the cut are billed like a finished call's
+    usage, estimated = aborted_usage(stats, *_sql_request(prompt))
+    return SqlRunResult(
+        prompt=prompt,
+        query=validator.text.strip(),
+        parsed_ok=False,
+        executed_ok=False,
+        columns=[],
+        rows=[],
+        error=f"aborted: {validator.error}",
+        model=model,
+        usage_input_tokens=usage.input_tokens,
+        usage_output_tokens=usage.output_tokens,
+        usage_cached_tokens=usage.cached_tokens,
+        usage_reasoning_tokens=usage.reasoning_tokens,
+        usage_estimated=estimated,
+        expected_rows=expected_rows,
+        timings=request_timings(stats),
+        retries=stats.retries,
+        aborted=True,
+    )
+
+
+def run_cfg_sql(
+    prompt: str,
+    model: Optional[str] = None,
+    expected_rows: Optional[int] = None,
+    dataset: Optional[str] = None,
+    limits: SqlLimits = SqlLimits(),
+    stream: bool = False,
+    early_abort: bool = False,
+) -> SqlRunResult:
+    """Run one case; `stream` validates the query as it arrives.
+
+    With `early_abort` the stream is closed as soon as the query can no
+    longer parse, and nothing is executed.
+    """
+    inp, tools = _sql_request(prompt)
+    stats = RequestStats()
+    if not stream:
+        resp = responses_create(
+            input=inp,
+            tools=tools,
+            model=model,
+            stats=stats,
+            prompt_cache_key=SQL_PROMPT_CACHE_KEY,
+        )
+        return _sql_result(prompt, model, expected_rows, resp, dataset, limits, stats)
+    validator = PrefixValidator(_parser())
+    resp = responses_stream(
+        input=inp,
+        tools=tools,
+        model=model,
+        stats=stats,
+        prompt_cache_key=SQL_PROMPT_CACHE_KEY,
+        on_delta=validator.delta_callback(early_abort),
+    )
+    if resp is None:
+        return _aborted_sql_result(prompt, model, expected_rows, validator, stats)
+    return _sql_result(prompt, model, expected_rows, resp, dataset, limits, stats)
+
+
+async def run_cfg_sql_async(
+    prompt: str,
+    model: Optional[str] = None,
+    expected_rows: Optional[int] = None,
+    dataset: Optional[str] = None,
+    limits: SqlLimits = SqlLimits(),
+    stream: bool = False,
+    early_abort: bool = False,
+) -> SqlRunResult:
+    inp, tools = _sql_request(prompt)
+    stats = RequestStats()
+    if not stream:
+        resp = await responses_create_async(
+            input=inp,
+            tools=tools,
+            model=model,
+            stats=stats,
+            prompt_cache_key=SQL_PROMPT_CACHE_KEY,
+        )
+        return await _sql_result_async(
+            prompt, model, expected_rows, resp, dataset, limits, stats
+        )
+    validator = PrefixValidator(_parser())
+    resp = await responses_stream_async(
+        input=inp,
+        tools=tools,
+        model=model,
+        stats=stats,
+        prompt_cache_key=SQL_PROMPT_CACHE_KEY,
+        on_delta=validator.delta_callback(early_abort),
+    )
+    if resp is None:
+        return _aborted_sql_result(prompt, model, expected_rows, validator, stats)
+    return await _sql_result_async(
+        prompt, model, expected_rows, resp, dataset, limits, stats
+    )
+
+
+# (prompt, reference query); expected row counts are computed by running
+# the reference against the target database.
+SQL_REFERENCE_CASES: List[Tuple[str, str]] = [
+    # 1) 単純条件 + LIMIT（日本語指示）
+    (
+        "30歳を超える利用者の一覧が欲しいです。idとnameだけ、最大3件でお願いします。",
+        "SELECT users.id, users.name FROM users WHERE users.age > 30 LIMIT 3",
+    ),
+    # 2) OR/AND と括弧（日本語指示）
+    (
+        "居住地が東京または京都、かつ年齢が33歳以上の人のidとnameをください（上限10件）。",
+        "SELECT users.id, users.name FROM users WHERE (users.city = 'Tokyo' OR users.city = 'Kyoto') AND users.age >= 33 LIMIT 10",
+    ),
+    # 3) NOT を含む（日本語指示）
+    (
+        "東京在住は除外し、30歳未満のユーザーを探してください。全てのカラムで、10件まで。",
+        "SELECT * FROM users WHERE NOT users.city = 'Tokyo' AND users.age < 30 LIMIT 10",
+    ),
+    # 4) JOIN + 数値条件（日本語指示）
+    (
+        "注文データと結合して、金額が100より大きい注文について、ユーザー名と金額を5件ほど見たいです。",
+        "SELECT users.name, orders.amount FROM users JOIN orders ON users.id = orders.user_id WHERE orders.amount > 100 LIMIT 5",
+    ),
+    # 5) JOIN + 複合条件（日本語指示）
+    (
+        "支払い状態が paid で、金額が150以上の注文に限って、ユーザー名と金額を10件まで取得してください。",
+        "SELECT users.name, orders.amount FROM users JOIN orders ON users.id = orders.user_id WHERE orders.status = 'paid' AND orders.amount >= 150 LIMIT 10",
+    ),
+]
+
+
+def expected_row_count(con: sqlite3.Connection, reference: str) -> int:
+    return int(con.execute(f"SELECT COUNT(*) FROM ({reference})").fetchone()[0])
+
+
+def default_sql_cases(dataset: Optional[str] = None) -> List[Tuple[str, Optional[int]]]:
+    con = open_db(dataset)
+    try:
+        return [
+            (prompt, expected_row_count(con, reference))
+            for prompt, reference in SQL_REFERENCE_CASES
+        ]
+    finally:
+        con.close()
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import json
+import os
+import secrets
+import threading
+import time
+from dataclasses import asdict, fields
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from experiments.cfg_math import MathRunResult
+from experiments.cfg_sql import SqlRunResult
+from experiments.suite import Case, SuiteRow
+
+
+"""
+JSONL checkpoints for suite runs.
+
+The first line is a header describing the run (kind, models, options);
+every following line is one finished (model, case) result, appended as
+soon as it completes. A run can be resumed by skipping the pairs already
+present, and reports are rendered from the file rather than from memory.
+"""
+
+RESULT_TYPES = {"math": MathRunResult, "sql": SqlRunResult}
+
+
+def new_run_id() -> str:
+    # The random suffix keeps runs started in the same second apart; the
+    # timestamp still sorts ids by start time
+    return f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(3)}"
+
+
+def checkpoint_path(out_dir: str | Path, run_id: str) -> Path:
+    return Path(out_dir) / "runs" / f"{run_id}.jsonl"
+
+
+def result_to_dict(res: Any) -> Dict[str, Any]:
+    return asdict(res)
+
+
+def result_from_dict(kind: str, data: Dict[str, Any]) -> Any:
+    cls = RESULT_TYPES[kind]
+    names = {f.name for f in fields(cls)}
+    kwargs = {k: v for k, v in data.items() if k in names}
+    if cls is SqlRunResult:
+        kwargs["rows"] = [tuple(r) for r in kwargs.get("rows", [])]
+    return cls(**kwargs)
+
+
+class Checkpoint:
+    """Append-only JSONL log of one suite run, fsync'd in batches."""
+
+    def __init__(
+        self,
+        path: str | Path,
+        header: Dict[str, Any],
+        done: Set[Tuple[str, int]],
+        fsync_every: int = 16,
+        fsync_interval_s: float = 2.0,
+    ) -> None:
+        self.path = Path(path)
+        self.header = header
+        # Only the finished pair keys stay in memory; rows() re-reads the file
+        self._done = done
+        self.fsync_every = fsync_every
+        self.fsync_interval_s = fsync_interval_s
+        self._lock = threading.Lock()
+        self._fh = open(self.path, "a", encoding="utf-8")
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    @classmethod
+    def create(cls, path: str | Path, header: Dict[str, Any], **kw: Any) -> "Checkpoint":
+        p = Path(path)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            # "x" so that two processes never both take the same path
+            fh = open(p, "x", encoding="utf-8")
+        except FileExistsError:
+            raise FileExistsError(f"checkpoint already exists: {p}") from None
+        with fh:
+            fh.write(json.dumps({"type": "run", **header}, ensure_ascii=False) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+        return cls(p, header, set(), **kw)
+
+    @classmethod
+    def open(cls, path: str | Path, **kw: Any) -> "Checkpoint":
+        # Drop a torn final line left by a crash so appends start cleanly
+        with open(path, "rb+") as fh:
+            data = fh.read()
+            end = data.rfind(b"\n") + 1
+            if end < len(data):
+                fh.truncate(end)
+        records = _iter_checkpoint(path)
+        header = next(records)
+        done = {(r["model"], r["case_index"]) for r in records}
+        return cls(path, header, done, **kw)
+
+    @property
+    def kind(self) -> str:
+        return self.header["kind"]
+
+    def done(self) -> Set[Tuple[str, int]]:
+        with self._lock:
+            return set(self._done)
+
+    def append(self, case_index: int, row: SuiteRow, sample: Optional[int] = None) -> None:
+        model, case, res, sec = row
+        rec = {
+            "type": "result",
+            "model": model,
+            "case_index": case_index,
+            "case": list(case),
+            "seconds": sec,
+            "result": result_to_dict(res),
+        }
+        if sample is not None:
+            rec["sample"] = sample
+        line = json.dumps(rec, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._fh.write(line)
+            self._fh.flush()
+            self._done.add((model, case_index))
+            self._unsynced += 1
+            now = time.monotonic()
+            if (
+                self._unsynced >= self.fsync_every
+                or now - self._last_sync >= self.fsync_interval_s
+            ):
+                os.fsync(self._fh.fileno())
+                self._unsynced = 0
+                self._last_sync = now
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fh.closed:
+                return
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            self._fh.close()
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """The result records written so far, read back from the file."""
+        with self._lock:
+            if not self._fh.closed:
+                self._fh.flush()
+        records = _iter_checkpoint(self.path)
+        next(records)
+        return records
+
+    def rows(self) -> List[SuiteRow]:
+        return checkpoint_rows(self.header, list(self.records()))
+
+
+def _iter_checkpoint(path: str | Path) -> Iterator[Dict[str, Any]]:
+    # Header first, then result records, read lazily
+    with open(path, encoding="utf-8") as fh:
+        first = fh.readline()
+        header = json.loads(first) if first.endswith("\n") else {}
+        if header.get("type") != "run":
+            raise ValueError(f"not a suite checkpoint: {path}")
+        yield header
+        for line in fh:
+            if not line.endswith("\n"):
+                break  # torn final write from a crash; the pair will be re-run
+            obj = json.loads(line)
+            if obj.get("type") == "result":
+                yield obj
+
+
+def load_checkpoint(path: str | Path) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    records = _iter_checkpoint(path)
+    header = next(records)
+    return header, list(records)
+
+
+def checkpoint_rows(header: Dict[str, Any], records: List[Dict[str, Any]]) -> List[SuiteRow]:
+    """Suite rows in deterministic (model order, case index, sample) order.
+
+    If a pair (or sample of a pair) was recorded more than once, the last
+    record wins.
+    """
+    kind = header["kind"]
+    order = {m: i for i, m in enumerate(header.get("models", []))}
+    latest: Dict[Tuple[str, int, int], Dict[str, Any]] = {}
+    for r in records:
+        latest[(r["model"], r["case_index"], r.get("sample", 0))] = r
+    keys = sorted(latest, key=lambda k: (order.get(k[0], len(order)), k[0], k[1], k[2]))
+    return [
+        (
+            latest[k]["model"],
+            tuple(latest[k]["case"]),
+            result_from_dict(kind, latest[k]["result"]),
+            float(latest[k]["seconds"]),
+        )
+        for k in keys
+    ]
+
+
+def checkpoint_groups(
+    header: Dict[str, Any], records: List[Dict[str, Any]]
+) -> List[Tuple[str, int, Case, List[Tuple[Any, float]]]]:
+    """(model, case_index, case, [(result, seconds), ...]) per pair, in report order.
+
+    For sampled runs, where each pair has several results.
+    """
+    kind = header["kind"]
+    order = {m: i for i, m in enumerate(header.get("models", []))}
+    latest: Dict[Tuple[str, int, int], Dict[str, Any]] = {}
+    for r in records:
+        latest[(r["model"], r["case_index"], r.get("sample", 0))] = r
+    groups: Dict[Tuple[str, int], Tuple[Case, List[Tuple[Any, float]]]] = {}
+    for key in sorted(latest, key=lambda k: (order.get(k[0], len(order)), k[0], k[1], k[2])):
+        r = latest[key]
+        _case, samples = groups.setdefault((key[0], key[1]), (tuple(r["case"]), []))
+        samples.append((result_from_dict(kind, r["result"]), float(r["seconds"])))
+    return [(model, idx, case, samples) for (model, idx), (case, samples) in groups.items()]
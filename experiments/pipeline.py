@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import asyncio
+import queue
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, replace
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+
+"""
+Staged execution of a concurrent suite: generate -> validate -> execute.
+
+The generate stage is the suite's own concurrency slots, each awaiting
+an API call on the event loop. A runner hands the response to the
+validate stage (output extraction and grammar parsing) and the result of
+that to the execute stage (SQLite), each a few threads fed by a bounded
+queue. Handing off to the last stage frees the generation slot, so the
+next request goes out while the previous query runs; when a queue is full
+the hand-off waits, which holds the slot and so slows generation down to
+what the local stages keep up with. At most `concurrency` pairs are thus
+between starting their API call and being queued for execution.
+
+SQLite releases the GIL while a statement runs, so executions overlap
+with the event loop and each other. Parsing is pure Python; its pool
+takes it off the event loop but does not add CPU parallelism.
+"""
+
+
+@dataclass(frozen=True)
+class PipelineConfig:
+    """Worker counts of the local stages and the bound of each stage's queue."""
+
+    validate_workers: int = 2
+    execute_workers: int = 4
+    queue_size: int = 64
+
+    @property
+    def enabled(self) -> bool:
+        return self.validate_workers > 0 and self.execute_workers > 0
+
+    @classmethod
+    def parse(cls, spec: str) -> "PipelineConfig":
+        """"VALIDATE,EXECUTE[,QUEUE]" worker counts, e.g. "2,4,64"; "off" runs stages inline."""
+        spec = spec.strip().lower()
+        if spec in ("off", "0", "none"):
+            return cls(0, 0)
+        try:
+            nums = [int(x) for x in spec.split(",")]
+        except ValueError:
+            nums = []
+        if len(nums) not in (2, 3) or min(nums) < 1:
+            raise ValueError(f"pipeline spec {spec!r}: expected VALIDATE,EXECUTE[,QUEUE] or off")
+        return cls(*nums)
+
+    def __str__(self) -> str:
+        if not self.enabled:
+            return "off"
+        return f"{self.validate_workers},{self.execute_workers},{self.queue_size}"
+
+
+@dataclass
+class StageStats:
+    name: str
+    workers: int
+    items: int = 0
+    # Worker time spent on items
+    busy_s: float = 0.0
+    # Time items waited between submission and a worker picking them up
+    wait_s: float = 0.0
+    # Part of wait_s spent waiting for room in a full queue (backpressure)
+    blocked_s: float = 0.0
+    max_depth: int = 0
+    # Worker-seconds available: workers x wall time of the run
+    capacity_s: float = 0.0
+
+    @property
+    def utilization(self) -> float:
+        return self.busy_s / self.capacity_s if self.capacity_s > 0 else 0.0
+
+    def merge(self, other: "StageStats") -> None:
+        self.workers = max(self.workers, other.workers)
+        self.items += other.items
+        self.busy_s += other.busy_s
+        self.wait_s += other.wait_s
+        self.blocked_s += other.blocked_s
+        self.max_depth = max(self.max_depth, other.max_depth)
+        self.capacity_s += other.capacity_s
+
+
+class Stage:
+    """Worker threads behind a bounded queue.
+
+    The threads take items straight from the queue and post results back
+    to the event loop, so a busy loop does not hold up the next item.
+    """
+
+    def __init__(self, name: str, workers: int, queue_size: int) -> None:
+        self.stats = StageStats(name, workers)
+        self._loop = asyncio.get_running_loop()
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(queue_size)
+        self._lock = threading.Lock()
+        # Set from the worker threads whenever they take an item
+        self._room = asyncio.Event()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"cfg-{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def _worker(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            self._post(self._room.set)
+            fut, fn, args, submitted, timings = item
+            t0 = time.perf_counter()
+            if timings is not None:
+                timings["queue"] = timings.get("queue", 0.0) + t0 - submitted
+            try:
+                res, exc = fn(*args), None
+            except BaseException as e:
+                # Handed to the submitter, whatever it is; the thread keeps serving
+                res, exc = None, e
+            t1 = time.perf_counter()
+            with self._lock:
+                self.stats.items += 1
+                self.stats.busy_s += t1 - t0
+                self.stats.wait_s += t0 - submitted
+            self._post(_resolve, fut, res, exc)
+
+    def _post(self, fn: Callable[..., None], *args: Any) -> None:
+        try:
+            self._loop.call_soon_threadsafe(fn, *args)
+        except RuntimeError:
+            pass  # the loop is gone (run interrupted); nobody is waiting
+
+    async def submit(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        timings: Optional[Dict[str, float]] = None,
+        handoff: bool = False,
+    ) -> Any:
+        """Run `fn(*args)` on a stage thread, waiting for queue room first.
+
+        With `handoff` (the runner's last stage) the caller's generation
+        slot (see generation_slot) is freed once the item is queued. The
+        time the item waited is added to timings["queue"].
+        """
+        if self._closed:
+            raise RuntimeError(f"pipeline stage {self.stats.name} is closed")
+        fut = self._loop.create_future()
+        submitted = time.perf_counter()
+        item = (fut, fn, args, submitted, timings)
+        while True:
+            self._room.clear()
+            try:
+                self._queue.put_nowait(item)
+                break
+            except queue.Full:
+                await self._room.wait()
+        blocked = time.perf_counter() - submitted
+        with self._lock:
+            self.stats.blocked_s += blocked
+            self.stats.max_depth = max(self.stats.max_depth, self._queue.qsize())
+        release = _slot.get() if handoff else None
+        if release is not None:
+            release()
+        return await fut
+
+    def close(self) -> None:
+        # Nothing is queued once closed, so after the drain only the workers
+        # take from the queue
+        self._closed = True
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[0].cancel()  # its submitter was cancelled
+        # One stop marker per worker; posted from a thread, since the queue
+        # may be smaller than the pool and workers may be mid-item
+        threading.Thread(
+            target=lambda: [self._queue.put(None) for _ in self._threads],
+            name=f"cfg-{self.stats.name}-close",
+            daemon=True,
+        ).start()
+
+
+def _resolve(fut: asyncio.Future, res: Any, exc: Optional[BaseException]) -> None:
+    if fut.done():
+        return  # the submitter was cancelled
+    if exc is not None:
+        fut.set_exception(exc)
+    else:
+        fut.set_result(res)
+
+
+class Pipeline:
+    def __init__(self, config: PipelineConfig, generate_slots: int) -> None:
+        self.generate = StageStats("generate", generate_slots)
+        self.validate = Stage("validate", config.validate_workers, config.queue_size)
+        self.execute = Stage("execute", config.execute_workers, config.queue_size)
+        self._t0 = time.perf_counter()
+
+    def stats(self) -> List[StageStats]:
+        elapsed = time.perf_counter() - self._t0
+        return [
+            replace(s, capacity_s=s.workers * elapsed)
+            for s in (self.generate, self.validate.stats, self.execute.stats)
+        ]
+
+    def close(self) -> None:
+        self.validate.close()
+        self.execute.close()
+
+
+_config = PipelineConfig()
+_current: ContextVar[Optional[Pipeline]] = ContextVar("cfg_pipeline", default=None)
+# Frees the calling task's generation slot; set per task by generation_slot
+_slot: ContextVar[Optional[Callable[[], None]]] = ContextVar("cfg_generation_slot", default=None)
+_totals: Dict[str, StageStats] = {}
+
+
+def configure_pipeline(config: PipelineConfig) -> None:
+    """Stage sizes for the concurrent suites of this process ("off" runs them inline)."""
+    global _config
+    _config = config
+
+
+def current_pipeline() -> Optional[Pipeline]:
+    """The pipeline of the running suite, or None (sequential runs, pipeline off)."""
+    return _current.get()
+
+
+def pipeline_stats() -> List[StageStats]:
+    """Per-stage totals over the pipelines this process has run."""
+    return list(_totals.values())
+
+
+@asynccontextmanager
+async def pipeline_scope(generate_slots: int) -> AsyncIterator[Optional[Pipeline]]:
+    """Make the configured pipeline current for tasks created in the body."""
+    if not _config.enabled:
+        yield None
+        return
+    pipe = Pipeline(_config, generate_slots)
+    token = _current.set(pipe)
+    try:
+        yield pipe
+    finally:
+        _current.reset(token)
+        pipe.close()
+        for s in pipe.stats():
+            if s.name in _totals:
+                _totals[s.name].merge(s)
+            else:
+                _totals[s.name] = s
+
+
+@contextmanager
+def generation_slot(release: Callable[[], None]) -> Iterator[None]:
+    """Run the body as holding one generation slot; `release` frees it.
+
+    The runner's last stage submission (handoff=True) calls `release`
+    once its item is queued; otherwise it is called on exit. Call from inside the task
+    that holds the slot (each task has its own context).
+    """
+    pipe = _current.get()
+    t0 = time.perf_counter()
+    released = False
+
+    def release_once() -> None:
+        nonlocal released
+        if released:
+            return
+        released = True
+        if pipe is not None:
+            pipe.generate.busy_s += time.perf_counter() - t0
+            pipe.generate.items += 1
+        release()
+
+    token = _slot.set(release_once)
+    try:
+        yield
+    finally:
+        _slot.reset(token)
+        release_once()
+
+
+def pipeline_report(stats: List[StageStats]) -> str:
+    """One line per stage: workers, items, utilization and queueing."""
+    lines = []
+    for s in stats:
+        line = f"Pipeline {s.name}: {s.workers} x {s.utilization:.0%} busy, {s.items} items"
+        if s.name != "generate" and s.items:
+            line += (
+                f", queued {s.wait_s / s.items * 1000:.1f} ms avg"
+                f" (blocked {s.blocked_s:.1f}s), max depth {s.max_depth}"
+            )
+        lines.append(line)
+    return "\n".join(lines)
@@ -0,0 +1,349 @@
+from __future__ import annotations
+
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from experiments.suite import SuiteRow
+from lib.metrics import percentile, phase_report_lines, wilson_interval
+from lib.pricing import Spend, cache_savings_usd, cost_usd
+
+
+def _num(x: Optional[float]) -> str:
+    if x is None:
+        return ""
+    return str(int(x)) if float(x).is_integer() else f"{x}"
+
+
+def _usd(x: Optional[float]) -> str:
+    return "" if x is None else f"{x:.4f}"
+
+
+def prompt_cache_report_lines(rows: Sequence[SuiteRow]) -> List[str]:
+    """Provider prompt-cache hit ratio, plus estimated latency and cost saved, per model.
+
+    Latency saved is estimated as (mean API time of calls without cached
+    tokens - mean API time of calls with them) x calls with cached tokens,
+    so it needs both kinds of calls for a model.
+    """
+    per_model: Dict[str, Dict[str, Any]] = {}
+    for model, _case, r, _sec in rows:
+        m = per_model.setdefault(
+            model,
+            {"calls": 0, "hit_calls": 0, "input": 0, "cached": 0, "hit_api": [],
+             "miss_api": [], "cost": None, "saved": None},
+        )
+        # Response-cache answers made no call, and estimated usage of aborted
+        # streams says nothing about the prompt cache
+        if (
+            r.usage_input_tokens is None
+            or getattr(r, "from_cache", False)
+            or getattr(r, "usage_estimated", False)
+        ):
+            continue
+        cached = getattr(r, "usage_cached_tokens", None) or 0
+        m["calls"] += 1
+        m["input"] += r.usage_input_tokens
+        m["cached"] += cached
+        m["hit_calls"] += 1 if cached else 0
+        api = (r.timings or {}).get("api")
+        if api:
+            (m["hit_api"] if cached else m["miss_api"]).append(api)
+        priced_model = r.model or model
+        cost = cost_usd(priced_model, r.usage_input_tokens, r.usage_output_tokens, cached)
+        if cost is not None:
+            m["cost"] = (m["cost"] or 0.0) + cost
+        saved = cache_savings_usd(priced_model, cached)
+        if saved is not None:
+            m["saved"] = (m["saved"] or 0.0) + saved
+    lines = ["", "## Prompt cache", ""]
+    lines.append(
+        "| Model | Calls | Input tokens | Cached tokens | Hit ratio | Calls with hits | Est. latency saved (s) | Cost ($) | Cost saved ($) |"
+    )
+    lines.append("|:---:|---:|---:|---:|---:|---:|---:|---:|---:|")
+    for model, m in per_model.items():
+        ratio = f"{m['cached'] / m['input']:.1%}" if m["input"] else ""
+        hits, misses = m["hit_api"], m["miss_api"]
+        latency = ""
+        if hits and misses:
+            gain = sum(misses) / len(misses) - sum(hits) / len(hits)
+            latency = f"{gain * len(hits):.2f}"
+        lines.append(
+            f"| {model} | {m['calls']} | {m['input']} | {m['cached']} | {ratio} | {m['hit_calls']} "
+            f"| {latency} | {_usd(m['cost'])} | {_usd(m['saved'])} |"
+        )
+    return lines
+
+
+def usage_report_lines(rows: Sequence[SuiteRow], top: int = 10) -> List[str]:
+    """Token usage and cost per model, plus the `top` most expensive cases (all models, all samples)."""
+    total = Spend()
+    per_case: Dict[str, Spend] = {}
+    estimated = 0
+    for model, case, r, _sec in rows:
+        estimated += 1 if getattr(r, "usage_estimated", False) else 0
+        total.add_result(model, r)
+        per_case.setdefault(str(case[0]), Spend()).add_result(model, r)
+    lines = ["", "## Usage and cost", ""]
+    lines.append(
+        "| Model | Calls | Input tokens | Cached tokens | Output tokens | Reasoning tokens | Cost ($) |"
+    )
+    lines.append("|:---:|---:|---:|---:|---:|---:|---:|")
+    for model, m in total.models.items():
+        cost = "" if m.calls and m.unpriced == m.calls else _usd(m.usd)
+        lines.append(
+            f"| {model} | {m.calls} | {m.input_tokens} | {m.cached_tokens} | {m.output_tokens} "
+            f"| {m.reasoning_tokens} | {cost} |"
+        )
+    ms = total.models.values()
+    lines.append(
+        f"| total | {sum(m.calls for m in ms)} | {sum(m.input_tokens for m in ms)} "
+        f"| {sum(m.cached_tokens for m in ms)} | {sum(m.output_tokens for m in ms)} "
+        f"| {sum(m.reasoning_tokens for m in ms)} | {_usd(total.usd)} |"
+    )
+    unpriced = [model for model, m in total.models.items() if m.unpriced]
+    if unpriced:
+        lines.append("")
+        lines.append(f"No price for: {', '.join(unpriced)} (add them with --prices).")
+    hits = [f"{model} {m.cache_hits}" for model, m in total.models.items() if m.cache_hits]
+    if hits:
+        lines.append("")
+        lines.append(f"Served from the response cache, not billed: {', '.join(hits)}.")
+    if estimated:
+        lines.append("")
+        lines.append(
+            f"Estimated usage for {estimated} aborted streams: input from the request size, "
+            "output from the deltas received (reasoning not included)."
+        )
+    if per_case:
+        lines.append("")
+        lines.append("| Prompt | Calls | Tokens | Cost ($) |")
+        lines.append("|---|---:|---:|---:|")
+        ranked = sorted(per_case.items(), key=lambda kv: (-kv[1].usd, -kv[1].tokens))[:top]
+        for prompt, c in ranked:
+            calls = sum(m.calls for m in c.models.values())
+            prompt = prompt.replace("|", "\\|")
+            lines.append(f"| {prompt} | {calls} | {c.tokens} | {_usd(c.usd)} |")
+    return lines
+
+
+def query_plan_report_lines(rows: Sequence[SuiteRow], top: int = 10) -> List[str]:
+    """Execution-cache reuse and full table scans per model, plus the commonest full-scan queries."""
+    per_model: Dict[str, Dict[str, Any]] = {}
+    scans: Dict[str, Dict[str, Any]] = {}
+    # Parsed queries the canonicalizer failed on (they ran without the cache)
+    canon_errors: Dict[str, int] = {}
+    for model, _case, r, _sec in rows:
+        if r.canonical_error:
+            canon_errors[r.canonical_error] = canon_errors.get(r.canonical_error, 0) + 1
+        m = per_model.setdefault(
+            model, {"executed": 0, "distinct": set(), "cached": 0, "full": 0, "tables": {}}
+        )
+        if not r.executed_ok:
+            continue
+        m["executed"] += 1
+        m["distinct"].add(r.canonical_query or r.query)
+        m["cached"] += 1 if r.execution_cached else 0
+        if r.full_scans:
+            m["full"] += 1
+            for t in r.full_scans:
+                m["tables"][t] = m["tables"].get(t, 0) + 1
+            q = r.canonical_query or r.query
+            s = scans.setdefault(q, {"count": 0, "plan": r.query_plan})
+            s["count"] += 1
+    lines = ["", "## Query plans", ""]
+    lines.append(
+        "| Model | Executed | Distinct queries | Cached executions | With full scan | Full-scanned tables |"
+    )
+    lines.append("|:---:|---:|---:|---:|---:|---|")
+    for model, m in per_model.items():
+        tables = ", ".join(f"{t}: {n}" for t, n in sorted(m["tables"].items()))
+        lines.append(
+            f"| {model} | {m['executed']} | {len(m['distinct'])} | {m['cached']} "
+            f"| {m['full']} | {tables} |"
+        )
+    if canon_errors:
+        lines.append("")
+        lines.append(
+            f"Canonicalization failed for {sum(canon_errors.values())} parsed queries: "
+            + "; ".join(f"{e} ({n})" for e, n in sorted(canon_errors.items(), key=lambda kv: -kv[1]))
+        )
+    if scans:
+        lines.append("")
+        lines.append("| Runs | Query | Plan |")
+        lines.append("|---:|---|---|")
+        ranked = sorted(scans.items(), key=lambda kv: -kv[1]["count"])[:top]
+        for q, s in ranked:
+            q = q.replace("|", "\\|")
+            plan = "; ".join(s["plan"]).replace("|", "\\|")
+            lines.append(f"| {s['count']} | `{q}` | {plan} |")
+    return lines
+
+
+def math_passed(r: Any) -> bool:
+    """The expression evaluated to the expected value."""
+    return r.value is not None and r.expected is not None and abs(r.value - r.expected) < 1e-9
+
+
+def sql_passed(r: Any, expected_rows: Optional[int]) -> bool:
+    """The query ran to completion and returned the expected number of rows."""
+    return bool(r.executed_ok) and not r.truncated and r.row_count == expected_rows
+
+
+def sample_passed(kind: str, case: Any, r: Any) -> bool:
+    """Pass check for one sample; validity when the case has no expectation."""
+    if kind == "math":
+        return math_passed(r) if r.expected is not None else bool(r.parsed_ok)
+    expected_rows = case[1]
+    if expected_rows is None:
+        return bool(r.parsed_ok and r.executed_ok)
+    return sql_passed(r, expected_rows)
+
+
+def math_report_lines(rows: Sequence[SuiteRow], run_id: Optional[str] = None) -> List[str]:
+    lines = []
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    lines.append("# CFG Math Suite Report\n")
+    lines.append(f"Generated: {ts}\n")
+    if run_id:
+        lines.append(f"Run: {run_id}\n")
+    lines.append("")
+    lines.append(
+        "| # | Model | Prompt | Expression | Parsed | Value | Expected | Check | Time (s) |"
+    )
+    lines.append("|---:|:---:|---|---|:---:|---:|---:|:---:|------:|")
+    for i, (model, _case, r, sec) in enumerate(rows, 1):
+        parsed = "yes" if r.parsed_ok else ("aborted" if r.aborted else "no")
+        check = "" if r.expected is None else ("pass" if math_passed(r) else "fail")
+        expr = (r.expression or "").replace("|", "\\|")
+        lines.append(
+            f"| {i} | {model} | {r.prompt} | `{expr}` | {parsed} | {_num(r.value)} | {_num(r.expected)} | {check} | {sec:.2f} |"
+        )
+    lines.extend(phase_report_lines(rows))
+    lines.extend(usage_report_lines(rows))
+    lines.extend(prompt_cache_report_lines(rows))
+    return lines
+
+
+def sql_report_lines(
+    rows: Sequence[SuiteRow],
+    dataset: Optional[str] = None,
+    run_id: Optional[str] = None,
+) -> List[str]:
+    lines = []
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    lines.append("# CFG SQL Suite Report\n")
+    lines.append(f"Generated: {ts}\n")
+    if run_id:
+        lines.append(f"Run: {run_id}\n")
+    lines.append(f"Dataset: {dataset or 'sample'}\n")
+    lines.append("")
+    lines.append(
+        "| # | Model | Prompt | Query | Parsed | Executed | Columns | Rows | Expected | Check | Time (s) |"
+    )
+    lines.append("|---:|:---:|---|---|:---:|:---:|---|---:|---:|:---:|------:|")
+    for i, (model, case, r, sec) in enumerate(rows, 1):
+        prompt, exp_rows = case[0], case[1]
+        parsed = "yes" if r.parsed_ok else ("aborted" if r.aborted else "no")
+        executed = "yes" if r.executed_ok else ("timeout" if r.timed_out else "no")
+        cols = ",".join(r.columns) if r.columns else ""
+        q = (r.query or "").replace("|", "\\|")
+        exp = "" if exp_rows is None else str(exp_rows)
+        n_rows = f"{r.row_count}+" if r.truncated else str(r.row_count)
+        check = "" if exp_rows is None else ("pass" if sql_passed(r, exp_rows) else "fail")
+        lines.append(
+            f"| {i} | {model} | {prompt} | `{q}` | {parsed} | {executed} | {cols} | {n_rows} | {exp} | {check} | {sec:.2f} |"
+        )
+    lines.extend(phase_report_lines(rows))
+    lines.extend(usage_report_lines(rows))
+    lines.extend(prompt_cache_report_lines(rows))
+    lines.extend(query_plan_report_lines(rows))
+    return lines
+
+
+def sampled_report_lines(
+    kind: str,
+    groups: Sequence[Tuple[str, int, Any, List[Tuple[Any, float]]]],
+    run_id: Optional[str] = None,
+    dataset: Optional[str] = None,
+    ci_width: Optional[float] = None,
+) -> List[str]:
+    """Pass rate with a 95% Wilson interval and latency spread per (model, case).
+
+    `groups` are (model, case_index, case, [(result, seconds), ...]) as
+    returned by checkpoint_groups. A case without an expectation counts a
+    sample as passing when its output was valid (parsed, and for SQL
+    executed), so the rate is still meaningful.
+    """
+    lines = []
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    title = "CFG Math" if kind == "math" else "CFG SQL"
+    lines.append(f"# {title} Suite Report (sampled)\n")
+    lines.append(f"Generated: {ts}\n")
+    if run_id:
+        lines.append(f"Run: {run_id}\n")
+    if kind == "sql":
+        lines.append(f"Dataset: {dataset or 'sample'}\n")
+
+    per_case = []
+    per_model: Dict[str, Dict[str, Any]] = {}
+    for model, idx, case, samples in groups:
+        n = len(samples)
+        passes = sum(sample_passed(kind, case, r) for r, _sec in samples)
+        valid = sum(
+            bool(r.parsed_ok and (kind == "math" or r.executed_ok)) for r, _sec in samples
+        )
+        lo, hi = wilson_interval(passes, n)
+        secs = [sec for _r, sec in samples]
+        per_case.append((model, idx, case, n, passes, valid, lo, hi, secs))
+        m = per_model.setdefault(
+            model, {"cases": 0, "samples": 0, "settled": 0, "rates": [], "widths": []}
+        )
+        m["cases"] += 1
+        m["samples"] += n
+        m["settled"] += 1 if ci_width is not None and hi - lo <= ci_width else 0
+        m["rates"].append(passes / n if n else 0.0)
+        m["widths"].append(hi - lo)
+
+    lines.append("")
+    lines.append("## Summary\n")
+    settled_note = f" (95% CI width <= {ci_width:g})" if ci_width is not None else ""
+    lines.append(
+        f"| Model | Cases | Samples | Settled{settled_note} | Mean pass rate | Mean CI width |"
+    )
+    lines.append("|:---:|---:|---:|---:|---:|---:|")
+    for model, m in per_model.items():
+        cases = m["cases"] or 1
+        lines.append(
+            f"| {model} | {m['cases']} | {m['samples']} | {m['settled']} "
+            f"| {sum(m['rates']) / cases:.1%} | {sum(m['widths']) / cases:.2f} |"
+        )
+
+    lines.append("")
+    lines.append("## Cases\n")
+    lines.append(
+        "| # | Model | Prompt | Samples | Pass rate | 95% CI | Valid | p50 (s) | p90 (s) |"
+    )
+    lines.append("|---:|:---:|---|---:|---:|:---:|---:|------:|------:|")
+    for model, idx, case, n, passes, valid, lo, hi, secs in per_case:
+        rate = f"{passes / n:.0%}" if n else ""
+        lines.append(
+            f"| {idx} | {model} | {case[0]} | {n} | {rate} | {lo:.2f}-{hi:.2f} "
+            f"| {valid}/{n} | {percentile(secs, 0.5):.2f} | {percentile(secs, 0.9):.2f} |"
+        )
+
+    rows = [(model, case, r, sec) for model, _i, case, samples in groups for r, sec in samples]
+    lines.extend(phase_report_lines(rows))
+    lines.extend(usage_report_lines(rows))
+    lines.extend(prompt_cache_report_lines(rows))
+    if kind == "sql":
+        lines.extend(query_plan_report_lines(rows))
+    return lines
+
+
+def write_report(lines: Sequence[str], out_dir: str | Path, run_id: str) -> Path:
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    out_file = out / f"run-{run_id}.md"
+    out_file.write_text("\n".join(lines), encoding="utf-8")
+    return out_file
@@ -0,0 +1,466 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from lib.pricing import cost_usd
+
+
+"""
+SQLite store of suite results across runs.
+
+Checkpoints stay the crash-safe log of a run in progress; when a run
+finishes (or is rendered with cfg-report) its checkpoint is imported
+here, incrementally from the last imported byte, and the Markdown
+report is rendered from the store. Each row keeps the full result as
+JSON next to the columns comparisons need: pass/fail, wall time, API
+time, token usage and cost.
+
+Per-(run, model) counts and sums live in `run_models`, kept current by
+triggers, with latency quantiles recomputed from the (run_id, model,
+seconds) index after each import, so comparing run summaries costs a
+few indexed lookups however many rows are stored. Per-case comparisons
+walk the (run_id, model, case_index, passed) index of the two runs, so
+they scale with the runs compared rather than with the store.
+"""
+
+DEFAULT_RESULTS_DB = os.getenv("CFG_RESULTS_DB", "docs/experiments/results.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    header_json TEXT NOT NULL,
+    checkpoint TEXT,
+    imported_bytes INTEGER NOT NULL DEFAULT 0,
+    -- Digest of the header line and the bytes just before imported_bytes
+    imported_tail TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    case_index INTEGER NOT NULL,
+    sample INTEGER NOT NULL DEFAULT 0,
+    prompt TEXT NOT NULL,
+    case_json TEXT NOT NULL,
+    passed INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    api_s REAL,
+    input_tokens INTEGER,
+    cached_tokens INTEGER,
+    output_tokens INTEGER,
+    reasoning_tokens INTEGER,
+    cost_usd REAL,
+    result_json TEXT NOT NULL,
+    UNIQUE (run_id, model, case_index, sample)
+);
+CREATE INDEX IF NOT EXISTS results_latency ON results (run_id, model, seconds);
+CREATE INDEX IF NOT EXISTS results_passed ON results (run_id, model, case_index, passed);
+CREATE TABLE IF NOT EXISTS run_models (
+    run_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    passes INTEGER NOT NULL,
+    seconds_sum REAL NOT NULL,
+    tokens INTEGER NOT NULL,
+    cost_usd REAL NOT NULL,
+    -- Refreshed after each import
+    p50_s REAL,
+    p90_s REAL,
+    PRIMARY KEY (run_id, model)
+);
+CREATE TRIGGER IF NOT EXISTS results_insert AFTER INSERT ON results BEGIN
+    INSERT INTO run_models (run_id, model, n, passes, seconds_sum, tokens, cost_usd)
+    VALUES (NEW.run_id, NEW.model, 1, NEW.passed, NEW.seconds,
+            COALESCE(NEW.input_tokens, 0) + COALESCE(NEW.output_tokens, 0),
+            COALESCE(NEW.cost_usd, 0))
+    ON CONFLICT (run_id, model) DO UPDATE SET
+        n = n + 1,
+        passes = passes + excluded.passes,
+        seconds_sum = seconds_sum + excluded.seconds_sum,
+        tokens = tokens + excluded.tokens,
+        cost_usd = cost_usd + excluded.cost_usd;
+END;
+CREATE TRIGGER IF NOT EXISTS results_update AFTER UPDATE ON results BEGIN
+    UPDATE run_models SET
+        passes = passes - OLD.passed + NEW.passed,
+        seconds_sum = seconds_sum - OLD.seconds + NEW.seconds,
+        tokens = tokens
+            - COALESCE(OLD.input_tokens, 0) - COALESCE(OLD.output_tokens, 0)
+            + COALESCE(NEW.input_tokens, 0) + COALESCE(NEW.output_tokens, 0),
+        cost_usd = cost_usd - COALESCE(OLD.cost_usd, 0) + COALESCE(NEW.cost_usd, 0)
+    WHERE run_id = NEW.run_id AND model = NEW.model;
+END;
+CREATE TRIGGER IF NOT EXISTS results_delete AFTER DELETE ON results BEGIN
+    UPDATE run_models SET
+        n = n - 1,
+        passes = passes - OLD.passed,
+        seconds_sum = seconds_sum - OLD.seconds,
+        tokens = tokens - COALESCE(OLD.input_tokens, 0) - COALESCE(OLD.output_tokens, 0),
+        cost_usd = cost_usd - COALESCE(OLD.cost_usd, 0)
+    WHERE run_id = OLD.run_id AND model = OLD.model;
+END;
+"""
+
+# Bytes before the import offset covered by the checkpoint fingerprint
+_TAIL_BYTES = 512
+
+_COLUMNS = (
+    "run_id, model, case_index, sample, prompt, case_json, passed, seconds, api_s, "
+    "input_tokens, cached_tokens, output_tokens, reasoning_tokens, cost_usd, result_json"
+)
+_UPSERT = (
+    f"INSERT INTO results ({_COLUMNS}) VALUES ({', '.join('?' * 15)}) "
+    "ON CONFLICT (run_id, model, case_index, sample) DO UPDATE SET "
+    + ", ".join(
+        f"{c} = excluded.{c}"
+        for c in _COLUMNS.split(", ")[4:]
+    )
+)
+
+
+@dataclass
+class ModelSummary:
+    n: int
+    passes: int
+    seconds_sum: float
+    tokens: int
+    cost_usd: float
+    p50_s: Optional[float] = None
+    p90_s: Optional[float] = None
+
+    @property
+    def pass_rate(self) -> float:
+        return self.passes / self.n if self.n else 0.0
+
+    @property
+    def mean_s(self) -> float:
+        return self.seconds_sum / self.n if self.n else 0.0
+
+
+@dataclass
+class CaseDelta:
+    model: str
+    case_index: int
+    prompt: str
+    # Pass rate over the pair's samples (0 or 1 for unsampled runs)
+    rate_a: float
+    rate_b: float
+
+
+class ResultsStore:
+    """Suite results of every imported run, indexed by (run, model, case)."""
+
+    def __init__(self, path: str | Path = DEFAULT_RESULTS_DB) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("PRAGMA synchronous=NORMAL")
+        self._con.executescript(_SCHEMA)
+        columns = {r[1] for r in self._con.execute("PRAGMA table_info(runs)")}
+        if "imported_tail" not in columns:  # stores written before the fingerprint
+            self._con.execute("ALTER TABLE runs ADD COLUMN imported_tail TEXT")
+
+    def close(self) -> None:
+        self._con.close()
+
+    def import_checkpoint(self, path: str | Path, batch: int = 1000) -> Tuple[str, int]:
+        """Add the records of a checkpoint not imported yet; returns the run id and how many were added.
+
+        The import resumes from the stored offset only if the header line
+        and the bytes just before that offset are unchanged; a rewritten,
+        replaced or truncated checkpoint starts over from its first record.
+        A record for a pair (or sample) already stored replaces it, as the
+        last record wins in the checkpoint.
+        """
+        p = Path(path)
+        size = p.stat().st_size
+        with open(p, "rb") as fh:
+            first = fh.readline()
+            header = json.loads(first)
+            if header.get("type") != "run":
+                raise ValueError(f"not a suite checkpoint: {p}")
+            header.pop("type")
+            run_id, kind = header["run_id"], header["kind"]
+            with self._lock:
+                row = self._con.execute(
+                    "SELECT imported_bytes, imported_tail FROM runs WHERE run_id = ?", (run_id,)
+                ).fetchone()
+            offset = len(first)
+            if row is not None and offset <= row[0] <= size:
+                fh.seek(max(0, row[0] - _TAIL_BYTES))
+                tail = fh.read(row[0] - fh.tell())
+                if row[1] == _fingerprint(first, tail):
+                    offset = row[0]
+            fh.seek(max(0, offset - _TAIL_BYTES))
+            tail = fh.read(offset - fh.tell())
+            added = 0
+            buf: List[tuple] = []
+            for line in fh:
+                if not line.endswith(b"\n"):
+                    break  # torn final write; imported once the run is resumed
+                offset += len(line)
+                tail = (tail + line)[-_TAIL_BYTES:]
+                rec = json.loads(line)
+                if rec.get("type") == "result":
+                    buf.append(_row(run_id, kind, rec))
+                if len(buf) >= batch:
+                    added += self._write(header, p, offset, _fingerprint(first, tail), buf)
+            added += self._write(header, p, offset, _fingerprint(first, tail), buf)
+        if added:
+            self._refresh_quantiles(run_id)
+        return run_id, added
+
+    def _refresh_quantiles(self, run_id: str) -> None:
+        for model, summary in self.summary(run_id).items():
+            p50 = self.latency_quantile(run_id, model, 0.5, summary.n)
+            p90 = self.latency_quantile(run_id, model, 0.9, summary.n)
+            with self._lock:
+                self._con.execute(
+                    "UPDATE run_models SET p50_s = ?, p90_s = ? WHERE run_id = ? AND model = ?",
+                    (p50, p90, run_id, model),
+                )
+
+    def _write(
+        self, header: Dict[str, Any], path: Path, offset: int, tail: str, rows: List[tuple]
+    ) -> int:
+        with self._lock:
+            self._con.execute("BEGIN IMMEDIATE")
+            try:
+                self._con.executemany(_UPSERT, rows)
+                self._con.execute(
+                    "INSERT INTO runs (run_id, kind, header_json, checkpoint, imported_bytes, "
+                    "imported_tail, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (run_id) DO UPDATE SET "
+                    "header_json = excluded.header_json, checkpoint = excluded.checkpoint, "
+                    "imported_bytes = excluded.imported_bytes, "
+                    "imported_tail = excluded.imported_tail, updated_at = excluded.updated_at",
+                    (
+                        header["run_id"],
+                        header["kind"],
+                        json.dumps(header, ensure_ascii=False),
+                        str(path),
+                        offset,
+                        tail,
+                        time.time(),
+                    ),
+                )
+            except BaseException:
+                self._con.execute("ROLLBACK")
+                raise
+            self._con.execute("COMMIT")
+        n = len(rows)
+        rows.clear()
+        return n
+
+    def _read(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._con.execute(sql, params).fetchall()
+
+    def runs(self) -> List[Tuple[str, str, Optional[str]]]:
+        """(run_id, kind, checkpoint path) of every stored run, oldest first."""
+        return self._read("SELECT run_id, kind, checkpoint FROM runs ORDER BY run_id")
+
+    def run(self, run_id: str) -> Tuple[Dict[str, Any], Optional[str]]:
+        """Header and checkpoint path of a stored run."""
+        rows = self._read("SELECT header_json, checkpoint FROM runs WHERE run_id = ?", (run_id,))
+        if not rows:
+            raise KeyError(run_id)
+        return json.loads(rows[0][0]), rows[0][1]
+
+    def records(self, run_id: str) -> Iterator[Dict[str, Any]]:
+        """The run's results as checkpoint records, for checkpoint_rows/checkpoint_groups."""
+        with self._lock:
+            cur = self._con.execute(
+                "SELECT model, case_index, sample, case_json, seconds, result_json "
+                "FROM results WHERE run_id = ? ORDER BY model, case_index, sample",
+                (run_id,),
+            )
+            rows = cur.fetchall()
+        for model, idx, sample, case_json, sec, result_json in rows:
+            yield {
+                "type": "result",
+                "model": model,
+                "case_index": idx,
+                "sample": sample,
+                "case": json.loads(case_json),
+                "seconds": sec,
+                "result": json.loads(result_json),
+            }
+
+    def summary(self, run_id: str) -> Dict[str, ModelSummary]:
+        rows = self._read(
+            "SELECT model, n, passes, seconds_sum, tokens, cost_usd, p50_s, p90_s FROM run_models "
+            "WHERE run_id = ? AND n > 0 ORDER BY model",
+            (run_id,),
+        )
+        return {model: ModelSummary(*rest) for model, *rest in rows}
+
+    def latency_quantile(self, run_id: str, model: str, q: float, n: int) -> Optional[float]:
+        """Nearest-rank quantile of wall time; `n` is the pair count from summary()."""
+        if n <= 0:
+            return None
+        rank = min(n - 1, max(0, int(q * n + 0.5) - 1))
+        rows = self._read(
+            "SELECT seconds FROM results WHERE run_id = ? AND model = ? "
+            "ORDER BY seconds LIMIT 1 OFFSET ?",
+            (run_id, model, rank),
+        )
+        return rows[0][0] if rows else None
+
+    def case_deltas(
+        self, run_a: str, run_b: str, limit: int = 20
+    ) -> Tuple[int, int, List[CaseDelta]]:
+        """Shared (model, case) pairs, how many changed pass rate, and the `limit` largest changes.
+
+        One pass over both runs' (run_id, model, case_index, passed) index;
+        prompts are looked up for the listed pairs only.
+        """
+        rows = self._read(
+            """
+            WITH a AS (
+                SELECT model, case_index, AVG(passed) AS rate
+                FROM results WHERE run_id = ? GROUP BY model, case_index
+            ), b AS (
+                SELECT model, case_index, AVG(passed) AS rate
+                FROM results WHERE run_id = ? GROUP BY model, case_index
+            ), j AS MATERIALIZED (
+                SELECT a.model, a.case_index, a.rate AS rate_a, b.rate AS rate_b
+                FROM a JOIN b USING (model, case_index)
+            )
+            SELECT (SELECT COUNT(*) FROM j), (SELECT COUNT(*) FROM j WHERE rate_a != rate_b),
+                   model, case_index, rate_a, rate_b
+            FROM (SELECT 1) LEFT JOIN (
+                SELECT * FROM j WHERE rate_a != rate_b
+                ORDER BY ABS(rate_b - rate_a) DESC, model, case_index LIMIT ?
+            )
+            """,
+            (run_a, run_b, limit),
+        )
+        shared, changed = rows[0][0], rows[0][1]
+        deltas = []
+        for _s, _c, model, idx, rate_a, rate_b in rows:
+            if model is None:
+                continue
+            prompt = self._read(
+                "SELECT prompt FROM results WHERE run_id = ? AND model = ? AND case_index = ? "
+                "ORDER BY sample LIMIT 1",
+                (run_a, model, idx),
+            )[0][0]
+            deltas.append(CaseDelta(model, idx, prompt, rate_a, rate_b))
+        return shared, changed, deltas
+
+
+def _fingerprint(header_line: bytes, tail: bytes) -> str:
+    # Identifies the imported part of a checkpoint without rereading it
+    return hashlib.sha256(header_line + b"\0" + tail).hexdigest()[:16]
+
+
+def _row(run_id: str, kind: str, rec: Dict[str, Any]) -> tuple:
+    # Imported here so the CLI can read DEFAULT_RESULTS_DB without the experiment modules
+    from experiments.checkpoint import result_from_dict
+    from experiments.report import sample_passed
+
+    res = result_from_dict(kind, rec["result"])
+    case = tuple(rec["case"])
+    inp, out = res.usage_input_tokens, res.usage_output_tokens
+    cached = res.usage_cached_tokens
+    cost = None
+    if getattr(res, "from_cache", False):
+        cost = 0.0  # answered from the response cache, nothing billed
+    elif inp is not None or out is not None:
+        cost = cost_usd(res.model or rec["model"], inp or 0, out or 0, cached)
+    return (
+        run_id,
+        rec["model"],
+        rec["case_index"],
+        rec.get("sample", 0),
+        str(case[0]),
+        json.dumps(rec["case"], ensure_ascii=False),
+        int(sample_passed(kind, case, res)),
+        float(rec["seconds"]),
+        (res.timings or {}).get("api"),
+        inp,
+        cached,
+        out,
+        res.usage_reasoning_tokens,
+        cost,
+        json.dumps(rec["result"], ensure_ascii=False),
+    )
+
+
+def _delta(a: Optional[float], b: Optional[float], fmt: str) -> str:
+    if a is None or b is None:
+        return ""
+    return format(b - a, "+" + fmt)
+
+
+def _opt(x: Optional[float], fmt: str) -> str:
+    return "" if x is None else format(x, fmt)
+
+
+def compare_lines(store: ResultsStore, run_a: str, run_b: str, top: int = 20) -> List[str]:
+    """Markdown comparison of two stored runs: per-model pass rate, latency and cost, then changed cases.
+
+    With `top` <= 0 the per-case comparison, the only part that reads
+    every pair of both runs, is skipped.
+    """
+    header_a, _ = store.run(run_a)
+    header_b, _ = store.run(run_b)
+    if header_a["kind"] != header_b["kind"]:
+        raise ValueError(f"run {run_a} is {header_a['kind']} but {run_b} is {header_b['kind']}")
+    sum_a, sum_b = store.summary(run_a), store.summary(run_b)
+    lines = [f"# Compare {run_a} -> {run_b} ({header_a['kind']})", ""]
+    lines.append(
+        "| Model | Results | Pass rate | Δ pass | Mean (s) | Δ mean | p50 (s) | Δ p50 "
+        "| p90 (s) | Δ p90 | Cost ($) |"
+    )
+    lines.append("|:---:|---:|---:|---:|---:|---:|---:|---:|---:|---:|---:|")
+    for model in sorted(set(sum_a) | set(sum_b)):
+        a, b = sum_a.get(model), sum_b.get(model)
+        quant = {
+            "p50": (a.p50_s if a else None, b.p50_s if b else None),
+            "p90": (a.p90_s if a else None, b.p90_s if b else None),
+        }
+        rate = (a.pass_rate if a else None, b.pass_rate if b else None)
+        mean = (a.mean_s if a else None, b.mean_s if b else None)
+        cells = [
+            f"{a.n if a else 0} → {b.n if b else 0}",
+            f"{_opt(rate[0], '.1%')} → {_opt(rate[1], '.1%')}",
+            f"{(b.pass_rate - a.pass_rate) * 100:+.1f} pp" if a and b else "",
+            f"{_opt(mean[0], '.2f')} → {_opt(mean[1], '.2f')}",
+            _delta(*mean, ".2f"),
+        ]
+        for name in ("p50", "p90"):
+            qa, qb = quant[name]
+            cells.extend([f"{_opt(qa, '.2f')} → {_opt(qb, '.2f')}", _delta(qa, qb, ".2f")])
+        cells.append(f"{_opt(a and a.cost_usd, '.4f')} → {_opt(b and b.cost_usd, '.4f')}")
+        lines.append(f"| {model} | " + " | ".join(cells) + " |")
+
+    if top <= 0:
+        return lines
+    shared, changed, deltas = store.case_deltas(run_a, run_b, limit=top)
+    lines.append("")
+    lines.append(f"Shared (model, case) pairs: {shared}, pass rate changed: {changed}")
+    if deltas:
+        lines.append("")
+        lines.append("| Model | # | Prompt | Pass rate | Δ |")
+        lines.append("|:---:|---:|---|---:|---:|")
+        for d in deltas:
+            prompt = d.prompt.replace("|", "\\|")
+            lines.append(
+                f"| {d.model} | {d.case_index} | {prompt} | {d.rate_a:.0%} → {d.rate_b:.0%} "
+                f"| {(d.rate_b - d.rate_a) * 100:+.0f} pp |"
+            )
+    return lines
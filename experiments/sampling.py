@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+from experiments.checkpoint import Checkpoint, result_from_dict
+from experiments.report import sample_passed
+from experiments.suite import AsyncRunFn, Case, IndexedCase, RunFn, SuiteRow, run_pairs
+from lib.metrics import wilson_interval
+from lib.pricing import Spend
+
+
+"""
+Adaptive repeated sampling of suite cases.
+
+Each (model, case) pair is run several times and its pass rate tracked
+with a Wilson interval. Sampling goes in rounds: every pair first gets
+`min_samples`, then only pairs whose interval is still wider than
+`ci_width` are sampled again (doubling their count, up to
+`max_samples`), widest first. Stable cases settle after a few calls and
+the remaining budget goes to the ones that actually flip.
+
+Every sample is appended to the checkpoint with its sample number, so a
+resumed run rebuilds the tallies from the file and continues the round.
+"""
+
+
+@dataclass
+class SamplingPolicy:
+    max_samples: int
+    min_samples: int = 3
+    # Stop sampling a pair once its interval is at most this wide
+    ci_width: float = 0.3
+    z: float = 1.96
+
+    @classmethod
+    def from_header(cls, header: Dict) -> "SamplingPolicy":
+        return cls(
+            max_samples=int(header["samples"]),
+            min_samples=int(header.get("min_samples", 3)),
+            ci_width=float(header.get("ci_width", 0.3)),
+        )
+
+
+@dataclass
+class Tally:
+    n: int = 0
+    passes: int = 0
+    # Next unused sample number; samples lost to a crash leave gaps
+    next_sample: int = 0
+
+    def add(self, passed: bool) -> None:
+        self.n += 1
+        self.passes += 1 if passed else 0
+
+    def width(self, z: float) -> float:
+        lo, hi = wilson_interval(self.passes, self.n, z)
+        return hi - lo
+
+    def settled(self, policy: SamplingPolicy) -> bool:
+        if self.n >= policy.max_samples:
+            return True
+        return self.n >= policy.min_samples and self.width(policy.z) <= policy.ci_width
+
+    def target(self, policy: SamplingPolicy) -> int:
+        """Sample count to reach this round."""
+        if self.n < policy.min_samples:
+            return min(policy.min_samples, policy.max_samples)
+        return min(policy.max_samples, self.n * 2)
+
+
+def _tallies_from(ckpt: Checkpoint) -> Dict[Tuple[str, int], Tally]:
+    # Last record per sample wins, as in checkpoint_rows
+    latest: Dict[Tuple[str, int, int], Dict] = {}
+    for r in ckpt.records():
+        latest[(r["model"], r["case_index"], r.get("sample", 0))] = r
+    tallies: Dict[Tuple[str, int], Tally] = {}
+    for (model, idx, sample), r in latest.items():
+        t = tallies.setdefault((model, idx), Tally())
+        res = result_from_dict(ckpt.kind, r["result"])
+        t.add(sample_passed(ckpt.kind, tuple(r["case"]), res))
+        t.next_sample = max(t.next_sample, sample + 1)
+    return tallies
+
+
+def run_sampled(
+    ckpt: Checkpoint,
+    cases: Iterable[IndexedCase],
+    run: RunFn,
+    arun: AsyncRunFn,
+    policy: SamplingPolicy,
+    *,
+    concurrency: int = 1,
+    desc: str = "suite",
+    prewarm: int = 0,
+    spend: Optional[Spend] = None,
+) -> None:
+    """Sample every (model, case) pair of `ckpt` until it settles or hits max_samples.
+
+    `cases` is materialized, since each round revisits it. Raises
+    KeyboardInterrupt like run_suite; finished samples are already in the
+    checkpoint. Every sample is counted in `spend`, and sampling stops
+    (after draining the calls in flight) once its budget is exhausted.
+    """
+    models = ckpt.header["models"]
+    case_list: List[IndexedCase] = list(cases)
+    tallies = _tallies_from(ckpt)
+    for i, _case in case_list:
+        for model in models:
+            tallies.setdefault((model, i), Tally())
+
+    def on_row(key: Hashable, row: SuiteRow) -> None:
+        i, sample = key
+        model, case, res, _sec = row
+        ckpt.append(i, row, sample=sample)
+        tallies[(model, i)].add(sample_passed(ckpt.kind, case, res))
+        if spend is not None:
+            spend.add_result(model, res)
+
+    stop = spend.exhausted if spend is not None else None
+
+    rnd = 0
+    while True:
+        if stop is not None and stop():
+            return
+        open_pairs = [
+            (model, i, case)
+            for i, case in case_list
+            for model in models
+            if not tallies[(model, i)].settled(policy)
+        ]
+        if not open_pairs:
+            return
+        # Most uncertain first, so an interrupted round has spent its calls well
+        open_pairs.sort(key=lambda p: -tallies[(p[0], p[1])].width(policy.z))
+        batch: List[Tuple[str, Tuple[int, int], Case]] = []
+        for model, i, case in open_pairs:
+            t = tallies[(model, i)]
+            extra = t.target(policy) - t.n
+            batch.extend((model, (i, t.next_sample + k), case) for k in range(extra))
+            t.next_sample += extra
+        rnd += 1
+        run_pairs(
+            batch,
+            run,
+            arun,
+            total=len(batch),
+            concurrency=concurrency,
+            desc=f"{desc} round {rnd}",
+            prewarm=prewarm if rnd == 1 else 0,
+            on_row=on_row,
+            stop=stop,
+        )
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Mapping, Tuple
+
+from lark import Token, Tree
+
+
+"""
+Canonical text for queries in the cfg_sql grammar.
+
+Works on a parse tree built with keep_all_tokens=True (the default tree
+drops anonymous keyword tokens such as table names). Queries that differ
+only in the following render to the same text:
+
+- whitespace and leading zeros in integers
+- `users.id` vs `id` when the column belongs to exactly one table in
+  scope (ambiguous or unknown columns are left as written, so they still
+  fail the same way)
+- the order of AND/OR operands, nested groups of the same operator,
+  repeated operands, double negation and redundant parentheses
+- the two sides of a JOIN ... ON equality
+
+The select list and the table/join order are kept, since they determine
+the result columns. Reordering predicates never changes which rows
+match; with a LIMIT, which rows come first is up to the query planner
+either way.
+"""
+
+
+def _tokens(tree: Tree) -> List[str]:
+    return [str(t) for t in tree.scan_values(lambda v: isinstance(v, Token))]
+
+
+def _subtree(tree: Tree, name: str) -> List[Tree]:
+    return [c for c in tree.children if isinstance(c, Tree) and c.data == name]
+
+
+class _Scope:
+    def __init__(self, tables: List[str], columns: Mapping[str, FrozenSet[str]]) -> None:
+        self.tables = tables
+        # Qualification is only unambiguous when no table appears twice
+        self.unique = len(set(tables)) == len(tables)
+        self.columns = columns
+
+    def colref(self, tree: Tree) -> str:
+        toks = _tokens(tree)
+        if len(toks) == 3:
+            return f"{toks[0]}.{toks[2]}"
+        column = toks[0]
+        if not self.unique:
+            return column
+        owners = [t for t in self.tables if column in self.columns.get(t, ())]
+        return f"{owners[0]}.{column}" if len(owners) == 1 else column
+
+
+def _value(tree: Tree) -> str:
+    tok = tree.children[0]
+    return str(int(tok)) if tok.type == "INT" else str(tok)
+
+
+@dataclass(frozen=True)
+class _Cond:
+    kind: str  # "pred", "not", "and" or "or"
+    # Rendered without enclosing parentheses
+    text: str
+    operands: Tuple["_Cond", ...] = ()
+
+
+def _wrap(cond: _Cond, parent: str) -> str:
+    # NOT binds tighter than AND, AND tighter than OR
+    if cond.kind == "or" and parent in ("and", "not"):
+        return f"({cond.text})"
+    if cond.kind == "and" and parent == "not":
+        return f"({cond.text})"
+    return cond.text
+
+
+def _cond(tree: Tree, scope: _Scope) -> _Cond:
+    if tree.data == "predicate":
+        col, op, val = tree.children
+        return _Cond("pred", f"{scope.colref(col)} {op.children[0]} {_value(val)}")
+    if tree.data == "cond_atom":
+        # "(" condition ")"
+        return _cond(tree.children[1], scope)
+    if tree.data == "not_expr":
+        inner = _cond(tree.children[1], scope)
+        if inner.kind == "not":
+            return inner.operands[0]
+        return _Cond("not", "NOT " + _wrap(inner, "not"), (inner,))
+    kind = "and" if tree.data == "and_expr" else "or"
+    operands: Dict[str, _Cond] = {}
+    for child in tree.children:
+        if isinstance(child, Token):
+            continue
+        sub = _cond(child, scope)
+        # (a AND b) AND c -> a AND b AND c; repeated operands collapse
+        for op in sub.operands if sub.kind == kind else (sub,):
+            operands.setdefault(op.text, op)
+    if len(operands) == 1:
+        return next(iter(operands.values()))
+    ordered = tuple(operands[k] for k in sorted(operands))
+    text = f" {kind.upper()} ".join(_wrap(c, kind) for c in ordered)
+    return _Cond(kind, text, ordered)
+
+
+def canonical_sql(tree: Tree, columns: Mapping[str, FrozenSet[str]]) -> str:
+    """Canonical text of a parsed query; `columns` maps table -> column names."""
+    stmt = tree.children[0] if tree.data == "start" else tree
+    from_table = _tokens(_subtree(stmt, "table")[0])[0]
+    joins = _subtree(stmt, "join_clause")
+    scope = _Scope([from_table] + [_tokens(_subtree(j, "table")[0])[0] for j in joins], columns)
+
+    select_list = _subtree(stmt, "select_list")[0]
+    items = _subtree(select_list, "sel_item")
+    select = ", ".join(scope.colref(i.children[0]) for i in items) if items else "*"
+    parts = [f"SELECT {select} FROM {from_table}"]
+    for j in joins:
+        left, right = sorted(scope.colref(c) for c in _subtree(j, "colref"))
+        parts.append(f"JOIN {_tokens(_subtree(j, 'table')[0])[0]} ON {left} = {right}")
+
+    children = stmt.children
+    for i, child in enumerate(children):
+        if isinstance(child, Token) and child.type == "WHERE":
+            parts.append("WHERE " + _cond(children[i + 1], scope).text)
+        elif isinstance(child, Token) and child.type == "LIMIT":
+            parts.append(f"LIMIT {int(children[i + 1])}")
+    return " ".join(parts)
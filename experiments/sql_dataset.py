@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import random
+import sqlite3
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+
+"""
+Synthetic users/orders datasets for the SQL experiment.
+
+Same schema and vocabulary (cities, statuses) as the in-memory sample
+fixture in cfg_sql, at configurable scale. Generation is seeded, so a
+given (users, orders, seed) always produces the same file.
+"""
+
+GENERATOR_VERSION = 1
+
+# Rough population-weighted city mix and a paid-heavy status mix
+CITIES = ["Tokyo", "Osaka", "Nagoya", "Kyoto", "Sapporo"]
+CITY_WEIGHTS = [0.38, 0.22, 0.15, 0.11, 0.14]
+STATUSES = ["paid", "pending", "cancelled"]
+STATUS_WEIGHTS = [0.72, 0.18, 0.10]
+FIRST_NAMES = [
+    "Alice", "Bob", "Charlie", "Diana", "Evan", "Fiona", "George", "Hana",
+    "Ichiro", "Jun", "Kenta", "Lena", "Mika", "Naoki", "Olivia", "Ren",
+    "Sakura", "Taro", "Yui", "Yuto",
+]
+
+SCHEMA = [
+    """
+    CREATE TABLE users (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        age INTEGER NOT NULL,
+        city TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE orders (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        amount INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    """,
+    "CREATE TABLE dataset_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+]
+INDEXES = [
+    "CREATE INDEX orders_user_id ON orders(user_id)",
+    "CREATE INDEX users_city ON users(city)",
+    "CREATE INDEX users_age ON users(age)",
+]
+
+
+def _iter_users(rng: random.Random, n: int) -> Iterator[Tuple[int, str, int, str]]:
+    for uid in range(1, n + 1):
+        age = min(80, max(18, int(rng.gauss(38, 12))))
+        city = rng.choices(CITIES, CITY_WEIGHTS)[0]
+        yield uid, rng.choice(FIRST_NAMES), age, city
+
+
+def _iter_orders(
+    rng: random.Random, n: int, users: int
+) -> Iterator[Tuple[int, int, int, str]]:
+    # A small share of "heavy" customers places a fifth of all orders
+    heavy = max(1, users // 20)
+    for oid in range(1, n + 1):
+        if rng.random() < 0.2:
+            uid = rng.randint(1, heavy)
+        else:
+            uid = rng.randint(1, users)
+        amount = max(1, int(rng.lognormvariate(4.8, 0.8)))
+        status = rng.choices(STATUSES, STATUS_WEIGHTS)[0]
+        yield oid, uid, amount, status
+
+
+def _batched(it: Iterator, size: int) -> Iterator[list]:
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def generate_dataset(
+    path: str | Path,
+    users: int = 1000,
+    orders: Optional[int] = None,
+    seed: int = 0,
+    indexes: bool = True,
+    batch: int = 50_000,
+) -> Path:
+    """Write a users/orders SQLite database to `path` and return it.
+
+    `orders` defaults to three per user. The file is built next to the
+    target and renamed into place, so readers never see a partial file.
+    """
+    orders = users * 3 if orders is None else orders
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + f".tmp-{os.getpid()}")
+    tmp.unlink(missing_ok=True)
+    rng = random.Random(seed)
+    con = sqlite3.connect(str(tmp))
+    try:
+        con.execute("PRAGMA journal_mode = OFF")
+        con.execute("PRAGMA synchronous = OFF")
+        for stmt in SCHEMA:
+            con.execute(stmt)
+        for chunk in _batched(_iter_users(rng, users), batch):
+            con.executemany("INSERT INTO users(id, name, age, city) VALUES(?, ?, ?, ?)", chunk)
+        for chunk in _batched(_iter_orders(rng, orders, users), batch):
+            con.executemany(
+                "INSERT INTO orders(id, user_id, amount, status) VALUES(?, ?, ?, ?)", chunk
+            )
+        if indexes:
+            for stmt in INDEXES:
+                con.execute(stmt)
+        meta = {
+            "generator": str(GENERATOR_VERSION),
+            "users": str(users),
+            "orders": str(orders),
+            "seed": str(seed),
+            "indexes": "yes" if indexes else "no",
+        }
+        con.executemany("INSERT INTO dataset_meta(key, value) VALUES(?, ?)", meta.items())
+        con.commit()
+        con.execute("ANALYZE")
+    finally:
+        con.close()
+    os.replace(tmp, path)
+    return path
+
+
+def open_dataset(path: str | Path) -> sqlite3.Connection:
+    """Open a generated dataset read-only; the file is treated as immutable."""
+    p = Path(path)
+    if not p.is_file():
+        raise FileNotFoundError(f"dataset not found: {p}")
+    uri = p.resolve().as_uri() + "?mode=ro&immutable=1"
+    con = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    con.execute("PRAGMA query_only = ON")
+    return con
+
+
+_versions: Dict[Tuple[str, int, int], str] = {}
+
+
+def dataset_version(path: str | Path) -> str:
+    """A short hash identifying a dataset's contents, for caching query results.
+
+    Generated datasets are identified by their dataset_meta (generation is
+    deterministic), other files by path, size and mtime.
+    """
+    p = Path(path).resolve()
+    st = p.stat()
+    key = (str(p), st.st_size, st.st_mtime_ns)
+    version = _versions.get(key)
+    if version is None:
+        con = open_dataset(p)
+        try:
+            meta = con.execute("SELECT key, value FROM dataset_meta ORDER BY key").fetchall()
+        except sqlite3.Error:
+            meta = []
+        finally:
+            con.close()
+        ident = repr(meta) if meta else repr(key)
+        version = _versions[key] = hashlib.sha256(ident.encode("utf-8")).hexdigest()[:16]
+    return version
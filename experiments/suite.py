@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Container,
+    Deque,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Sized,
+    Tuple,
+)
+
+from tqdm import tqdm
+
+from experiments.pipeline import generation_slot, pipeline_scope
+from lib.openai_client import prewarm as prewarm_pool, prewarm_async, rate_limiter
+
+
+# A case is whatever tuple the experiment's default_*_cases() yields,
+# e.g. (prompt, expected) for math or (prompt, expected_rows) for SQL.
+Case = Tuple[Any, ...]
+# Cases are fed to the suite with their stable index, e.g.
+# enumerate(default_math_cases()) or experiments.cases.iter_math_cases(path)
+IndexedCase = Tuple[int, Case]
+# (model, case, result, seconds)
+SuiteRow = Tuple[str, Case, Any, float]
+
+RunFn = Callable[[str, Case], Any]
+AsyncRunFn = Callable[[str, Case], Awaitable[Any]]
+# Called with (case_index, row) as soon as each pair finishes
+RowCallback = Callable[[int, SuiteRow], None]
+# run_pairs passes through any key, e.g. (case_index, sample)
+KeyedRowCallback = Callable[[Hashable, SuiteRow], None]
+
+
+def _pairs(
+    models: Sequence[str],
+    cases: Iterable[IndexedCase],
+    skip: Container[Tuple[str, int]],
+) -> Iterator[Tuple[str, int, Case]]:
+    # Case-major so a lazily read case file is consumed exactly once
+    for i, case in cases:
+        for model in models:
+            if (model, i) not in skip:
+                yield model, i, case
+
+
+def run_suite(
+    models: Sequence[str],
+    cases: Iterable[IndexedCase],
+    run: RunFn,
+    arun: AsyncRunFn,
+    *,
+    concurrency: int = 1,
+    desc: str = "suite",
+    prewarm: int = 0,
+    skip: Container[Tuple[str, int]] = (),
+    on_row: Optional[RowCallback] = None,
+    collect: bool = True,
+    stop: Optional[Callable[[], bool]] = None,
+) -> List[SuiteRow]:
+    """Run every (model, case) pair and return rows in model-major order.
+
+    `cases` is an iterable of (case_index, case) and is read once, lazily,
+    so it can stream from a large case file. With concurrency <= 1 the
+    pairs run one after another through `run`; otherwise up to
+    `concurrency` requests are in flight at once through `arun`, so the
+    wall clock is bounded by the slowest requests rather than their sum.
+    Each row keeps its own per-case wall time either way.
+    `prewarm` opens that many pooled connections before the first case.
+    Pairs whose (model, case_index) is in `skip` are not run; `on_row`
+    sees every finished row as soon as it completes (e.g. to checkpoint it).
+    With `collect=False` rows are only passed to `on_row` and an empty
+    list is returned, keeping memory flat on large runs. Once `stop()`
+    returns true no further pairs are started; requests already in flight
+    still finish and are reported.
+    """
+    total = None
+    if isinstance(cases, Sized):
+        pairs: Iterable[Tuple[str, int, Case]] = list(_pairs(models, cases, skip))
+        total = len(pairs)
+    else:
+        pairs = _pairs(models, cases, skip)
+    order = {m: n for n, m in enumerate(models)}
+    kept: List[Tuple[int, int, SuiteRow]] = []
+
+    def finish(i: int, row: SuiteRow) -> None:
+        if on_row is not None:
+            on_row(i, row)
+        if collect:
+            kept.append((order[row[0]], i, row))
+
+    run_pairs(
+        pairs,
+        run,
+        arun,
+        total=total,
+        concurrency=concurrency,
+        desc=desc,
+        prewarm=prewarm,
+        on_row=finish,
+        stop=stop,
+    )
+    kept.sort(key=lambda k: (k[0], k[1]))
+    return [row for _m, _i, row in kept]
+
+
+def run_pairs(
+    pairs: Iterable[Tuple[str, Hashable, Case]],
+    run: RunFn,
+    arun: AsyncRunFn,
+    *,
+    total: Optional[int] = None,
+    concurrency: int = 1,
+    desc: str = "suite",
+    prewarm: int = 0,
+    on_row: KeyedRowCallback,
+    stop: Optional[Callable[[], bool]] = None,
+) -> None:
+    """Run explicit (model, key, case) triples; `on_row(key, row)` gets each result.
+
+    The engine behind run_suite, for callers that schedule their own
+    pairs (e.g. repeated samples of a case).
+    """
+    if concurrency <= 1:
+        prewarm_pool(prewarm)
+        for model, key, case in tqdm(pairs, total=total, desc=desc):
+            if stop is not None and stop():
+                break
+            t0 = time.perf_counter()
+            res = run(model, case)
+            dt = time.perf_counter() - t0
+            on_row(key, (model, case, res, dt))
+    else:
+        asyncio.run(
+            _run_suite_async(pairs, total, arun, concurrency, desc, prewarm, on_row, stop)
+        )
+
+
+class _ReadyRoundRobin:
+    """Hands out pairs round-robin over models, skipping models that are out of budget.
+
+    Pairs are read ahead from the (case-major) iterable, up to `lookahead`,
+    so a throttled model's backlog does not hold up the others.
+    """
+
+    def __init__(
+        self,
+        pairs: Iterable[Tuple[str, Hashable, Case]],
+        delay: Callable[[str], float],
+        lookahead: int,
+    ) -> None:
+        self._it = iter(pairs)
+        self._delay = delay
+        self._lookahead = lookahead
+        self._queues: Dict[str, Deque[Tuple[str, Hashable, Case]]] = {}
+        self._buffered = 0
+        self._turn = 0
+        self._exhausted = False
+
+    def _fill(self) -> None:
+        while not self._exhausted and self._buffered < self._lookahead:
+            item = next(self._it, None)
+            if item is None:
+                self._exhausted = True
+                return
+            self._queues.setdefault(item[0], deque()).append(item)
+            self._buffered += 1
+
+    async def next(self) -> Optional[Tuple[str, Hashable, Case]]:
+        while True:
+            self._fill()
+            order = list(self._queues)
+            waits = []
+            for k in range(len(order)):
+                idx = (self._turn + k) % len(order)
+                queue = self._queues[order[idx]]
+                if not queue:
+                    continue
+                wait = self._delay(order[idx])
+                if wait <= 0:
+                    self._turn = idx + 1
+                    self._buffered -= 1
+                    return queue.popleft()
+                waits.append(wait)
+            if not waits:
+                return None
+            await asyncio.sleep(min(waits))
+
+
+async def _run_suite_async(
+    pairs: Iterable[Tuple[str, Hashable, Case]],
+    total: Optional[int],
+    arun: AsyncRunFn,
+    concurrency: int,
+    desc: str,
+    prewarm: int,
+    finish: KeyedRowCallback,
+    stop: Optional[Callable[[], bool]] = None,
+) -> None:
+    await prewarm_async(prewarm)
+    # Only `concurrency` tasks exist at a time, so pairs are pulled from
+    # the (possibly lazy) iterable as slots free up
+    sem = asyncio.Semaphore(concurrency)
+    pending: Set[asyncio.Task] = set()
+    failed: List[BaseException] = []
+    bar = tqdm(total=total, desc=desc)
+
+    async def one(model: str, i: Hashable, case: Case) -> None:
+        # A pipelined runner frees the slot once its output is queued for
+        # local work, so the next request goes out meanwhile
+        with generation_slot(sem.release):
+            t0 = time.perf_counter()
+            res = await arun(model, case)
+            dt = time.perf_counter() - t0
+            finish(i, (model, case, res, dt))
+            bar.update(1)
+
+    def done(task: asyncio.Task) -> None:
+        pending.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            failed.append(task.exception())
+
+    # With rate limiting on, the next pair goes to whichever model has
+    # budget, taking turns, instead of strictly in case order
+    it = iter(pairs)
+    limiter = rate_limiter()
+    ready = None
+    if limiter is not None:
+        ready = _ReadyRoundRobin(it, limiter.delay, max(1024, concurrency * 16))
+
+    try:
+        # Pipelined runners hand their local work to the scope's stages
+        async with pipeline_scope(concurrency):
+            while True:
+                await sem.acquire()
+                if stop is not None and stop():
+                    # Stop dispatching; the wait below drains what is in flight
+                    sem.release()
+                    break
+                item = next(it, None) if ready is None else await ready.next()
+                if failed or item is None:
+                    sem.release()
+                    break
+                task = asyncio.create_task(one(*item))
+                pending.add(task)
+                task.add_done_callback(done)
+                if ready is not None:
+                    # Let the task book its budget before choosing the next pair
+                    await asyncio.sleep(0)
+            if pending:
+                await asyncio.wait(set(pending))
+        if failed:
+            raise failed[0]
+    finally:
+        for task in pending:
+            task.cancel()
+        bar.close()
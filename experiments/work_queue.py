@@ -0,0 +1,595 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from tqdm import tqdm
+
+from experiments.cfg_math import run_cfg_math, run_cfg_math_async
+from experiments.cfg_sql import SqlLimits, run_cfg_sql, run_cfg_sql_async
+from experiments.checkpoint import Checkpoint, result_from_dict, result_to_dict
+from experiments.pipeline import (
+    PipelineConfig,
+    configure_pipeline,
+    generation_slot,
+    pipeline_scope,
+)
+from experiments.suite import AsyncRunFn, IndexedCase, RunFn
+from lib.pricing import Spend
+
+
+"""
+SQLite work queue for multi-process suite runs.
+
+The coordinator writes the run header and one task per (model, case)
+pair into a queue file; worker processes claim tasks under a lease, run
+them and store the result in the same row. A worker that dies simply
+lets its leases expire, after which the tasks are claimed again.
+
+The file uses a rollback journal rather than WAL so that workers on
+other hosts can share it over a network filesystem with working POSIX
+locks; claims are batched, so write contention stays low.
+
+When the coordinator's budget runs out it marks the queue stopped:
+workers stop claiming, hand back tasks they claimed but did not start,
+and exit once their calls in flight are done.
+"""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    model TEXT NOT NULL,
+    case_index INTEGER NOT NULL,
+    case_json TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result_json TEXT,
+    seconds REAL,
+    error TEXT,
+    done_seq INTEGER,
+    UNIQUE (model, case_index)
+);
+CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, lease_until);
+CREATE INDEX IF NOT EXISTS tasks_done_seq ON tasks (done_seq);
+"""
+
+PENDING, LEASED, DONE, FAILED = "pending", "leased", "done", "failed"
+
+
+def queue_path(out_dir: str | Path, run_id: str) -> Path:
+    return Path(out_dir) / "runs" / f"{run_id}.queue.sqlite"
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+@dataclass
+class Task:
+    id: int
+    model: str
+    case_index: int
+    case: tuple
+    attempts: int
+
+
+class WorkQueue:
+    """(model, case) tasks with leases, stored in one SQLite file."""
+
+    def __init__(self, path: str | Path, timeout_s: float = 30.0) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit mode; write transactions are opened explicitly below
+        self.con = sqlite3.connect(
+            str(self.path), timeout=timeout_s, isolation_level=None, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        self.con.execute("PRAGMA journal_mode=DELETE")
+        self.con.execute("PRAGMA synchronous=NORMAL")
+        self.con.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.con.close()
+
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        # BEGIN IMMEDIATE takes the write lock up front, so two claimers
+        # never read the same pending rows and then race on the update
+        with self._lock:
+            self.con.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.con
+            except BaseException:
+                self.con.execute("ROLLBACK")
+                raise
+            self.con.execute("COMMIT")
+
+    # Coordinator side
+
+    def set_header(self, header: Dict[str, Any]) -> None:
+        with self._write() as con:
+            con.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('header', ?)",
+                (json.dumps(header, ensure_ascii=False),),
+            )
+
+    def set_stopped(self, stopped: bool) -> None:
+        """Tell workers to stop claiming tasks (or, with False, that they may again)."""
+        with self._write() as con:
+            if stopped:
+                con.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('stopped', '1')")
+            else:
+                con.execute("DELETE FROM meta WHERE key = 'stopped'")
+
+    def _read(self, sql: str, params: tuple = ()) -> List[tuple]:
+        # One connection is shared by the worker's threads; keep calls serialized
+        with self._lock:
+            return self.con.execute(sql, params).fetchall()
+
+    def header(self) -> Dict[str, Any]:
+        rows = self._read("SELECT value FROM meta WHERE key = 'header'")
+        row = rows[0] if rows else None
+        if row is None:
+            raise ValueError(f"not a suite work queue: {self.path}")
+        return json.loads(row[0])
+
+    def enqueue(
+        self,
+        models: List[str],
+        cases: Iterable[IndexedCase],
+        skip: Set[Tuple[str, int]] = frozenset(),
+        batch: int = 500,
+    ) -> int:
+        """Add a task per (model, case) pair not in `skip`; returns the number added.
+
+        Pairs already in the queue are left alone, so re-enqueueing on
+        resume keeps their state and results.
+        """
+        added = 0
+        buf: List[Tuple[str, int, str]] = []
+
+        def flush() -> int:
+            with self._write() as con:
+                before = con.total_changes
+                con.executemany(
+                    "INSERT OR IGNORE INTO tasks (model, case_index, case_json) VALUES (?, ?, ?)",
+                    buf,
+                )
+                n = con.total_changes - before
+            buf.clear()
+            return n
+
+        for idx, case in cases:
+            case_json = json.dumps(list(case), ensure_ascii=False)
+            for model in models:
+                if (model, idx) not in skip:
+                    buf.append((model, idx, case_json))
+            if len(buf) >= batch:
+                added += flush()
+        if buf:
+            added += flush()
+        return added
+
+    def counts(self) -> Dict[str, int]:
+        out = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        for state, n in self._read("SELECT state, COUNT(*) FROM tasks GROUP BY state"):
+            out[state] = n
+        return out
+
+    def finished(self) -> bool:
+        c = self.counts()
+        return c[PENDING] == 0 and c[LEASED] == 0
+
+    def completed_since(self, seq: int) -> List[Tuple[int, str, int, tuple, Dict[str, Any], float]]:
+        """Finished tasks with done_seq > `seq`, in completion order."""
+        rows = self._read(
+            "SELECT done_seq, model, case_index, case_json, result_json, seconds "
+            "FROM tasks WHERE done_seq > ? ORDER BY done_seq",
+            (seq,),
+        )
+        return [
+            (s, model, idx, tuple(json.loads(c)), json.loads(r), float(sec))
+            for s, model, idx, c, r, sec in rows
+        ]
+
+    def stopped(self) -> bool:
+        return bool(self._read("SELECT 1 FROM meta WHERE key = 'stopped'"))
+
+    def keys(self) -> List[Tuple[str, int]]:
+        return self._read("SELECT model, case_index FROM tasks")
+
+    def retry_failed(self) -> int:
+        """Give tasks that failed for good a fresh set of attempts."""
+        with self._write() as con:
+            cur = con.execute(
+                "UPDATE tasks SET state = ?, attempts = 0 WHERE state = ?", (PENDING, FAILED)
+            )
+            return cur.rowcount
+
+    def failures(self) -> List[Tuple[str, int, str]]:
+        return self._read(
+            "SELECT model, case_index, error FROM tasks WHERE state = ? ORDER BY id", (FAILED,)
+        )
+
+    # Worker side
+
+    def claim(self, worker: str, n: int = 1, lease_s: float = 120.0) -> List[Task]:
+        """Lease up to `n` pending tasks (or tasks whose lease has expired)."""
+        now = time.time()
+        with self._write() as con:
+            rows = con.execute(
+                "SELECT id, model, case_index, case_json, attempts FROM tasks "
+                "WHERE state = ? OR (state = ? AND lease_until < ?) ORDER BY id LIMIT ?",
+                (PENDING, LEASED, now, n),
+            ).fetchall()
+            con.executemany(
+                "UPDATE tasks SET state = ?, worker = ?, lease_until = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                [(LEASED, worker, now + lease_s, r[0]) for r in rows],
+            )
+        return [
+            Task(id=r[0], model=r[1], case_index=r[2], case=tuple(json.loads(r[3])), attempts=r[4] + 1)
+            for r in rows
+        ]
+
+    def renew(self, worker: str, ids: Iterable[int], lease_s: float = 120.0) -> None:
+        ids = list(ids)
+        if not ids:
+            return
+        with self._write() as con:
+            con.executemany(
+                "UPDATE tasks SET lease_until = ? WHERE id = ? AND worker = ? AND state = ?",
+                [(time.time() + lease_s, i, worker, LEASED) for i in ids],
+            )
+
+    def release(self, worker: str, ids: Iterable[int]) -> None:
+        """Return leased tasks to the queue without counting the attempt."""
+        with self._write() as con:
+            con.executemany(
+                "UPDATE tasks SET state = ?, lease_until = NULL, attempts = attempts - 1 "
+                "WHERE id = ? AND worker = ? AND state = ?",
+                [(PENDING, i, worker, LEASED) for i in ids],
+            )
+
+    def complete(self, task_id: int, result: Dict[str, Any], seconds: float) -> None:
+        # A task whose lease expired may finish twice; the first result stays
+        with self._write() as con:
+            con.execute(
+                "UPDATE tasks SET state = ?, result_json = ?, seconds = ?, error = NULL, "
+                "lease_until = NULL, "
+                "done_seq = (SELECT COALESCE(MAX(done_seq), 0) + 1 FROM tasks) "
+                "WHERE id = ? AND state != ?",
+                (DONE, json.dumps(result, ensure_ascii=False), seconds, task_id, DONE),
+            )
+
+    def fail(self, worker: str, task_id: int, error: str, max_attempts: int = 3) -> None:
+        """Put the task back for another worker, or mark it failed for good.
+
+        Only while `worker` still holds the lease; once it expired the task
+        may belong to another worker, whose attempt decides.
+        """
+        with self._write() as con:
+            con.execute(
+                "UPDATE tasks SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+                "error = ?, lease_until = NULL WHERE id = ? AND worker = ? AND state = ?",
+                (max_attempts, FAILED, PENDING, error, task_id, worker, LEASED),
+            )
+
+
+def suite_runners(header: Dict[str, Any]) -> Tuple[RunFn, AsyncRunFn]:
+    """The (run, arun) pair for a checkpoint/queue header."""
+    stream = {
+        "stream": bool(header.get("stream")),
+        "early_abort": bool(header.get("early_abort")),
+    }
+    if header["kind"] == "math":
+        return (
+            lambda model, case: run_cfg_math(
+                prompt=case[0], expected=case[1], model=model, **stream
+            ),
+            lambda model, case: run_cfg_math_async(
+                prompt=case[0], expected=case[1], model=model, **stream
+            ),
+        )
+    dataset = header.get("dataset")
+    limits = SqlLimits(**header.get("limits", {}))
+    return (
+        lambda model, case: run_cfg_sql(
+            prompt=case[0],
+            model=model,
+            expected_rows=case[1],
+            dataset=dataset,
+            limits=limits,
+            **stream,
+        ),
+        lambda model, case: run_cfg_sql_async(
+            prompt=case[0],
+            model=model,
+            expected_rows=case[1],
+            dataset=dataset,
+            limits=limits,
+            **stream,
+        ),
+    )
+
+
+@dataclass
+class WorkerStats:
+    done: int = 0
+    failed: int = 0
+
+
+def run_worker(
+    path: str | Path,
+    concurrency: int = 1,
+    worker_id: Optional[str] = None,
+    lease_s: float = 120.0,
+    poll_s: float = 0.5,
+    wait: bool = False,
+    max_attempts: int = 3,
+    cache: Optional[Tuple[str, str]] = None,
+    hedge: bool = False,
+    coalesce: bool = False,
+    rate_limit: bool = False,
+    pipeline: Optional[PipelineConfig] = None,
+) -> WorkerStats:
+    """Claim and run tasks from the queue at `path` until none are left.
+
+    With `wait`, keep polling for new tasks instead of exiting once the
+    queue is drained. `cache`, `hedge`, `coalesce`, `rate_limit` and
+    `pipeline` mirror the top-level CLI flags for workers started in a
+    fresh process.
+    """
+    from lib.openai_client import (
+        configure_cache,
+        configure_coalescing,
+        configure_policy,
+        configure_rate_limiting,
+    )
+
+    if cache is not None and cache[0] != "off":
+        configure_cache(*cache)
+    if hedge:
+        configure_policy(hedge=True)
+    if coalesce:
+        configure_coalescing(True)
+    if rate_limit:
+        configure_rate_limiting(True)
+    if pipeline is not None:
+        configure_pipeline(pipeline)
+    queue = WorkQueue(path)
+    stats = WorkerStats()
+    try:
+        asyncio.run(
+            _work(
+                queue,
+                stats,
+                concurrency=max(1, concurrency),
+                worker=worker_id or default_worker_id(),
+                lease_s=lease_s,
+                poll_s=poll_s,
+                wait=wait,
+                max_attempts=max_attempts,
+            )
+        )
+    except KeyboardInterrupt:
+        pass  # leases were released on the way out
+    finally:
+        queue.close()
+    return stats
+
+
+async def _work(
+    queue: WorkQueue,
+    stats: WorkerStats,
+    concurrency: int,
+    worker: str,
+    lease_s: float,
+    poll_s: float,
+    wait: bool,
+    max_attempts: int,
+) -> None:
+    _, arun = suite_runners(queue.header())
+    held: Set[int] = set()
+    ready: asyncio.Queue = asyncio.Queue()
+    stop = asyncio.Event()
+
+    async def drain() -> None:
+        # Budget exhausted: return claimed but unstarted tasks, then let
+        # each slot exit once its current call is done
+        unstarted = []
+        while not ready.empty():
+            t = ready.get_nowait()
+            held.discard(t.id)
+            unstarted.append(t.id)
+        await asyncio.to_thread(queue.release, worker, unstarted)
+        for _ in range(concurrency):
+            ready.put_nowait(None)
+
+    async def feeder() -> None:
+        # Keep up to one batch claimed ahead of the slots
+        checked = 0.0
+        while not stop.is_set():
+            if time.monotonic() - checked >= poll_s:
+                checked = time.monotonic()
+                if await asyncio.to_thread(queue.stopped):
+                    await drain()
+                    break
+            if ready.qsize() >= concurrency:
+                await asyncio.sleep(0.05)
+                continue
+            tasks = await asyncio.to_thread(queue.claim, worker, concurrency, lease_s)
+            for t in tasks:
+                held.add(t.id)
+                ready.put_nowait(t)
+            if tasks:
+                continue
+            # Tasks leased by other workers may still come back on expiry
+            if not held and not wait and await asyncio.to_thread(queue.finished):
+                stop.set()
+                break
+            await asyncio.sleep(poll_s)
+
+    async def heartbeat() -> None:
+        while not stop.is_set():
+            await asyncio.sleep(lease_s / 3)
+            await asyncio.to_thread(queue.renew, worker, list(held), lease_s)
+
+    async def slot() -> None:
+        while True:
+            get = asyncio.ensure_future(ready.get())
+            stopped = asyncio.ensure_future(stop.wait())
+            await asyncio.wait({get, stopped}, return_when=asyncio.FIRST_COMPLETED)
+            stopped.cancel()
+            if not get.done():
+                get.cancel()
+                return
+            task: Optional[Task] = get.result()
+            if task is None:
+                return
+            t0 = time.perf_counter()
+            try:
+                # The slot itself stays busy until the result is stored
+                with generation_slot(lambda: None):
+                    res = await arun(task.model, task.case)
+            except Exception as e:
+                await asyncio.to_thread(
+                    queue.fail, worker, task.id, f"{type(e).__name__}: {e}", max_attempts
+                )
+                stats.failed += 1
+            else:
+                sec = time.perf_counter() - t0
+                await asyncio.to_thread(queue.complete, task.id, result_to_dict(res), sec)
+                stats.done += 1
+            # Not in a finally: a cancelled task must stay held so it is released
+            held.discard(task.id)
+
+    helpers = [asyncio.create_task(feeder()), asyncio.create_task(heartbeat())]
+    try:
+        async with pipeline_scope(concurrency):
+            await asyncio.gather(*(slot() for _ in range(concurrency)))
+    finally:
+        stop.set()
+        for h in helpers:
+            h.cancel()
+        await asyncio.gather(*helpers, return_exceptions=True)
+        # Interrupted: hand unfinished tasks back instead of waiting for the leases
+        queue.release(worker, held)
+
+
+def run_distributed(
+    ckpt: Checkpoint,
+    cases: Iterable[IndexedCase],
+    workers: int,
+    concurrency: int = 1,
+    desc: str = "",
+    lease_s: float = 120.0,
+    poll_s: float = 0.5,
+    cache: Optional[Tuple[str, str]] = None,
+    hedge: bool = False,
+    coalesce: bool = False,
+    rate_limit: bool = False,
+    pipeline: Optional[PipelineConfig] = None,
+    spend: Optional[Spend] = None,
+) -> bool:
+    """Run the pairs missing from `ckpt` on `workers` local processes.
+
+    The queue lives next to the checkpoint, so workers on other hosts can
+    join with `llm-playground cfg-worker --queue PATH`. The coordinator is
+    the only writer of the checkpoint: finished tasks are drained from the
+    queue and appended as they complete, and counted in `spend`. Once its
+    budget is exhausted the queue is stopped and the coordinator waits for
+    the leased tasks to finish. Returns False if interrupted, stopped or
+    if tasks were left unfinished.
+    """
+    header = ckpt.header
+    path = queue_path(ckpt.path.parent.parent, header["run_id"])
+    queue = WorkQueue(path)
+    procs: List[multiprocessing.process.BaseProcess] = []
+    try:
+        queue.set_header(header)
+        queue.set_stopped(False)
+        done = ckpt.done()
+        queue.enqueue(header["models"], cases, skip=done)
+        queue.retry_failed()
+        # Spawned, not forked: workers build their own clients and DB handles
+        ctx = multiprocessing.get_context("spawn")
+        for _ in range(workers):
+            p = ctx.Process(
+                target=run_worker,
+                args=(str(path), concurrency),
+                kwargs={
+                    "lease_s": lease_s,
+                    "cache": cache,
+                    "hedge": hedge,
+                    "coalesce": coalesce,
+                    "rate_limit": rate_limit,
+                    "pipeline": pipeline,
+                },
+                daemon=True,
+            )
+            p.start()
+            procs.append(p)
+
+        seq = 0
+        remaining = sum(1 for k in queue.keys() if k not in done)
+        bar = tqdm(total=len(done) + remaining, desc=desc)
+        bar.update(len(done))
+
+        def collect() -> None:
+            nonlocal seq
+            for s, model, idx, case, result, sec in queue.completed_since(seq):
+                seq = s
+                if (model, idx) in done:
+                    continue  # finished before an earlier interruption, already saved
+                done.add((model, idx))
+                res = result_from_dict(ckpt.kind, result)
+                ckpt.append(idx, (model, case, res, sec))
+                bar.update(1)
+                if spend is not None:
+                    spend.add_result(model, res)
+
+        stopped = False
+        try:
+            while True:
+                collect()
+                if queue.finished():
+                    break
+                if spend is not None and not stopped and spend.exhausted():
+                    queue.set_stopped(True)
+                    stopped = True
+                if stopped and queue.counts()[LEASED] == 0:
+                    break
+                if not any(p.is_alive() for p in procs):
+                    break  # remote workers, if any, can still finish under --resume
+                time.sleep(poll_s)
+            # Tasks finished between the last poll and the workers exiting
+            collect()
+        finally:
+            bar.close()
+        failed = queue.failures()
+        for model, idx, error in failed:
+            tqdm.write(f"failed: {model} case {idx}: {error}")
+        return queue.finished() and not failed
+    except KeyboardInterrupt:
+        return False
+    finally:
+        for p in procs:
+            p.join(timeout=10)
+            if p.is_alive():
+                p.terminate()
+        queue.close()
+        ckpt.close()
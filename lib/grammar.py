@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import weakref
+from pathlib import Path
+from typing import Any, Callable, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from lark import Lark, Token
+from lark.exceptions import UnexpectedCharacters, UnexpectedInput
+from lark.lexer import BasicLexer, LexerState, PatternStr
+
+try:
+    import re._parser as sre_parse  # Python 3.11+
+except ImportError:  # pragma: no cover
+    import sre_parse  # type: ignore[no-redef]
+
+
+# "lalr" (default) or "earley"; both grammars are unambiguous, so LALR
+# accepts exactly the same strings and is much faster.
+DEFAULT_PARSER = os.getenv("CFG_PARSER", "lalr")
+GRAMMAR_CACHE_DIR = os.getenv("CFG_GRAMMAR_CACHE_DIR", ".cache/grammars")
+
+
+def grammar_hash(grammar: str, **options: Any) -> str:
+    blob = grammar + "\0" + repr(sorted(options.items()))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+
+def load_parser(grammar: str, *, parser: str = DEFAULT_PARSER, **options: Any) -> Lark:
+    """Build a Lark parser, loading LALR tables from disk when available.
+
+    LALR tables are serialized under GRAMMAR_CACHE_DIR keyed by the grammar
+    hash, so later processes (and suite workers) skip table construction.
+    Earley has no serializable tables and is always built from scratch.
+    """
+    if parser != "lalr":
+        return Lark(grammar, parser=parser, **options)
+    cache_dir = Path(GRAMMAR_CACHE_DIR)
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+    except OSError:
+        return Lark(grammar, parser="lalr", **options)
+    # An inline transformer only supplies callbacks; the tables are the same
+    table_options = {k: v for k, v in options.items() if k != "transformer"}
+    cache_file = cache_dir / f"{grammar_hash(grammar, **table_options)}.lalr"
+    return Lark(grammar, parser="lalr", cache=str(cache_file), **options)
+
+
+def validate_many(parser: Lark, texts: Iterable[str]) -> List[bool]:
+    """Return, for each text, whether it parses under `parser`."""
+    ok: List[bool] = []
+    for text in texts:
+        try:
+            parser.parse(text)
+            ok.append(True)
+        except Exception:
+            ok.append(False)
+    return ok
+
+
+def _first_chars(pattern: str) -> Optional[FrozenSet[str]]:
+    """Characters a match of `pattern` can start with; None if unknown/any."""
+
+    def first(items) -> Optional[FrozenSet[str]]:
+        if not items:
+            return None
+        op, av = items[0]
+        if op is sre_parse.LITERAL:
+            return frozenset(chr(av))
+        if op is sre_parse.IN:
+            chars = set()
+            for iop, iav in av:
+                if iop is sre_parse.LITERAL:
+                    chars.add(chr(iav))
+                elif iop is sre_parse.RANGE:
+                    chars.update(chr(c) for c in range(iav[0], iav[1] + 1))
+                else:
+                    return None  # negated sets and categories: assume anything
+            return frozenset(chars)
+        if op is sre_parse.SUBPATTERN:
+            return first(list(av[-1]))
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] > 0:
+            return first(list(av[2]))
+        if op is sre_parse.BRANCH:
+            out = set()
+            for branch in av[1]:
+                f = first(list(branch))
+                if f is None:
+                    return None
+                out |= f
+            return frozenset(out)
+        return None
+
+    return first(list(sre_parse.parse(pattern)))
+
+
+class _PrefixTables:
+    # Per-parser lexer and terminal facts used by PrefixValidator
+    def __init__(self, parser: Lark) -> None:
+        self.lexer = BasicLexer(parser.lexer_conf)
+        # Every prefix of every literal terminal, for O(1) "could still grow" checks
+        self.prefixes: Set[str] = set()
+        self.longest = 0
+        starts: Optional[set] = set()
+        for term in parser.terminals:
+            if isinstance(term.pattern, PatternStr):
+                lit = term.pattern.value
+                self.prefixes.update(lit[:k] for k in range(1, len(lit) + 1))
+                self.longest = max(self.longest, len(lit))
+            elif starts is not None:
+                f = _first_chars(term.pattern.to_regexp())
+                starts = None if f is None else starts | f
+        self.regex_starts: Optional[FrozenSet[str]] = (
+            None if starts is None else frozenset(starts)
+        )
+
+    def may_extend(self, rest: str) -> bool:
+        """Whether a longer literal could still match where `rest` begins.
+
+        `rest` runs past the matched token, so any literal it is a prefix
+        of is longer than the match.
+        """
+        return len(rest) <= self.longest and rest in self.prefixes
+
+    def may_start(self, rest: str) -> bool:
+        """Whether some token could still start with `rest` (more text pending)."""
+        if self.may_extend(rest):
+            return True
+        return self.regex_starts is None or rest[0] in self.regex_starts
+
+
+_prefix_tables: "weakref.WeakKeyDictionary[Lark, _PrefixTables]" = weakref.WeakKeyDictionary()
+
+
+class PrefixValidator:
+    """Incremental LALR check that a growing text can still become valid.
+
+    Text is fed in chunks (e.g. streamed tool-call deltas). Tokens are fed
+    to Lark's interactive parser once they can no longer change, so the
+    work per chunk is proportional to the new text. `feed` returns False
+    as soon as no continuation of the text seen so far can parse; the
+    full text still has to be parsed at the end to know it is complete.
+
+    Only LALR parsers are supported. Regex terminals are assumed to be
+    extendable only while they touch the end of the text, which holds for
+    the repetition-style terminals (INT, quoted strings) used here.
+    """
+
+    def __init__(self, parser: Lark) -> None:
+        tables = _prefix_tables.get(parser)
+        if tables is None:
+            tables = _prefix_tables[parser] = _PrefixTables(parser)
+        self._tables = tables
+        self._ip = parser.parse_interactive()
+        self._text = ""
+        # Offset of the first character not yet fed as a final token
+        self._pos = 0
+        self.error: Optional[str] = None
+
+    @property
+    def viable(self) -> bool:
+        return self.error is None
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    def feed(self, chunk: str) -> bool:
+        if self.error is not None:
+            return False
+        self._text += chunk
+        rest = self._text[self._pos :]
+        tokens: List[Token] = []
+        lexed_to = 0
+        try:
+            for tok in self._tables.lexer.lex(LexerState(rest), None):
+                end = tok.start_pos + len(tok)
+                if end >= len(rest) or self._tables.may_extend(rest[tok.start_pos :]):
+                    break
+                tokens.append(tok)
+                lexed_to = end
+        except UnexpectedCharacters as e:
+            tail = rest[e.pos_in_stream :]
+            if not self._tables.may_start(tail):
+                self.error = f"unexpected {tail[:1]!r} at {self._pos + e.pos_in_stream}"
+        for tok in tokens:
+            try:
+                self._ip.feed_token(tok)
+            except UnexpectedInput:
+                self.error = f"unexpected {tok.type} {str(tok)!r} at {self._pos + tok.start_pos}"
+                return False
+        self._pos += lexed_to
+        return self.error is None
+
+    def delta_callback(self, abort: bool) -> Callable[[str], bool]:
+        """An on_delta for responses_stream; with `abort`, stops on the first error."""
+        if abort:
+            return self.feed
+        return lambda chunk: self.feed(chunk) or True
+
+    def consumed(self) -> Tuple[int, int]:
+        """(characters fed as final tokens, characters received)."""
+        return self._pos, len(self._text)
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import random
+import string
+from typing import Dict, List, Optional
+
+from lark import Lark
+from lark.exceptions import LarkError
+from lark.grammar import NonTerminal, Rule, Terminal
+from lark.lexer import PatternStr
+
+try:
+    import re._parser as sre_parse  # Python 3.11+
+    from re._constants import MAXREPEAT
+except ImportError:  # pragma: no cover
+    import sre_parse  # type: ignore[no-redef]
+    from sre_constants import MAXREPEAT  # type: ignore[no-redef]
+
+from lib.grammar import load_parser
+
+
+"""
+Random strings from a Lark grammar.
+
+Used by the mock Responses server to stand in for a model constrained by
+a custom tool's grammar. Rules are expanded top-down, switching to the
+shallowest expansion once `max_depth` is reached so sampling terminates;
+regex terminals are sampled from their parsed pattern.
+"""
+
+# Characters used for negated sets and "." in regex terminals
+_ALPHABET = string.ascii_letters + string.digits + " _-.,:;!?"
+_CATEGORIES = {
+    sre_parse.CATEGORY_DIGIT: string.digits,
+    sre_parse.CATEGORY_WORD: string.ascii_letters + string.digits + "_",
+    sre_parse.CATEGORY_SPACE: " ",
+    sre_parse.CATEGORY_NOT_DIGIT: string.ascii_letters,
+    sre_parse.CATEGORY_NOT_WORD: " -.,",
+    sre_parse.CATEGORY_NOT_SPACE: string.ascii_letters + string.digits,
+}
+
+
+class RegexSampler:
+    """Random strings matching a (simple) regular expression."""
+
+    def __init__(self, pattern: str, max_repeat: int = 4) -> None:
+        self.parsed = sre_parse.parse(pattern)
+        self.max_repeat = max_repeat
+
+    def sample(self, rng: random.Random) -> str:
+        out: List[str] = []
+        self._emit(self.parsed, rng, out)
+        return "".join(out)
+
+    def _emit(self, items, rng: random.Random, out: List[str]) -> None:
+        for op, av in items:
+            if op is sre_parse.LITERAL:
+                out.append(chr(av))
+            elif op is sre_parse.NOT_LITERAL:
+                out.append(rng.choice([c for c in _ALPHABET if ord(c) != av]))
+            elif op is sre_parse.ANY:
+                out.append(rng.choice(_ALPHABET))
+            elif op is sre_parse.IN:
+                out.append(self._charset(av, rng))
+            elif op is sre_parse.BRANCH:
+                self._emit(rng.choice(av[1]), rng, out)
+            elif op is sre_parse.SUBPATTERN:
+                self._emit(av[-1], rng, out)
+            elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+                lo, hi, sub = av
+                hi = lo + self.max_repeat if hi is MAXREPEAT else min(hi, lo + self.max_repeat)
+                for _ in range(rng.randint(lo, hi)):
+                    self._emit(sub, rng, out)
+            elif op is sre_parse.AT:
+                continue
+            else:
+                raise ValueError(f"unsupported regex construct in terminal: {op}")
+
+    def _charset(self, items, rng: random.Random) -> str:
+        chars: List[str] = []
+        negate = False
+        for op, av in items:
+            if op is sre_parse.NEGATE:
+                negate = True
+            elif op is sre_parse.LITERAL:
+                chars.append(chr(av))
+            elif op is sre_parse.RANGE:
+                chars.extend(chr(c) for c in range(av[0], av[1] + 1))
+            elif op is sre_parse.CATEGORY:
+                chars.extend(_CATEGORIES.get(av, ""))
+        if negate:
+            excluded = set(chars)
+            chars = [c for c in _ALPHABET if c not in excluded]
+        if not chars:
+            raise ValueError("empty character class in terminal")
+        return rng.choice(chars)
+
+
+class GrammarSampler:
+    """Sample sentences (and optionally near-miss invalid strings) from a grammar."""
+
+    def __init__(self, grammar: str, start: str = "start", max_depth: int = 8) -> None:
+        self.parser: Lark = load_parser(grammar, start=start)
+        self.start = start
+        self.max_depth = max_depth
+        self._rules: Dict[str, List[Rule]] = {}
+        for rule in self.parser.rules:
+            self._rules.setdefault(rule.origin.name, []).append(rule)
+        self._terminals = {t.name: t for t in self.parser.terminals}
+        self._regex: Dict[str, RegexSampler] = {}
+        self._sep = " " if self.parser.lexer_conf.ignore else ""
+        height = self._min_heights()
+        # Expansions used past max_depth: those that bottom out soonest
+        self._shallow: Dict[str, List[Rule]] = {}
+        for name, rules in self._rules.items():
+            lowest = min(self._rule_height(r, height) for r in rules)
+            self._shallow[name] = [r for r in rules if self._rule_height(r, height) == lowest]
+
+    def _min_heights(self) -> Dict[str, int]:
+        # Fixed point: height(rule) = 1 + max height of its nonterminals
+        inf = 1 << 30
+        height = {name: inf for name in self._rules}
+        changed = True
+        while changed:
+            changed = False
+            for name, rules in self._rules.items():
+                best = min(self._rule_height(r, height) for r in rules)
+                if best < height[name]:
+                    height[name] = best
+                    changed = True
+        return height
+
+    @staticmethod
+    def _rule_height(rule: Rule, height: Dict[str, int]) -> int:
+        subs = [height[s.name] for s in rule.expansion if isinstance(s, NonTerminal)]
+        return 1 + max(subs, default=0)
+
+    def _terminal(self, name: str, rng: random.Random) -> str:
+        pattern = self._terminals[name].pattern
+        if isinstance(pattern, PatternStr):
+            return pattern.value
+        sampler = self._regex.get(name)
+        if sampler is None:
+            sampler = self._regex[name] = RegexSampler(pattern.to_regexp())
+        return sampler.sample(rng)
+
+    def tokens(self, rng: random.Random) -> List[str]:
+        out: List[str] = []
+        # Explicit stack instead of recursion; items are (symbol, depth)
+        stack = [(NonTerminal(self.start), 0)]
+        while stack:
+            sym, depth = stack.pop()
+            if isinstance(sym, Terminal):
+                out.append(self._terminal(sym.name, rng))
+                continue
+            if depth >= self.max_depth:
+                rule = rng.choice(self._shallow[sym.name])
+            else:
+                rule = rng.choice(self._rules[sym.name])
+            stack.extend((s, depth + 1) for s in reversed(rule.expansion))
+        return out
+
+    def sample(self, rng: random.Random) -> str:
+        return self._sep.join(self.tokens(rng))
+
+    def is_valid(self, text: str) -> bool:
+        try:
+            self.parser.parse(text)
+            return True
+        except LarkError:
+            return False
+
+    def sample_invalid(self, rng: random.Random, tries: int = 20) -> str:
+        """A small corruption of a valid sample that no longer parses."""
+        for _ in range(tries):
+            toks = self.tokens(rng)
+            text = self._sep.join(_corrupt(toks, rng))
+            if not self.is_valid(text):
+                return text
+        return self.sample(rng) + self._sep + "#"
+
+
+def _corrupt(toks: List[str], rng: random.Random) -> List[str]:
+    toks = list(toks)
+    i = rng.randrange(len(toks)) if toks else 0
+    how = rng.choice(("drop", "duplicate", "truncate", "garbage"))
+    if how == "drop" and toks:
+        del toks[i]
+    elif how == "duplicate" and toks:
+        toks.insert(i, toks[i])
+    elif how == "truncate" and len(toks) > 1:
+        toks = toks[: max(1, i)]
+    else:
+        toks.insert(i, rng.choice(["#", "@@", ";", "?"]))
+    return toks
+
+
+def sample_many(
+    grammar: str, n: int, seed: Optional[int] = None, invalid_rate: float = 0.0
+) -> List[str]:
+    sampler = GrammarSampler(grammar)
+    rng = random.Random(seed)
+    return [
+        sampler.sample_invalid(rng) if rng.random() < invalid_rate else sampler.sample(rng)
+        for _ in range(n)
+    ]
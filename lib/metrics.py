@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import math
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from lib.openai_client import RequestStats
+
+
+# Report order; anything else recorded in `timings` is appended after these
+PHASES = ["ttft", "api", "backoff", "throttle", "queue", "extract", "parse", "canonicalize", "execute", "total"]
+# Phases older results recorded separately, folded into their current phase
+# (math evaluation now happens during the parse)
+_PHASE_ALIASES = {"eval": "parse"}
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+@contextmanager
+def timed(timings: Dict[str, float], phase: str) -> Iterator[None]:
+    """Add the wall time of the with-block to timings[phase]."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = timings.get(phase, 0.0) + time.perf_counter() - t0
+
+
+def request_timings(stats: Optional[RequestStats]) -> Dict[str, float]:
+    if stats is None:
+        return {}
+    timings = {"api": stats.api_s, "backoff": stats.backoff_s}
+    # Streamed calls: time to first output delta; "api" is then time to complete
+    if stats.ttft_s is not None:
+        timings["ttft"] = stats.ttft_s
+    # Waiting for the model's RPM/TPM budget (rate limiting enabled)
+    if stats.throttle_s:
+        timings["throttle"] = stats.throttle_s
+    return timings
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Linear-interpolated percentile of `values` (q in [0, 1])."""
+    if not values:
+        return math.nan
+    xs = sorted(values)
+    pos = (len(xs) - 1) * q
+    lo = math.floor(pos)
+    hi = math.ceil(pos)
+    return xs[lo] + (xs[hi] - xs[lo]) * (pos - lo)
+
+
+def wilson_interval(passes: int, n: int, z: float = 1.96) -> Tuple[float, float]:
+    """Wilson score interval for a pass rate; (0, 1) when n is 0.
+
+    Unlike the normal approximation it stays inside [0, 1] and is not
+    degenerate at 0/n or n/n, which is where most settled cases end up.
+    """
+    if n <= 0:
+        return 0.0, 1.0
+    p = passes / n
+    z2 = z * z
+    denom = 1.0 + z2 / n
+    center = (p + z2 / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z2 / (4 * n * n)) / denom
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+def phase_percentiles(
+    rows: Sequence[Tuple[str, Any, Any, float]],
+) -> Dict[str, Dict[str, Tuple[float, ...]]]:
+    """{model: {phase: (p50, p90, p99)}} over suite rows (model, case, result, seconds)."""
+    samples: Dict[str, Dict[str, List[float]]] = {}
+    for model, _case, res, sec in rows:
+        per_phase = samples.setdefault(model, {})
+        timings: Dict[str, float] = {}
+        for phase, val in (getattr(res, "timings", None) or {}).items():
+            phase = _PHASE_ALIASES.get(phase, phase)
+            timings[phase] = timings.get(phase, 0.0) + val
+        for phase, val in timings.items():
+            per_phase.setdefault(phase, []).append(val)
+        per_phase.setdefault("total", []).append(sec)
+    return {
+        model: {
+            phase: tuple(percentile(vals, q) for q in QUANTILES)
+            for phase, vals in per_phase.items()
+        }
+        for model, per_phase in samples.items()
+    }
+
+
+def phase_report_lines(rows: Sequence[Tuple[str, Any, Any, float]]) -> List[str]:
+    """Markdown section with per-model, per-phase latency percentiles and retries."""
+    stats = phase_percentiles(rows)
+    retries: Dict[str, int] = {}
+    for model, _case, res, _sec in rows:
+        retries[model] = retries.get(model, 0) + int(getattr(res, "retries", 0) or 0)
+    lines = ["", "## Phase latency (s)", ""]
+    lines.append("| Model | Phase | p50 | p90 | p99 |")
+    lines.append("|:---:|---|---:|---:|---:|")
+    for model, per_phase in stats.items():
+        order = [p for p in PHASES if p in per_phase]
+        order += sorted(p for p in per_phase if p not in PHASES)
+        for phase in order:
+            p50, p90, p99 = per_phase[phase]
+            lines.append(f"| {model} | {phase} | {p50:.4f} | {p90:.4f} | {p99:.4f} |")
+    lines.append("")
+    lines.append(
+        "Retries: " + ", ".join(f"{m}={n}" for m, n in retries.items())
+    )
+    return lines
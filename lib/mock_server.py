@@ -0,0 +1,514 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import random
+import signal
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from lib import render
+from lib.grammar_sampler import GrammarSampler
+
+
+"""
+Local stand-in for the Responses API, for load-testing the harness.
+
+POST .../responses answers with a `custom_tool_call` whose input is
+sampled from the grammar of the first grammar-format custom tool in the
+request (plain text otherwise), with a `usage` block sized from the
+request and output. Latency and 429/5xx errors are injected according
+to MockConfig, as are per-model RPM/TPM quotas with x-ratelimit-*
+headers. With "stream": true the same response is sent as
+server-sent events, the tool input split into ~1-token deltas paced by
+per_token_s. Any other method/path gets an empty 200, which is enough
+for connection prewarming.
+
+Point the client at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+"""
+
+
+@dataclass(frozen=True)
+class Latency:
+    """Per-request delay distribution, parsed from e.g. "lognormal:0.3,0.5".
+
+    fixed:S | uniform:LO,HI | exp:MEAN | lognormal:MEDIAN,SIGMA (seconds)
+    """
+
+    kind: str = "fixed"
+    params: Tuple[float, ...] = (0.0,)
+
+    @classmethod
+    def parse(cls, spec: str) -> "Latency":
+        kind, _, rest = spec.partition(":")
+        params = tuple(float(x) for x in rest.split(",") if x) or (0.0,)
+        need = {"fixed": 1, "uniform": 2, "exp": 1, "lognormal": 2}
+        if kind not in need or len(params) != need[kind]:
+            raise ValueError(f"bad latency spec {spec!r}; see Latency docstring")
+        return cls(kind, params)
+
+    def sample(self, rng: random.Random) -> float:
+        p = self.params
+        if self.kind == "uniform":
+            return rng.uniform(p[0], p[1])
+        if self.kind == "exp":
+            return rng.expovariate(1.0 / p[0]) if p[0] > 0 else 0.0
+        if self.kind == "lognormal":
+            return rng.lognormvariate(math.log(p[0]), p[1]) if p[0] > 0 else 0.0
+        return p[0]
+
+
+@dataclass(frozen=True)
+class MockConfig:
+    latency: Latency = field(default_factory=Latency)
+    # Extra delay per generated output token, on top of `latency`
+    per_token_s: float = 0.0
+    rate_limit_rate: float = 0.0
+    error_rate: float = 0.0
+    retry_after_s: Optional[float] = 1.0
+    invalid_rate: float = 0.0
+    reasoning_tokens: int = 0
+    # Static prefixes (tools + leading non-user messages) at least this long
+    # are reported as cached from their second occurrence on, like the
+    # provider's prompt cache (1024 tokens, then 128-token increments)
+    prompt_cache_min_tokens: int = 1024
+    # Per-model quotas as (model, rpm, tpm); "*" applies to other models.
+    # Responses carry x-ratelimit-* headers and over-quota requests get 429
+    rate_limits: Tuple[Tuple[str, Optional[int], Optional[int]], ...] = ()
+    max_depth: int = 8
+    seed: Optional[int] = None
+
+
+@dataclass
+class MockStats:
+    requests: int = 0
+    ok: int = 0
+    rate_limited: int = 0
+    errors: int = 0
+    invalid: int = 0
+    streams: int = 0
+
+
+def parse_rate_limits(spec: str) -> Tuple[Tuple[str, Optional[int], Optional[int]], ...]:
+    """Parse "MODEL=RPM:TPM,..." (either side of ":" may be empty; MODEL "*" for any)."""
+    out = []
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        model, eq, limits = part.partition("=")
+        rpm, colon, tpm = limits.partition(":")
+        if not eq or not colon or not model:
+            raise ValueError(f"bad rate limit {part!r}; expected MODEL=RPM:TPM")
+        out.append((model, int(rpm) if rpm else None, int(tpm) if tpm else None))
+    return tuple(out)
+
+
+class _Quota:
+    """Requests/tokens per minute for one model, refilled linearly like the provider's."""
+
+    def __init__(self, rpm: Optional[int], tpm: Optional[int]) -> None:
+        self.limits = {"requests": rpm, "tokens": tpm}
+        self.levels = {k: float(v) for k, v in self.limits.items() if v}
+        self.stamp = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        for k, level in self.levels.items():
+            limit = self.limits[k]
+            self.levels[k] = min(limit, level + (now - self.stamp) * limit / 60.0)
+        self.stamp = now
+
+    def admit(self, tokens: int) -> bool:
+        """Charge one request of `tokens` if both limits allow it."""
+        self._refill()
+        need = {"requests": 1, "tokens": tokens}
+        if any(level < min(need[k], self.limits[k]) for k, level in self.levels.items()):
+            return False
+        for k in self.levels:
+            self.levels[k] -= need[k]
+        return True
+
+    def retry_after(self, tokens: int) -> float:
+        """Seconds until a request of `tokens` would be admitted."""
+        need = {"requests": 1, "tokens": tokens}
+        return max(
+            (min(need[k], self.limits[k]) - level) * 60.0 / self.limits[k]
+            for k, level in self.levels.items()
+        )
+
+    def charge(self, tokens: int) -> None:
+        if "tokens" in self.levels:
+            self.levels["tokens"] -= tokens
+
+    def headers(self) -> Dict[str, str]:
+        out = {}
+        for k, level in self.levels.items():
+            limit = self.limits[k]
+            out[f"x-ratelimit-limit-{k}"] = str(limit)
+            out[f"x-ratelimit-remaining-{k}"] = str(max(0, int(level)))
+            out[f"x-ratelimit-reset-{k}"] = f"{max(0.0, limit - level) * 60.0 / limit:.3f}s"
+        return out
+
+
+def _approx_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for load testing
+    return max(1, (len(text) + 3) // 4)
+
+
+def _input_tokens(body: Dict[str, Any]) -> Tuple[int, Tuple[int, int]]:
+    """(total input tokens, (static prefix tokens, prefix hash))."""
+    tools = json.dumps(body.get("tools") or [], ensure_ascii=False)
+    inp = body.get("input", "")
+    messages = inp if isinstance(inp, list) else [inp]
+    static: List[Any] = []
+    for msg in messages:
+        if isinstance(msg, dict) and msg.get("role") in ("developer", "system"):
+            static.append(msg)
+        else:
+            break
+    static_text = tools + json.dumps(static, ensure_ascii=False)
+    rest = json.dumps(messages[len(static):], ensure_ascii=False)
+    prefix_tokens = _approx_tokens(static_text)
+    # Cache entries are per model, as with the provider
+    key = hash((body.get("model"), static_text))
+    return prefix_tokens + _approx_tokens(rest), (prefix_tokens, key)
+
+
+def _grammar_tool(tools: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    for tool in tools or []:
+        fmt = tool.get("format") or {}
+        if tool.get("type") == "custom" and fmt.get("syntax") == "lark":
+            return tool
+    return None
+
+
+class MockResponses:
+    """Builds responses and error decisions; independent of the transport."""
+
+    def __init__(self, config: MockConfig) -> None:
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.stats = MockStats()
+        self._samplers: Dict[str, GrammarSampler] = {}
+        self._prefixes: Set[int] = set()
+        self._quotas: Dict[str, _Quota] = {}
+
+    def quota(self, model: str) -> Optional[_Quota]:
+        q = self._quotas.get(model)
+        if q is None:
+            limits = {m: (rpm, tpm) for m, rpm, tpm in self.config.rate_limits}
+            rpm, tpm = limits.get(model) or limits.get("*") or (None, None)
+            if not rpm and not tpm:
+                return None
+            q = self._quotas[model] = _Quota(rpm, tpm)
+        return q
+
+    def over_quota(self, body: Dict[str, Any]) -> Optional[Tuple[Dict[str, str], Dict[str, Any]]]:
+        """(headers, error body) if the request exceeds its model's quota."""
+        quota = self.quota(body.get("model", ""))
+        tokens = _input_tokens(body)[0]
+        if quota is None or quota.admit(tokens):
+            return None
+        self.stats.rate_limited += 1
+        headers = quota.headers()
+        headers["retry-after-ms"] = str(max(1, math.ceil(quota.retry_after(tokens) * 1000)))
+        return headers, _error_body(
+            "Rate limit reached (mock quota)", "requests", "rate_limit_exceeded"
+        )
+
+    def quota_headers(self, response: Dict[str, Any]) -> Dict[str, str]:
+        """Charge the output tokens of an admitted request; its x-ratelimit-* headers."""
+        quota = self.quota(response["model"])
+        if quota is None:
+            return {}
+        quota.charge(response["usage"]["output_tokens"])
+        return quota.headers()
+
+    def _sampler(self, grammar: str) -> GrammarSampler:
+        sampler = self._samplers.get(grammar)
+        if sampler is None:
+            sampler = GrammarSampler(grammar, max_depth=self.config.max_depth)
+            self._samplers[grammar] = sampler
+        return sampler
+
+    def fault(self) -> Optional[Tuple[int, Dict[str, str], Dict[str, Any]]]:
+        """(status, headers, body) for an injected error, or None."""
+        cfg = self.config
+        roll = self.rng.random()
+        if roll < cfg.rate_limit_rate:
+            self.stats.rate_limited += 1
+            headers = {}
+            if cfg.retry_after_s is not None:
+                headers["retry-after-ms"] = str(int(cfg.retry_after_s * 1000))
+                headers["retry-after"] = str(max(1, math.ceil(cfg.retry_after_s)))
+            return 429, headers, _error_body(
+                "Rate limit reached (mock)", "requests", "rate_limit_exceeded"
+            )
+        if roll < cfg.rate_limit_rate + cfg.error_rate:
+            self.stats.errors += 1
+            status = self.rng.choice((500, 502, 503))
+            return status, {}, _error_body("Injected server error (mock)", "server_error", None)
+        return None
+
+    def respond(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        cfg = self.config
+        tool = _grammar_tool(body.get("tools") or [])
+        if tool is not None:
+            sampler = self._sampler(tool["format"]["definition"])
+            if self.rng.random() < cfg.invalid_rate:
+                self.stats.invalid += 1
+                text = sampler.sample_invalid(self.rng)
+            else:
+                text = sampler.sample(self.rng)
+            item = {
+                "type": "custom_tool_call",
+                "id": f"ctc_{uuid.uuid4().hex[:24]}",
+                "call_id": f"call_{uuid.uuid4().hex[:24]}",
+                "name": tool.get("name"),
+                "input": text,
+                "status": "completed",
+            }
+        else:
+            text = "pong"
+            item = {
+                "type": "message",
+                "id": f"msg_{uuid.uuid4().hex[:24]}",
+                "role": "assistant",
+                "status": "completed",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }
+        in_tokens, prefix = _input_tokens(body)
+        cached = self._cached_tokens(prefix)
+        reasoning = self.rng.randint(0, 2 * cfg.reasoning_tokens) if cfg.reasoning_tokens else 0
+        out_tokens = _approx_tokens(text) + reasoning
+        self.stats.ok += 1
+        return {
+            "id": f"resp_{uuid.uuid4().hex}",
+            "object": "response",
+            "created_at": int(time.time()),
+            "status": "completed",
+            "model": body.get("model", "mock"),
+            "output": [item],
+            "parallel_tool_calls": True,
+            "tool_choice": "auto",
+            "tools": body.get("tools") or [],
+            "usage": {
+                "input_tokens": in_tokens,
+                "input_tokens_details": {"cached_tokens": cached},
+                "output_tokens": out_tokens,
+                "output_tokens_details": {"reasoning_tokens": reasoning},
+                "total_tokens": in_tokens + out_tokens,
+            },
+        }
+
+    def _cached_tokens(self, prefix: Tuple[int, int]) -> int:
+        tokens, key = prefix
+        if tokens < self.config.prompt_cache_min_tokens:
+            return 0
+        if key not in self._prefixes:
+            self._prefixes.add(key)
+            return 0
+        return tokens // 128 * 128
+
+    def delay(self, response: Dict[str, Any]) -> float:
+        out_tokens = response["usage"]["output_tokens"]
+        return self.config.latency.sample(self.rng) + self.config.per_token_s * out_tokens
+
+    def stream_events(self, response: Dict[str, Any]) -> List[Tuple[float, Dict[str, Any]]]:
+        """(delay before the event, event) pairs replaying `response` as a stream."""
+        per_token = self.config.per_token_s
+        item = response["output"][0]
+        reasoning = response["usage"]["output_tokens_details"]["reasoning_tokens"]
+        in_progress = dict(response, status="in_progress", output=[], usage=None)
+        events: List[Tuple[float, Dict[str, Any]]] = [
+            (0.0, {"type": "response.created", "response": in_progress}),
+            (0.0, {"type": "response.in_progress", "response": in_progress}),
+        ]
+        if item["type"] == "custom_tool_call":
+            text = item["input"]
+            events.append(
+                (0.0, {"type": "response.output_item.added", "output_index": 0,
+                       "item": dict(item, input="", status="in_progress")})
+            )
+            # First delta after the base latency and the reasoning tokens
+            wait = self.config.latency.sample(self.rng) + per_token * reasoning
+            for i in range(0, len(text), 4):
+                events.append(
+                    (wait, {"type": "response.custom_tool_call_input.delta",
+                            "item_id": item["id"], "output_index": 0, "delta": text[i : i + 4]})
+                )
+                wait = per_token
+            events.append(
+                (wait, {"type": "response.custom_tool_call_input.done",
+                        "item_id": item["id"], "output_index": 0, "input": text})
+            )
+        else:
+            events.append(
+                (self.delay(response), {"type": "response.output_item.added",
+                                        "output_index": 0, "item": item})
+            )
+        events.append((0.0, {"type": "response.output_item.done", "output_index": 0, "item": item}))
+        events.append((0.0, {"type": "response.completed", "response": response}))
+        for seq, (_, event) in enumerate(events):
+            event["sequence_number"] = seq
+        return events
+
+
+def _error_body(message: str, type_: str, code: Optional[str]) -> Dict[str, Any]:
+    return {"error": {"message": message, "type": type_, "param": None, "code": code}}
+
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 429: "Too Many Requests",
+            500: "Internal Server Error", 502: "Bad Gateway", 503: "Service Unavailable"}
+
+
+class MockServer:
+    """Minimal HTTP/1.1 keep-alive server on asyncio; one task per connection."""
+
+    def __init__(self, config: MockConfig) -> None:
+        self.mock = MockResponses(config)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: Set[asyncio.StreamWriter] = set()
+
+    @property
+    def stats(self) -> MockStats:
+        return self.mock.stats
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765) -> int:
+        self._server = await asyncio.start_server(self._handle, host, port, backlog=1024)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # Idle keep-alive connections would otherwise hold wait_closed()
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._writers.add(writer)
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    return
+                lines = head.decode("latin-1").split("\r\n")
+                method, path, _version = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        k, v = line.split(":", 1)
+                        headers[k.strip().lower()] = v.strip()
+                length = int(headers.get("content-length") or 0)
+                raw = await reader.readexactly(length) if length else b""
+                status, extra, payload = await self._route(method, path, raw)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                if isinstance(payload, list):
+                    await self._write_stream(writer, extra, payload, keep_alive)
+                else:
+                    self._write(writer, status, extra, payload, method == "HEAD", keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            return
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _route(
+        self, method: str, path: str, raw: bytes
+    ) -> Tuple[int, Dict[str, str], Any]:
+        # The payload is a JSON body, or a list of timed events to stream
+        if method != "POST":
+            return 200, {}, None
+        if not path.rstrip("/").endswith("/responses"):
+            return 404, {}, _error_body(f"no mock route for {path}", "invalid_request_error", None)
+        self.mock.stats.requests += 1
+        try:
+            body = json.loads(raw or b"{}")
+        except ValueError:
+            return 400, {}, _error_body("invalid JSON body", "invalid_request_error", None)
+        fault = self.mock.fault()
+        if fault is not None:
+            await asyncio.sleep(self.mock.config.latency.sample(self.mock.rng) / 4)
+            return fault
+        limited = self.mock.over_quota(body)
+        if limited is not None:
+            return 429, *limited
+        response = self.mock.respond(body)
+        headers = {"x-request-id": f"req_{uuid.uuid4().hex[:16]}"}
+        headers.update(self.mock.quota_headers(response))
+        if body.get("stream"):
+            self.mock.stats.streams += 1
+            return 200, headers, self.mock.stream_events(response)
+        await asyncio.sleep(self.mock.delay(response))
+        return 200, headers, response
+
+    @staticmethod
+    def _write(
+        writer: asyncio.StreamWriter,
+        status: int,
+        extra: Dict[str, str],
+        payload: Optional[Dict[str, Any]],
+        head_only: bool,
+        keep_alive: bool,
+    ) -> None:
+        data = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        lines = [f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}"]
+        lines.append("content-type: application/json")
+        lines.append(f"content-length: {len(data)}")
+        lines.append("connection: " + ("keep-alive" if keep_alive else "close"))
+        lines.extend(f"{k}: {v}" for k, v in extra.items())
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+        writer.write(head if head_only else head + data)
+
+    async def _write_stream(
+        self,
+        writer: asyncio.StreamWriter,
+        extra: Dict[str, str],
+        events: List[Tuple[float, Dict[str, Any]]],
+        keep_alive: bool,
+    ) -> None:
+        # Chunked SSE; a client that hangs up mid-stream ends the connection
+        lines = ["HTTP/1.1 200 OK", "content-type: text/event-stream",
+                 "transfer-encoding: chunked",
+                 "connection: " + ("keep-alive" if keep_alive else "close")]
+        lines.extend(f"{k}: {v}" for k, v in extra.items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        for wait, event in events:
+            if wait > 0:
+                await writer.drain()
+                await asyncio.sleep(wait)
+            data = f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode("utf-8")
+            writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+        writer.write(b"0\r\n\r\n")
+
+
+def run_mock_server(config: MockConfig, host: str = "127.0.0.1", port: int = 8765) -> MockStats:
+    """Serve until SIGINT/SIGTERM and return the request counters."""
+    server = MockServer(config)
+
+    async def main() -> None:
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):  # e.g. Windows
+                pass
+        bound = await server.start(host, port)
+        render.print_text(f"Mock Responses API on http://{host}:{bound}/v1")
+        try:
+            await stop.wait()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    return server.stats
@@ -1,80 +1,992 @@
 from __future__ import annotations
 
+import asyncio
+import json
 import os
+import threading
 import time
 import random
-from typing import Any, Dict, List, Optional
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, replace
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional, Union
 
-from openai import OpenAI
-from openai import APIStatusError, APIConnectionError, RateLimitError
+from lib.rate_limit import RateLimiter, approx_tokens, request_chars
+from lib.response_cache import (
+    DEFAULT_CACHE_PATH,
+    CacheMiss,
+    ResponseCache,
+    request_key,
+)
+from lib.retry_policy import (
+    CircuitBreaker,
+    CircuitOpenError,  # noqa: F401  (re-exported for callers)
+    LatencyTracker,
+    RetryPolicy,
+    is_transient,
+    retry_after,
+)
+
+if TYPE_CHECKING:
+    # The SDK and httpx take most of a cold start; they are imported when
+    # the first client is built, so --help, reports and mock servers skip them
+    import httpx
+    from openai import AsyncOpenAI, OpenAI
 
 
 DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "gpt-5")
 
 
+@dataclass(frozen=True)
+class PoolConfig:
+    max_connections: int = int(os.getenv("OPENAI_POOL_MAX_CONNECTIONS", "64"))
+    max_keepalive_connections: int = int(os.getenv("OPENAI_POOL_MAX_KEEPALIVE", "32"))
+    keepalive_expiry: float = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "90"))
+    timeout: float = float(os.getenv("OPENAI_TIMEOUT", "600"))
+    connect_timeout: float = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "10"))
+
+    def limits(self) -> httpx.Limits:
+        import httpx
+
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def timeouts(self) -> httpx.Timeout:
+        import httpx
+
+        return httpx.Timeout(self.timeout, connect=self.connect_timeout)
+
+
+class _ConnectionStats:
+    """Counts requests that opened a new connection vs. reused a pooled one."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+
+    def record(self, opened: bool) -> None:
+        with self._lock:
+            if opened:
+                self.opened += 1
+            else:
+                self.reused += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {"opened": self.opened, "reused": self.reused}
+
+
+class _ConnTrace:
+    # httpcore emits "connection.connect_tcp.complete" only when it dials a
+    # new socket, so its absence means the request rode a pooled connection.
+    def __init__(self) -> None:
+        self.opened = False
+
+    def __call__(self, event: str, info: Dict[str, Any]) -> None:
+        if event.startswith("connection.connect_") and event.endswith(".complete"):
+            self.opened = True
+
+
+class _AsyncConnTrace(_ConnTrace):
+    async def __call__(self, event: str, info: Dict[str, Any]) -> None:  # type: ignore[override]
+        _ConnTrace.__call__(self, event, info)
+
+
+_pool_config = PoolConfig()
+_conn_stats = _ConnectionStats()
+_client_lock = threading.Lock()
+_client: Optional[OpenAI] = None
+_http_client: Optional[httpx.Client] = None
+# AsyncOpenAI's pool is bound to the event loop it was first used on
+_async_client: Optional[AsyncOpenAI] = None
+_async_http_client: Optional[httpx.AsyncClient] = None
+_async_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def configure_pool(**overrides: Any) -> PoolConfig:
+    """Update pool limits/timeouts; shared clients are rebuilt on next use."""
+    global _pool_config, _client, _http_client
+    global _async_client, _async_http_client, _async_client_loop
+    with _client_lock:
+        _pool_config = replace(_pool_config, **overrides)
+        if _http_client is not None:
+            _http_client.close()
+        _client = None
+        _http_client = None
+        _async_client = None
+        _async_http_client = None
+        _async_client_loop = None
+        return _pool_config
+
+
+def connection_stats() -> Dict[str, int]:
+    return _conn_stats.snapshot()
+
+
+_cache: Optional[ResponseCache] = None
+_replay = False
+
+
+def configure_cache(
+    mode: str = "on", path: str = DEFAULT_CACHE_PATH, **limits: Any
+) -> Optional[ResponseCache]:
+    """Enable the response cache: "off", "on" (read-through) or "replay" (cache only)."""
+    global _cache, _replay
+    if mode not in ("off", "on", "replay"):
+        raise ValueError(f"unknown cache mode: {mode}")
+    if _cache is not None:
+        _cache.close()
+    _cache = None if mode == "off" else ResponseCache(path, **limits)
+    _replay = mode == "replay"
+    return _cache
+
+
+def cache_stats() -> Dict[str, int]:
+    if _cache is None:
+        return {"hits": 0, "misses": 0}
+    return {"hits": _cache.hits, "misses": _cache.misses}
+
+
+def _cache_lookup(
+    model: str, input: Any, tools: Optional[List[Dict[str, Any]]]
+) -> tuple[Optional[str], Optional[Any]]:
+    # Returns (key, cached response); key is None when caching is off.
+    cache = _cache
+    if cache is None:
+        return None, None
+    key = request_key(model, input, tools)
+    hit = cache.get(key)
+    if hit is None and _replay:
+        raise CacheMiss(f"no cached response for {model} request {key[:12]}")
+    return key, hit
+
+
+def _cache_store(key: Optional[str], model: str, resp: Any) -> None:
+    cache = _cache
+    if key is not None and cache is not None:
+        cache.put(key, model, resp)
+
+
+def _on_request(request: httpx.Request) -> None:
+    request.extensions["trace"] = _ConnTrace()
+
+
+def _on_response(response: httpx.Response) -> None:
+    import httpx
+
+    trace = response.request.extensions.get("trace")
+    if isinstance(trace, _ConnTrace):
+        _conn_stats.record(trace.opened)
+    limiter = _limiter
+    if limiter is not None and "x-ratelimit-limit-requests" in response.headers:
+        # Limits are per model; the model is only known from the request body
+        try:
+            model = json.loads(response.request.content).get("model")
+        except (httpx.RequestNotRead, ValueError, AttributeError):
+            model = None
+        if model:
+            limiter.observe_headers(model, response.headers)
+
+
+async def _on_request_async(request: httpx.Request) -> None:
+    request.extensions["trace"] = _AsyncConnTrace()
+
+
+async def _on_response_async(response: httpx.Response) -> None:
+    _on_response(response)
+
+
 def _get_client() -> OpenAI:
-    # The OpenAI SDK reads OPENAI_API_KEY from env automatically.
-    return OpenAI()
+    # One pooled client per process; the SDK reads OPENAI_API_KEY from env.
+    global _client, _http_client
+    client = _client
+    if client is not None:
+        return client
+    with _client_lock:
+        if _client is None:
+            import httpx
+            from openai import OpenAI
+
+            cfg = _pool_config
+            _http_client = httpx.Client(
+                limits=cfg.limits(),
+                timeout=cfg.timeouts(),
+                event_hooks={"request": [_on_request], "response": [_on_response]},
+            )
+            # Retries are ours (see RetryPolicy); disable the SDK's own loop
+            _client = OpenAI(
+                timeout=cfg.timeouts(), http_client=_http_client, max_retries=0
+            )
+        return _client
+
+
+def _get_async_client() -> AsyncOpenAI:
+    global _async_client, _async_http_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        if _async_client is None or _async_client_loop is not loop:
+            import httpx
+            from openai import AsyncOpenAI
+
+            cfg = _pool_config
+            _async_http_client = httpx.AsyncClient(
+                limits=cfg.limits(),
+                timeout=cfg.timeouts(),
+                event_hooks={
+                    "request": [_on_request_async],
+                    "response": [_on_response_async],
+                },
+            )
+            _async_client = AsyncOpenAI(
+                timeout=cfg.timeouts(), http_client=_async_http_client, max_retries=0
+            )
+            _async_client_loop = loop
+        return _async_client
+
+
+def prewarm(connections: int) -> int:
+    """Open up to `connections` pooled connections before the first real call.
+
+    Each probe holds its response open until all probes have connected, so
+    the pool cannot satisfy them from a single socket. Returns the number of
+    probes that completed.
+    """
+    if connections <= 0:
+        return 0
+    import httpx
+
+    url = str(_get_client().base_url)
+    http = _http_client
+    assert http is not None
+    barrier = threading.Barrier(connections)
+
+    def probe() -> bool:
+        try:
+            with http.stream("HEAD", url) as resp:
+                resp.read()  # completes the exchange so the socket is reusable
+                try:
+                    barrier.wait(timeout=_pool_config.connect_timeout)
+                except threading.BrokenBarrierError:
+                    pass
+            return True
+        except httpx.HTTPError:
+            barrier.abort()
+            return False
+
+    with ThreadPoolExecutor(max_workers=connections) as ex:
+        return sum(ex.map(lambda _: probe(), range(connections)))
+
+
+async def prewarm_async(connections: int) -> int:
+    """Async twin of prewarm for the client bound to the running loop."""
+    if connections <= 0:
+        return 0
+    import httpx
+
+    url = str(_get_async_client().base_url)
+    http = _async_http_client
+    assert http is not None
+    ready = asyncio.Event()
+    pending = connections
+
+    async def probe() -> bool:
+        nonlocal pending
+        try:
+            async with http.stream("HEAD", url) as resp:
+                await resp.aread()
+                pending -= 1
+                if pending == 0:
+                    ready.set()
+                try:
+                    await asyncio.wait_for(ready.wait(), _pool_config.connect_timeout)
+                except asyncio.TimeoutError:
+                    pass
+            return True
+        except httpx.HTTPError:
+            ready.set()
+            return False
+
+    return sum(await asyncio.gather(*(probe() for _ in range(connections))))
+
+
+_policy = RetryPolicy()
+_breaker = CircuitBreaker(_policy.failure_threshold, _policy.reset_timeout_s)
+_latency = LatencyTracker()
+_hedge_pool: Optional[ThreadPoolExecutor] = None
+
+
+def configure_policy(**overrides: Any) -> RetryPolicy:
+    """Update retry/breaker/hedging settings (resets breaker state)."""
+    global _policy, _breaker
+    _policy = replace(_policy, **overrides)
+    _breaker = CircuitBreaker(_policy.failure_threshold, _policy.reset_timeout_s)
+    return _policy
+
+
+def circuit_state(model: str) -> str:
+    return _breaker.state(model)
 
 
 def _retryable(exc: Exception) -> bool:
-    return isinstance(exc, (APIConnectionError, RateLimitError, APIStatusError))
+    return is_transient(exc)
 
 
-def _backoff_sleep(attempt: int, base: float = 0.5, cap: float = 8.0) -> None:
+def _backoff_delay(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
     # Exponential backoff with jitter
     sleep = min(cap, base * (2 ** attempt))
-    time.sleep(sleep * (0.5 + random.random() / 2))
+    return sleep * (0.5 + random.random() / 2)
+
+
+def _retry_delay(exc: Exception, attempt: int) -> float:
+    # Prefer the server's Retry-After / rate-limit reset hint over our guess
+    hint = retry_after(exc)
+    if hint is None:
+        return _backoff_delay(attempt)
+    return min(hint, _policy.max_retry_after_s) * (1.0 + random.random() / 10)
+
+
+def _backoff_sleep(exc: Exception, attempt: int) -> float:
+    delay = _retry_delay(exc, attempt)
+    time.sleep(delay)
+    return delay
+
+
+async def _async_backoff_sleep(exc: Exception, attempt: int) -> float:
+    delay = _retry_delay(exc, attempt)
+    await asyncio.sleep(delay)
+    return delay
+
+
+_limiter: Optional[RateLimiter] = (
+    RateLimiter() if os.getenv("OPENAI_RATE_LIMIT", "") not in ("", "0", "false") else None
+)
+
+
+def configure_rate_limiting(enabled: bool = True) -> None:
+    """Throttle calls per model to the RPM/TPM limits the API reports (resets what was learned)."""
+    global _limiter
+    _limiter = RateLimiter() if enabled else None
+
+
+def rate_limiter() -> Optional[RateLimiter]:
+    """The active per-model rate limiter, or None when throttling is off."""
+    return _limiter
+
+
+def rate_limit_stats() -> Dict[str, Dict[str, Any]]:
+    return _limiter.snapshot() if _limiter is not None else {}
+
+
+def _throttle(model: str, chars: int, stats: "RequestStats") -> None:
+    if _limiter is not None:
+        stats.throttle_s += _limiter.acquire(model, _limiter.estimate(model, chars))
+
+
+async def _throttle_async(model: str, chars: int, stats: "RequestStats") -> None:
+    if _limiter is not None:
+        stats.throttle_s += await _limiter.acquire_async(model, _limiter.estimate(model, chars))
+
+
+def _observe_usage(model: str, chars: int, resp: Any) -> None:
+    if _limiter is None:
+        return
+    usage = extract_usage_details(resp)
+    if usage.input_tokens is not None:
+        _limiter.observe_usage(model, chars, usage.input_tokens, usage.output_tokens or 0)
+
+
+@dataclass
+class RequestStats:
+    """Where a responses_create call spent its time."""
+
+    attempts: int = 0
+    retries: int = 0
+    api_s: float = 0.0  # time inside client.responses.create, all attempts
+    backoff_s: float = 0.0
+    cached: bool = False
+    hedges: int = 0  # attempts that fired a second, hedged request
+    # Streamed calls: first output delta, from the start of the last attempt
+    ttft_s: Optional[float] = None
+    aborted: bool = False  # the stream was closed early by on_delta
+    deltas: int = 0  # streamed output deltas received, about one token each
+    # Streamed calls: usage from the final event, once it has arrived
+    usage: Optional[Any] = None
+    coalesced: bool = False  # shared another caller's identical in-flight request
+    throttle_s: float = 0.0  # waiting for the model's RPM/TPM budget
+
+
+def _hedge_after(model: str) -> Optional[float]:
+    if not _policy.hedge:
+        return None
+    return _latency.quantile(model, _policy.hedge_quantile, _policy.hedge_min_samples)
+
+
+def _hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_pool
+    with _client_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(
+                max_workers=_pool_config.max_connections, thread_name_prefix="hedge"
+            )
+        return _hedge_pool
+
+
+def _call_hedged(call: Callable[[], Any], model: str, stats: RequestStats) -> Any:
+    """Run `call`; if it outlives the model's p95, race a second copy of it.
+
+    Sync HTTP calls cannot be cancelled, so the loser runs to completion in
+    the background and its result is dropped.
+    """
+    threshold = _hedge_after(model)
+    if threshold is None:
+        return call()
+    ex = _hedge_executor()
+    first = ex.submit(call)
+    done, _ = wait([first], timeout=threshold)
+    if done:
+        return first.result()
+    stats.hedges += 1
+    pending = {first, ex.submit(call)}
+    err: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            if fut.exception() is None:
+                return fut.result()
+            err = fut.exception()
+    assert err is not None
+    raise err
+
+
+async def _call_hedged_async(
+    call: Callable[[], Awaitable[Any]], model: str, stats: RequestStats
+) -> Any:
+    threshold = _hedge_after(model)
+    if threshold is None:
+        return await call()
+    first = asyncio.ensure_future(call())
+    done, _ = await asyncio.wait({first}, timeout=threshold)
+    if done:
+        return first.result()
+    stats.hedges += 1
+    pending = {first, asyncio.ensure_future(call())}
+    err: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                err = task.exception()
+    finally:
+        for task in pending:
+            task.cancel()
+    assert err is not None
+    raise err
+
+
+class _Abandoned(Exception):
+    """The leader of a flight was cancelled; followers start over."""
+
+
+class _SingleFlight:
+    """Lets concurrent identical calls share one in-flight request.
+
+    The first caller for a key (the leader) makes the request; callers
+    arriving while it is in flight wait for its result (or exception).
+    Flights are concurrent.futures.Futures, so sync and async callers can
+    join the same flight.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flights: Dict[str, Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def join(self, key: str) -> tuple[Future, bool]:
+        """(flight, is_leader) for `key`."""
+        with self._lock:
+            fut = self._flights.get(key)
+            if fut is not None:
+                self.coalesced += 1
+                return fut, False
+            fut = self._flights[key] = Future()
+            self.leaders += 1
+            return fut, True
+
+    def land(
+        self, key: str, fut: Future, resp: Any = None, exc: Optional[BaseException] = None
+    ) -> None:
+        with self._lock:
+            if self._flights.get(key) is fut:
+                del self._flights[key]
+        if exc is not None:
+            fut.set_exception(exc)
+        else:
+            fut.set_result(resp)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {"leaders": self.leaders, "coalesced": self.coalesced}
+
+
+_flights = _SingleFlight()
+_coalesce = os.getenv("OPENAI_COALESCE", "") not in ("", "0", "false")
+
+
+def configure_coalescing(enabled: bool = True) -> None:
+    """Share one request between concurrent identical (model, input, tools) calls.
+
+    Off by default: suites that repeat a case on purpose to sample the
+    model want independent answers. Streamed calls are never coalesced.
+    """
+    global _coalesce
+    _coalesce = enabled
+
+
+def coalesce_stats() -> Dict[str, int]:
+    return _flights.snapshot()
+
+
+def _flight_key(model: str, input: Any, tools: Optional[List[Dict[str, Any]]]) -> Optional[str]:
+    return request_key(model, input, tools) if _coalesce else None
 
 
 def responses_create(
     *,
-    input: str,
+    input: Union[str, List[Dict[str, Any]]],
     model: Optional[str] = None,
     tools: Optional[List[Dict[str, Any]]] = None,
     max_retries: int = 3,
+    stats: Optional[RequestStats] = None,
+    prompt_cache_key: Optional[str] = None,
+) -> Any:
+    stats = stats if stats is not None else RequestStats()
+    model = model or DEFAULT_MODEL
+    key, hit = _cache_lookup(model, input, tools)
+    if hit is not None:
+        stats.cached = True
+        return hit
+    flight = _flight_key(model, input, tools)
+    if flight is None:
+        return _create(model, input, tools, max_retries, stats, prompt_cache_key, key)
+    while True:
+        fut, leader = _flights.join(flight)
+        if leader:
+            break
+        t0 = time.perf_counter()
+        try:
+            return fut.result()
+        except _Abandoned:
+            continue
+        finally:
+            stats.coalesced = True
+            stats.api_s += time.perf_counter() - t0
+    try:
+        resp = _create(model, input, tools, max_retries, stats, prompt_cache_key, key)
+    except BaseException as e:
+        _flights.land(flight, fut, exc=e if isinstance(e, Exception) else _Abandoned())
+        raise
+    _flights.land(flight, fut, resp)
+    return resp
+
+
+def _create(
+    model: str,
+    input: Union[str, List[Dict[str, Any]]],
+    tools: Optional[List[Dict[str, Any]]],
+    max_retries: int,
+    stats: RequestStats,
+    prompt_cache_key: Optional[str],
+    cache_key: Optional[str],
 ) -> Any:
     client = _get_client()
+    # Routes requests sharing a prompt prefix to the same provider cache
+    extra = {"prompt_cache_key": prompt_cache_key} if prompt_cache_key else {}
+    chars = request_chars(input, tools) if _limiter is not None else 0
     last_err: Optional[Exception] = None
     for attempt in range(max_retries + 1):
+        _breaker.before_call(model)
+        _throttle(model, chars, stats)
+        stats.attempts += 1
+        t0 = time.perf_counter()
         try:
-            return client.responses.create(
-                model=model or DEFAULT_MODEL,
-                input=input,
-                tools=tools,
+            resp = _call_hedged(
+                lambda: client.responses.create(model=model, input=input, tools=tools, **extra),
+                model,
+                stats,
             )
+            dt = time.perf_counter() - t0
+            stats.api_s += dt
+            _latency.observe(model, dt)
+            _breaker.record_success(model)
+            _observe_usage(model, chars, resp)
+            _cache_store(cache_key, model, resp)
+            return resp
         except Exception as e:  # noqa: BLE001
+            stats.api_s += time.perf_counter() - t0
             last_err = e
-            if not _retryable(e) or attempt == max_retries:
+            if not _retryable(e):
                 raise
-            _backoff_sleep(attempt)
+            _breaker.record_failure(model)
+            if attempt == max_retries:
+                raise
+            stats.retries += 1
+            stats.backoff_s += _backoff_sleep(e, attempt)
     # Should not reach here
     if last_err:
         raise last_err
 
 
+async def responses_create_async(
+    *,
+    input: Union[str, List[Dict[str, Any]]],
+    model: Optional[str] = None,
+    tools: Optional[List[Dict[str, Any]]] = None,
+    max_retries: int = 3,
+    stats: Optional[RequestStats] = None,
+    prompt_cache_key: Optional[str] = None,
+) -> Any:
+    """Async twin of responses_create, backed by AsyncOpenAI."""
+    stats = stats if stats is not None else RequestStats()
+    model = model or DEFAULT_MODEL
+    key, hit = _cache_lookup(model, input, tools)
+    if hit is not None:
+        stats.cached = True
+        return hit
+    flight = _flight_key(model, input, tools)
+    if flight is None:
+        return await _create_async(model, input, tools, max_retries, stats, prompt_cache_key, key)
+    while True:
+        fut, leader = _flights.join(flight)
+        if leader:
+            break
+        t0 = time.perf_counter()
+        try:
+            # Shielded: a cancelled follower must not cancel the shared flight
+            return await asyncio.shield(asyncio.wrap_future(fut))
+        except _Abandoned:
+            continue
+        finally:
+            stats.coalesced = True
+            stats.api_s += time.perf_counter() - t0
+    try:
+        resp = await _create_async(model, input, tools, max_retries, stats, prompt_cache_key, key)
+    except BaseException as e:
+        # Cancellation is the leader's own business; followers retry instead
+        _flights.land(flight, fut, exc=e if isinstance(e, Exception) else _Abandoned())
+        raise
+    _flights.land(flight, fut, resp)
+    return resp
+
+
+async def _create_async(
+    model: str,
+    input: Union[str, List[Dict[str, Any]]],
+    tools: Optional[List[Dict[str, Any]]],
+    max_retries: int,
+    stats: RequestStats,
+    prompt_cache_key: Optional[str],
+    cache_key: Optional[str],
+) -> Any:
+    client = _get_async_client()
+    extra = {"prompt_cache_key": prompt_cache_key} if prompt_cache_key else {}
+    chars = request_chars(input, tools) if _limiter is not None else 0
+    last_err: Optional[Exception] = None
+    for attempt in range(max_retries + 1):
+        _breaker.before_call(model)
+        await _throttle_async(model, chars, stats)
+        stats.attempts += 1
+        t0 = time.perf_counter()
+        try:
+            resp = await _call_hedged_async(
+                lambda: client.responses.create(model=model, input=input, tools=tools, **extra),
+                model,
+                stats,
+            )
+            dt = time.perf_counter() - t0
+            stats.api_s += dt
+            _latency.observe(model, dt)
+            _breaker.record_success(model)
+            _observe_usage(model, chars, resp)
+            _cache_store(cache_key, model, resp)
+            return resp
+        except Exception as e:  # noqa: BLE001
+            stats.api_s += time.perf_counter() - t0
+            last_err = e
+            if not _retryable(e):
+                raise
+            _breaker.record_failure(model)
+            if attempt == max_retries:
+                raise
+            stats.retries += 1
+            stats.backoff_s += await _async_backoff_sleep(e, attempt)
+    # Should not reach here
+    if last_err:
+        raise last_err
+
+
+DeltaCallback = Callable[[str], bool]
+
+
+class _StreamReader:
+    """Folds stream events into the final response, calling on_delta per delta."""
+
+    def __init__(self, on_delta: Optional[DeltaCallback], stats: RequestStats, t0: float) -> None:
+        self.on_delta = on_delta
+        self.stats = stats
+        self.t0 = t0
+        self.started = False
+        self.response: Optional[Any] = None
+
+    def handle(self, event: Any) -> bool:
+        """Returns False when the stream should be abandoned."""
+        typ = getattr(event, "type", None)
+        if typ in ("response.custom_tool_call_input.delta", "response.output_text.delta"):
+            self.stats.deltas += 1
+            if not self.started:
+                self.started = True
+                self.stats.ttft_s = time.perf_counter() - self.t0
+            if (
+                typ == "response.custom_tool_call_input.delta"
+                and self.on_delta is not None
+                and self.on_delta(event.delta) is False
+            ):
+                self.stats.aborted = True
+                return False
+        elif typ in ("response.completed", "response.incomplete", "response.failed"):
+            self.response = event.response
+            self.stats.usage = getattr(event.response, "usage", None)
+        return True
+
+    def result(self) -> Optional[Any]:
+        if self.response is None and not self.stats.aborted:
+            raise RuntimeError("stream ended without a final response")
+        return self.response
+
+
+def responses_stream(
+    *,
+    input: Union[str, List[Dict[str, Any]]],
+    model: Optional[str] = None,
+    tools: Optional[List[Dict[str, Any]]] = None,
+    on_delta: Optional[DeltaCallback] = None,
+    max_retries: int = 3,
+    stats: Optional[RequestStats] = None,
+    prompt_cache_key: Optional[str] = None,
+) -> Optional[Any]:
+    """Streaming responses_create; custom tool input deltas go to `on_delta`.
+
+    If `on_delta` returns False the stream is closed and None is returned
+    (stats.aborted is set). Errors are retried only until the first delta
+    arrives, and streams are never hedged. Cache hits return the stored
+    response without calling `on_delta`.
+    """
+    stats = stats if stats is not None else RequestStats()
+    model = model or DEFAULT_MODEL
+    key, hit = _cache_lookup(model, input, tools)
+    if hit is not None:
+        stats.cached = True
+        return hit
+    client = _get_client()
+    extra = {"prompt_cache_key": prompt_cache_key} if prompt_cache_key else {}
+    chars = request_chars(input, tools) if _limiter is not None else 0
+    for attempt in range(max_retries + 1):
+        _breaker.before_call(model)
+        _throttle(model, chars, stats)
+        stats.attempts += 1
+        t0 = time.perf_counter()
+        reader = _StreamReader(on_delta, stats, t0)
+        try:
+            stream = client.responses.create(
+                model=model, input=input, tools=tools, stream=True, **extra
+            )
+            try:
+                for event in stream:
+                    if not reader.handle(event):
+                        break
+            finally:
+                stream.close()
+            dt = time.perf_counter() - t0
+            stats.api_s += dt
+            _breaker.record_success(model)
+            resp = reader.result()
+            if resp is not None:
+                _latency.observe(model, dt)
+                _observe_usage(model, chars, resp)
+                _cache_store(key, model, resp)
+            return resp
+        except Exception as e:  # noqa: BLE001
+            stats.api_s += time.perf_counter() - t0
+            if reader.started or not _retryable(e):
+                raise
+            _breaker.record_failure(model)
+            if attempt == max_retries:
+                raise
+            stats.retries += 1
+            stats.backoff_s += _backoff_sleep(e, attempt)
+    return None
+
+
+async def responses_stream_async(
+    *,
+    input: Union[str, List[Dict[str, Any]]],
+    model: Optional[str] = None,
+    tools: Optional[List[Dict[str, Any]]] = None,
+    on_delta: Optional[DeltaCallback] = None,
+    max_retries: int = 3,
+    stats: Optional[RequestStats] = None,
+    prompt_cache_key: Optional[str] = None,
+) -> Optional[Any]:
+    """Async twin of responses_stream."""
+    stats = stats if stats is not None else RequestStats()
+    model = model or DEFAULT_MODEL
+    key, hit = _cache_lookup(model, input, tools)
+    if hit is not None:
+        stats.cached = True
+        return hit
+    client = _get_async_client()
+    extra = {"prompt_cache_key": prompt_cache_key} if prompt_cache_key else {}
+    chars = request_chars(input, tools) if _limiter is not None else 0
+    for attempt in range(max_retries + 1):
+        _breaker.before_call(model)
+        await _throttle_async(model, chars, stats)
+        stats.attempts += 1
+        t0 = time.perf_counter()
+        reader = _StreamReader(on_delta, stats, t0)
+        try:
+            stream = await client.responses.create(
+                model=model, input=input, tools=tools, stream=True, **extra
+            )
+            try:
+                async for event in stream:
+                    if not reader.handle(event):
+                        break
+            finally:
+                await stream.close()
+            dt = time.perf_counter() - t0
+            stats.api_s += dt
+            _breaker.record_success(model)
+            resp = reader.result()
+            if resp is not None:
+                _latency.observe(model, dt)
+                _observe_usage(model, chars, resp)
+                _cache_store(key, model, resp)
+            return resp
+        except Exception as e:  # noqa: BLE001
+            stats.api_s += time.perf_counter() - t0
+            if reader.started or not _retryable(e):
+                raise
+            _breaker.record_failure(model)
+            if attempt == max_retries:
+                raise
+            stats.retries += 1
+            stats.backoff_s += await _async_backoff_sleep(e, attempt)
+    return None
+
+
 def output_text(resp: Any) -> str:
     return getattr(resp, "output_text", None) or getattr(resp, "output", None) or str(resp)
 
 
-def extract_usage(resp: Any) -> tuple[Optional[int], Optional[int]]:
-    """Return (input_tokens, output_tokens) if available, else (None, None)."""
+def custom_tool_input(resp: Any, name: str) -> str:
+    """Return the stripped input of the named custom tool call, falling back to output_text."""
+    text: str = ""
+    out = getattr(resp, "output", None)
+    if isinstance(out, list):
+        for item in out:
+            typ = getattr(item, "type", None) or getattr(item, "object", None)
+            if typ == "custom_tool_call" and getattr(item, "name", None) == name:
+                candidate = getattr(item, "input", None)
+                if isinstance(candidate, str):
+                    text = candidate
+                    break
+    if not text:
+        txt = output_text(resp)
+        if isinstance(txt, str):
+            text = txt
+    return text.strip()
+
+
+@dataclass
+class TokenUsage:
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    # Part of input_tokens served from the provider's prompt cache
+    cached_tokens: Optional[int] = None
+    # Part of output_tokens spent on hidden reasoning
+    reasoning_tokens: Optional[int] = None
+
+
+def _usage_int(obj: Any, key: str) -> Optional[int]:
+    if obj is None:
+        return None
+    if hasattr(obj, key):
+        val = getattr(obj, key)
+    elif isinstance(obj, dict):
+        val = obj.get(key)
+    else:
+        val = None
+    try:
+        return int(val) if val is not None else None
+    except Exception:
+        return None
+
+
+def _usage_part(obj: Any, key: str) -> Any:
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(key)
+    return getattr(obj, key, None)
+
+
+def extract_usage_details(resp: Any) -> TokenUsage:
+    """Token usage including cached input and reasoning output tokens."""
     u = getattr(resp, "usage", None)
     if u is None and isinstance(resp, dict):
         u = resp.get("usage")
+    return _usage_details(u)
 
-    def _get(obj: Any, key: str) -> Optional[int]:
-        if obj is None:
-            return None
-        if hasattr(obj, key):
-            val = getattr(obj, key)
-        elif isinstance(obj, dict):
-            val = obj.get(key)
-        else:
-            val = None
-        try:
-            return int(val) if val is not None else None
-        except Exception:
-            return None
 
-    return _get(u, "input_tokens"), _get(u, "output_tokens")
+def aborted_usage(
+    stats: RequestStats,
+    input: Union[str, List[Dict[str, Any]]],
+    tools: Optional[List[Dict[str, Any]]] = None,
+) -> tuple[TokenUsage, bool]:
+    """Usage of a stream closed by on_delta, and whether it is estimated.
+
+    The final event's usage is exact. Without it, output tokens are the
+    deltas received and input tokens are estimated from the request size;
+    reasoning before the first delta is not seen, so it is a lower bound.
+    """
+    if stats.usage is not None:
+        return _usage_details(stats.usage), False
+    estimate = TokenUsage(
+        input_tokens=approx_tokens(request_chars(input, tools)),
+        output_tokens=stats.deltas,
+    )
+    return estimate, True
+
+
+def _usage_details(u: Any) -> TokenUsage:
+    return TokenUsage(
+        input_tokens=_usage_int(u, "input_tokens"),
+        output_tokens=_usage_int(u, "output_tokens"),
+        cached_tokens=_usage_int(_usage_part(u, "input_tokens_details"), "cached_tokens"),
+        reasoning_tokens=_usage_int(
+            _usage_part(u, "output_tokens_details"), "reasoning_tokens"
+        ),
+    )
+
+
+def extract_usage(resp: Any) -> tuple[Optional[int], Optional[int]]:
+    """Return (input_tokens, output_tokens) if available, else (None, None)."""
+    usage = extract_usage_details(resp)
+    return usage.input_tokens, usage.output_tokens
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+"""
+Per-model token prices, used to put a dollar figure on suite runs.
+
+Prices are USD per 1M tokens. Dated snapshots ("gpt-5-mini-2025-08-07")
+resolve to the longest matching model prefix. `load_prices` overrides
+or extends the table from a JSON file, and `Spend` keeps running totals
+against an optional token or dollar `Budget`.
+"""
+
+
+@dataclass(frozen=True)
+class Price:
+    input: float
+    cached_input: float
+    output: float
+
+
+PRICES: Dict[str, Price] = {
+    "gpt-5": Price(input=1.25, cached_input=0.125, output=10.00),
+    "gpt-5-mini": Price(input=0.25, cached_input=0.025, output=2.00),
+    "gpt-5-nano": Price(input=0.05, cached_input=0.005, output=0.40),
+}
+
+
+def load_prices(path: str | Path) -> None:
+    """Merge {"model": {"input": .., "cached_input": .., "output": ..}} from a JSON file into PRICES.
+
+    `cached_input` defaults to the input price.
+    """
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: expected an object mapping model names to prices")
+    for model, p in data.items():
+        try:
+            PRICES[model] = Price(
+                input=float(p["input"]),
+                cached_input=float(p.get("cached_input", p["input"])),
+                output=float(p["output"]),
+            )
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise ValueError(
+                f"{path}: bad price for {model!r}; expected input, output and optional cached_input"
+            ) from None
+
+
+def price_for(model: Optional[str]) -> Optional[Price]:
+    if not model:
+        return None
+    if model in PRICES:
+        return PRICES[model]
+    matches = [name for name in PRICES if model.startswith(name + "-")]
+    return PRICES[max(matches, key=len)] if matches else None
+
+
+def cost_usd(
+    model: Optional[str],
+    input_tokens: Optional[int],
+    output_tokens: Optional[int],
+    cached_tokens: Optional[int] = None,
+) -> Optional[float]:
+    """Cost of one call; reasoning tokens are billed as output and already included."""
+    price = price_for(model)
+    if price is None or input_tokens is None or output_tokens is None:
+        return None
+    cached = min(cached_tokens or 0, input_tokens)
+    return (
+        (input_tokens - cached) * price.input
+        + cached * price.cached_input
+        + output_tokens * price.output
+    ) / 1_000_000
+
+
+def cache_savings_usd(model: Optional[str], cached_tokens: Optional[int]) -> Optional[float]:
+    """What the cached input tokens would have cost extra at the uncached rate."""
+    price = price_for(model)
+    if price is None or cached_tokens is None:
+        return None
+    return cached_tokens * (price.input - price.cached_input) / 1_000_000
+
+
+_BUDGET_USD = re.compile(r"^\$\s*([0-9]*\.?[0-9]+)$|^([0-9]*\.?[0-9]+)\s*(?:\$|usd)$", re.I)
+_BUDGET_TOKENS = re.compile(r"^([0-9]*\.?[0-9]+)\s*([km]?)\s*(?:tokens?|tok)?$", re.I)
+
+
+@dataclass(frozen=True)
+class Budget:
+    """A cap on total tokens (input + output) and/or dollars."""
+
+    tokens: Optional[int] = None
+    usd: Optional[float] = None
+
+    @classmethod
+    def parse(cls, spec: str) -> "Budget":
+        """Parse "$5", "5usd" (dollars) or "200000", "500k", "2M tokens" (tokens)."""
+        text = spec.strip()
+        m = _BUDGET_USD.match(text)
+        if m:
+            return cls(usd=float(m.group(1) or m.group(2)))
+        m = _BUDGET_TOKENS.match(text)
+        if m:
+            scale = {"": 1, "k": 1_000, "m": 1_000_000}[m.group(2).lower()]
+            return cls(tokens=int(float(m.group(1)) * scale))
+        raise ValueError(f"bad budget {spec!r}; expected e.g. $5, 5usd, 500k or 2M tokens")
+
+    def __str__(self) -> str:
+        parts = []
+        if self.tokens is not None:
+            parts.append(f"{self.tokens} tokens")
+        if self.usd is not None:
+            parts.append(f"${self.usd:.2f}")
+        return " / ".join(parts) or "unlimited"
+
+
+@dataclass
+class ModelSpend:
+    calls: int = 0
+    input_tokens: int = 0
+    cached_tokens: int = 0
+    output_tokens: int = 0
+    reasoning_tokens: int = 0
+    usd: float = 0.0
+    # Calls whose model has no price; they count toward tokens only
+    unpriced: int = 0
+    # Answers served from the response cache; not calls, nothing billed
+    cache_hits: int = 0
+
+
+@dataclass
+class Spend:
+    """Running usage and cost per model, checked against an optional Budget."""
+
+    budget: Optional[Budget] = None
+    models: Dict[str, ModelSpend] = field(default_factory=dict)
+
+    def add(
+        self,
+        model: str,
+        input_tokens: Optional[int],
+        output_tokens: Optional[int],
+        cached_tokens: Optional[int] = None,
+        reasoning_tokens: Optional[int] = None,
+        priced_as: Optional[str] = None,
+        from_cache: bool = False,
+    ) -> None:
+        """Count one call; `priced_as` is the dated snapshot that answered, if known.
+
+        A `from_cache` answer made no API call, so it costs no tokens or
+        dollars and is only counted in cache_hits.
+        """
+        m = self.models.setdefault(model, ModelSpend())
+        if from_cache:
+            m.cache_hits += 1
+            return
+        m.calls += 1
+        m.input_tokens += input_tokens or 0
+        m.cached_tokens += cached_tokens or 0
+        m.output_tokens += output_tokens or 0
+        m.reasoning_tokens += reasoning_tokens or 0
+        if input_tokens is None and output_tokens is None:
+            return
+        cost = cost_usd(priced_as or model, input_tokens or 0, output_tokens or 0, cached_tokens)
+        if cost is None:
+            m.unpriced += 1
+        else:
+            m.usd += cost
+
+    def add_result(self, model: str, r: Any) -> None:
+        """Count a suite result's usage_* fields."""
+        self.add(
+            model,
+            getattr(r, "usage_input_tokens", None),
+            getattr(r, "usage_output_tokens", None),
+            getattr(r, "usage_cached_tokens", None),
+            getattr(r, "usage_reasoning_tokens", None),
+            priced_as=getattr(r, "model", None),
+            from_cache=getattr(r, "from_cache", False),
+        )
+
+    @property
+    def tokens(self) -> int:
+        return sum(m.input_tokens + m.output_tokens for m in self.models.values())
+
+    @property
+    def usd(self) -> float:
+        return sum(m.usd for m in self.models.values())
+
+    def exhausted(self) -> bool:
+        b = self.budget
+        if b is None:
+            return False
+        if b.tokens is not None and self.tokens >= b.tokens:
+            return True
+        return b.usd is not None and self.usd >= b.usd
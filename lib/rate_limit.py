@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Mapping, Optional
+
+
+"""
+Per-model request and token budgets learned from rate-limit headers.
+
+Every response (including 429s) carries x-ratelimit-limit-* and
+x-ratelimit-remaining-* headers for requests and tokens per minute.
+Each model gets two token buckets sized from the limits and refilled
+linearly, which is how the provider replenishes them; the remaining
+counts pull a bucket down when the server has seen more use than we
+booked (other processes sharing the key). Before a call, `acquire`
+books one request and the call's estimated tokens, waiting until both
+buckets can cover them. Models whose limits have not been seen yet are
+not throttled.
+"""
+
+# Completion allowance added to the input estimate until real usage has
+# been observed for a model
+DEFAULT_OUTPUT_TOKENS = 256
+
+
+def approx_tokens(chars: int) -> int:
+    # ~4 characters per token; corrected per model from observed usage
+    return max(1, (chars + 3) // 4)
+
+
+def request_chars(input: Any, tools: Any) -> int:
+    """Size of a request's prompt material: input messages plus tool definitions (grammars)."""
+    text = input if isinstance(input, str) else json.dumps(input, ensure_ascii=False)
+    return len(text) + (len(json.dumps(tools, ensure_ascii=False)) if tools else 0)
+
+
+class _Bucket:
+    def __init__(self, limit: float) -> None:
+        self.limit = limit
+        self.level = limit
+        self.stamp = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        # Per-minute limits refill linearly
+        self.level = min(self.limit, self.level + (now - self.stamp) * self.limit / 60.0)
+        self.stamp = now
+
+    def wait_for(self, amount: float, now: float) -> float:
+        self._refill(now)
+        # A request larger than the whole bucket goes once the bucket is full
+        need = min(amount, self.limit)
+        if self.level >= need:
+            return 0.0
+        return (need - self.level) * 60.0 / self.limit
+
+    def take(self, amount: float) -> None:
+        self.level -= amount
+
+    def sync(self, limit: float, remaining: float, now: float) -> None:
+        self._refill(now)
+        if limit != self.limit:
+            self.level += limit - self.limit
+            self.limit = limit
+        self.level = min(self.level, remaining)
+
+
+@dataclass
+class ModelBudget:
+    requests: Optional[_Bucket] = None
+    tokens: Optional[_Bucket] = None
+    # Observed tokens / estimated tokens, smoothed; corrects the chars/4 guess
+    input_ratio: float = 1.0
+    output_tokens: float = DEFAULT_OUTPUT_TOKENS
+    # Most recent estimate, taken as the size of the next request
+    last_estimate: int = 0
+    waited_s: float = 0.0
+    throttled: int = 0
+    booked: int = 0
+
+
+class RateLimiter:
+    """Token-bucket RPM/TPM budgets per model; thread-safe, usable from sync and async code."""
+
+    def __init__(self, smoothing: float = 0.2) -> None:
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self._models: Dict[str, ModelBudget] = {}
+
+    def _budget(self, model: str) -> ModelBudget:
+        b = self._models.get(model)
+        if b is None:
+            b = self._models[model] = ModelBudget()
+        return b
+
+    def estimate(self, model: str, chars: int) -> int:
+        """Tokens a request of `chars` prompt characters is expected to use in total."""
+        with self._lock:
+            b = self._budget(model)
+            b.last_estimate = math.ceil(approx_tokens(chars) * b.input_ratio + b.output_tokens)
+            return b.last_estimate
+
+    def delay(self, model: str, tokens: Optional[int] = None) -> float:
+        """Seconds until `model` can take a request of `tokens` (default: a typical one)."""
+        with self._lock:
+            return self._delay(self._budget(model), tokens, time.monotonic())
+
+    def _delay(self, b: ModelBudget, tokens: Optional[int], now: float) -> float:
+        wait = 0.0
+        if b.requests is not None:
+            wait = b.requests.wait_for(1, now)
+        if b.tokens is not None:
+            if tokens is None:
+                tokens = b.last_estimate or math.ceil(b.output_tokens)
+            wait = max(wait, b.tokens.wait_for(tokens, now))
+        return wait
+
+    def _try_book(self, model: str, tokens: int) -> float:
+        with self._lock:
+            b = self._budget(model)
+            wait = self._delay(b, tokens, time.monotonic())
+            if wait <= 0:
+                if b.requests is not None:
+                    b.requests.take(1)
+                if b.tokens is not None:
+                    b.tokens.take(tokens)
+                b.booked += 1
+            return wait
+
+    def _waited(self, model: str, seconds: float) -> None:
+        with self._lock:
+            b = self._budget(model)
+            b.waited_s += seconds
+            b.throttled += 1
+
+    def acquire(self, model: str, tokens: int) -> float:
+        """Book one request of `tokens`, sleeping until the budgets allow it; returns seconds waited."""
+        waited = 0.0
+        while True:
+            wait = self._try_book(model, tokens)
+            if wait <= 0:
+                break
+            time.sleep(wait)
+            waited += wait
+        if waited:
+            self._waited(model, waited)
+        return waited
+
+    async def acquire_async(self, model: str, tokens: int) -> float:
+        waited = 0.0
+        while True:
+            wait = self._try_book(model, tokens)
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+            waited += wait
+        if waited:
+            self._waited(model, waited)
+        return waited
+
+    def observe_headers(self, model: str, headers: Mapping[str, str]) -> None:
+        """Size and sync the model's buckets from x-ratelimit-* response headers."""
+        now = time.monotonic()
+        with self._lock:
+            b = self._budget(model)
+            for kind in ("requests", "tokens"):
+                limit = _header_number(headers, f"x-ratelimit-limit-{kind}")
+                if not limit:
+                    continue
+                remaining = _header_number(headers, f"x-ratelimit-remaining-{kind}")
+                if remaining is None:
+                    remaining = limit
+                bucket = getattr(b, kind)
+                if bucket is None:
+                    bucket = _Bucket(limit)
+                    setattr(b, kind, bucket)
+                bucket.sync(limit, remaining, now)
+
+    def observe_usage(self, model: str, chars: int, input_tokens: int, output_tokens: int) -> None:
+        """Correct the model's estimate with a call's actual usage."""
+        a = self.smoothing
+        with self._lock:
+            b = self._budget(model)
+            ratio = input_tokens / approx_tokens(chars)
+            b.input_ratio += a * (ratio - b.input_ratio)
+            b.output_tokens += a * (output_tokens - b.output_tokens)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                model: {
+                    "rpm": b.requests.limit if b.requests else None,
+                    "tpm": b.tokens.limit if b.tokens else None,
+                    "booked": b.booked,
+                    "throttled": b.throttled,
+                    "waited_s": b.waited_s,
+                }
+                for model, b in self._models.items()
+            }
+
+
+def _header_number(headers: Mapping[str, str], name: str) -> Optional[float]:
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
@@ -1,18 +1,49 @@
 from __future__ import annotations
 
-from typing import Any, Iterable, List, Optional
+from typing import TYPE_CHECKING, Any, Iterable, List, Optional
 
-from rich.console import Console
-from rich.table import Table
-from rich.panel import Panel
-from rich.text import Text
+if TYPE_CHECKING:
+    from rich.console import Console
+    from rich.table import Table
 
 
-console = Console()
+# rich (and its markdown renderer) is imported on first output, so commands
+# that print nothing or only a line or two do not pay for it
+_console: Optional[Console] = None
+
+
+def _get_console() -> Console:
+    global _console
+    if _console is None:
+        from rich.console import Console
+
+        _console = Console()
+    return _console
+
+
+def _fields_table() -> Table:
+    from rich.table import Table
+
+    table = Table(box=None, show_header=False)
+    table.add_column("Field", style="bold cyan")
+    table.add_column("Value")
+    return table
+
+
+def _print_panel(body: Any, title: str, border_style: str) -> None:
+    from rich.panel import Panel
+
+    _get_console().print(Panel.fit(body, title=title, border_style=border_style))
 
 
 def print_text(text: str) -> None:
-    console.print(Panel.fit(text, title="Response", border_style="cyan"))
+    _print_panel(text, "Response", "cyan")
+
+
+def print_markdown(text: str) -> None:
+    from rich.markdown import Markdown
+
+    _get_console().print(Markdown(text))
 
 
 def _iter_output_items(resp: Any) -> Iterable[Any]:
@@ -39,6 +70,8 @@ def extract_custom_tool_calls(resp: Any) -> List[dict]:
 
 
 def show_custom_tool_calls(resp: Any, title: str = "Custom Tool Calls") -> None:
+    from rich.table import Table
+
     calls = extract_custom_tool_calls(resp)
     table = Table(title=title, show_lines=False, header_style="bold magenta")
     table.add_column("Name", style="bold")
@@ -46,7 +79,7 @@ def show_custom_tool_calls(resp: Any, title: str = "Custom Tool Calls") -> None:
     table.add_column("Status", style="green")
     for c in calls:
         table.add_row(str(c.get("name")), str(c.get("input")), str(c.get("status")))
-    console.print(table)
+    _get_console().print(table)
 
 
 def safe_eval_add_mul(expr: str) -> Optional[int]:
@@ -85,18 +118,14 @@ def safe_eval_add_mul(expr: str) -> Optional[int]:
 
 def show_math_result(expr: str) -> None:
     result = safe_eval_add_mul(expr)
-    t = Table(box=None, show_header=False)
-    t.add_column("Field", style="bold cyan")
-    t.add_column("Value")
+    t = _fields_table()
     t.add_row("Expression", expr)
     t.add_row("Result", str(result) if result is not None else "(n/a)")
-    console.print(Panel.fit(t, title="Math Expression", border_style="cyan"))
+    _print_panel(t, "Math Expression", "cyan")
 
 
 def show_arith_validation(prompt: str, expression: str, parsed_ok: bool, value: Optional[float], expected: Optional[float]) -> None:
-    table = Table(box=None, show_header=False)
-    table.add_column("Field", style="bold cyan")
-    table.add_column("Value")
+    table = _fields_table()
     table.add_row("Prompt", prompt)
     table.add_row("Expression", expression or "(empty)")
     table.add_row("Parsed", "yes" if parsed_ok else "no")
@@ -106,7 +135,7 @@ def show_arith_validation(prompt: str, expression: str, parsed_ok: bool, value:
         status = "pass" if (value is not None and abs(value - expected) < 1e-9) else "fail"
         table.add_row("Expected", str(int(expected)) if float(expected).is_integer() else f"{expected}")
         table.add_row("Check", status)
-    console.print(Panel.fit(table, title="CFG Math Validation", border_style="green" if parsed_ok else "red"))
+    _print_panel(table, "CFG Math Validation", "green" if parsed_ok else "red")
 
 
 def show_sql_validation(
@@ -118,25 +147,28 @@ def show_sql_validation(
     rows_count: int,
     error: str | None,
     expected_rows: int | None = None,
+    truncated: bool = False,
 ) -> None:
     title_style = "green" if executed_ok else ("yellow" if parsed_ok else "red")
-    table = Table(box=None, show_header=False)
-    table.add_column("Field", style="bold cyan")
-    table.add_column("Value")
+    table = _fields_table()
     table.add_row("Prompt", prompt)
     table.add_row("Query", query or "(empty)")
     table.add_row("Parsed", "yes" if parsed_ok else "no")
     table.add_row("Executed", "yes" if executed_ok else "no")
     if columns:
         table.add_row("Columns", ", ".join(columns))
-    table.add_row("Rows", str(rows_count))
+    table.add_row("Rows", f"{rows_count}+ (truncated)" if truncated else str(rows_count))
     if expected_rows is not None:
-        status = "pass" if executed_ok and rows_count == expected_rows else "fail"
+        status = (
+            "pass"
+            if executed_ok and not truncated and rows_count == expected_rows
+            else "fail"
+        )
         table.add_row("Expected rows", str(expected_rows))
         table.add_row("Check", status)
     if error and not executed_ok:
         table.add_row("Error", error)
-    console.print(Panel.fit(table, title="CFG SQL Validation", border_style=title_style))
+    _print_panel(table, "CFG SQL Validation", title_style)
 
 
 def show_run_stats(
@@ -144,13 +176,21 @@ def show_run_stats(
     seconds: float,
     input_tokens: int | None,
     output_tokens: int | None,
+    timings: dict[str, float] | None = None,
+    cached_tokens: int | None = None,
+    reasoning_tokens: int | None = None,
 ) -> None:
-    table = Table(box=None, show_header=False)
-    table.add_column("Field", style="bold cyan")
-    table.add_column("Value")
+    table = _fields_table()
     if model:
         table.add_row("Model", model)
     table.add_row("Time (s)", f"{seconds:.2f}")
     if input_tokens is not None or output_tokens is not None:
-        table.add_row("Tokens", f"in={input_tokens or 0}, out={output_tokens or 0}")
-    console.print(Panel.fit(table, title="Run Stats", border_style="blue"))
+        tokens = f"in={input_tokens or 0}, out={output_tokens or 0}"
+        if cached_tokens:
+            tokens += f", cached={cached_tokens}"
+        if reasoning_tokens:
+            tokens += f", reasoning={reasoning_tokens}"
+        table.add_row("Tokens", tokens)
+    if timings:
+        table.add_row("Phases (s)", ", ".join(f"{k}={v:.3f}" for k, v in timings.items()))
+    _print_panel(table, "Run Stats", "blue")
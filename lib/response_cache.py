@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+DEFAULT_CACHE_PATH = os.getenv("OPENAI_CACHE_PATH", ".cache/responses.sqlite")
+DEFAULT_MAX_BYTES = int(float(os.getenv("OPENAI_CACHE_MAX_MB", "512")) * 1024 * 1024)
+DEFAULT_MAX_AGE_S = float(os.getenv("OPENAI_CACHE_MAX_AGE_DAYS", "30")) * 86400
+
+
+class CacheMiss(LookupError):
+    """Raised in replay mode when a request has no cached response."""
+
+
+def request_key(
+    model: str, input: Any, tools: Optional[List[Dict[str, Any]]] = None
+) -> str:
+    """Content hash of a Responses request.
+
+    The tool definitions are hashed verbatim, so a change to the Lark
+    grammar text yields a different key.
+    """
+    blob = json.dumps(
+        {"model": model, "input": input, "tools": tools},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed store of serialized Responses with size/age eviction."""
+
+    # Eviction scans the whole table, so only run it every N writes.
+    EVICT_EVERY = 64
+
+    def __init__(
+        self,
+        path: str | Path = DEFAULT_CACHE_PATH,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_age_s: float = DEFAULT_MAX_AGE_S,
+    ) -> None:
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(
+            str(self.path), check_same_thread=False, isolation_level=None
+        )
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("PRAGMA synchronous=NORMAL")
+        self._con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL,
+                payload TEXT NOT NULL
+            )
+            """
+        )
+        self._con.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed_at)"
+        )
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._con.execute(
+                "SELECT payload, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age_s:
+                self.misses += 1
+                return None
+            self._con.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self.hits += 1
+        from openai.types.responses import Response
+
+        return Response.construct(**json.loads(row[0]))
+
+    def put(self, key: str, model: str, resp: Any) -> None:
+        payload = resp.model_dump_json()
+        now = time.time()
+        with self._lock:
+            self._con.execute(
+                "INSERT OR REPLACE INTO responses(key, model, created_at, accessed_at, size, payload) "
+                "VALUES(?, ?, ?, ?, ?, ?)",
+                (key, model, now, now, len(payload), payload),
+            )
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict_locked(now)
+
+    def evict(self) -> int:
+        with self._lock:
+            return self._evict_locked(time.time())
+
+    def _evict_locked(self, now: float) -> int:
+        removed = self._con.execute(
+            "DELETE FROM responses WHERE created_at < ?", (now - self.max_age_s,)
+        ).rowcount
+        total = self._con.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return removed
+        # Drop least recently used entries until we fit
+        doomed: List[str] = []
+        for key, size in self._con.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at"
+        ):
+            if total <= self.max_bytes:
+                break
+            doomed.append(key)
+            total -= size
+        self._con.executemany(
+            "DELETE FROM responses WHERE key = ?", [(k,) for k in doomed]
+        )
+        return removed + len(doomed)
+
+    def close(self) -> None:
+        with self._lock:
+            self._con.close()
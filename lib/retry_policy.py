@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Deque, Dict, Optional
+
+
+# 408/409 are documented as safe to retry, 429 is rate limiting, 5xx are
+# server-side. Everything else (400, 401, 403, 404, 422, ...) is our fault
+# and will fail the same way again.
+TRANSIENT_STATUS = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    failure_threshold: int = int(os.getenv("OPENAI_BREAKER_THRESHOLD", "5"))
+    reset_timeout_s: float = float(os.getenv("OPENAI_BREAKER_RESET_S", "30"))
+    max_retry_after_s: float = float(os.getenv("OPENAI_MAX_RETRY_AFTER_S", "60"))
+    hedge: bool = os.getenv("OPENAI_HEDGE", "") not in ("", "0", "false")
+    hedge_quantile: float = 0.95
+    hedge_min_samples: int = 20
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the API while a model's circuit is open."""
+
+
+def is_transient(exc: BaseException) -> bool:
+    # Only reached once a call has failed, so the SDK is already loaded
+    from openai import APIConnectionError, APIStatusError
+
+    if isinstance(exc, APIConnectionError):  # includes APITimeoutError
+        return True
+    if isinstance(exc, APIStatusError):
+        # A 429 for an exhausted quota will not clear by waiting
+        if getattr(exc, "code", None) == "insufficient_quota":
+            return False
+        return exc.status_code in TRANSIENT_STATUS
+    return False
+
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNIT_S = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    # x-ratelimit-reset-* use Go-style durations such as "1s", "6m0s", "20ms"
+    parts = _DURATION.findall(value.strip())
+    if not parts:
+        return None
+    return sum(float(n) * _UNIT_S[u] for n, u in parts)
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds the server asked us to wait before retrying, if it said."""
+    response = getattr(exc, "response", None)
+    headers: Any = getattr(response, "headers", None)
+    if not headers:
+        return None
+    ms = headers.get("retry-after-ms")
+    if ms:
+        try:
+            return float(ms) / 1000.0
+        except ValueError:
+            pass
+    ra = headers.get("retry-after")
+    if ra:
+        try:
+            return float(ra)
+        except ValueError:
+            try:
+                when = parsedate_to_datetime(ra)
+                return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                pass
+    resets = [
+        _parse_duration(headers.get(h) or "")
+        for h in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+    ]
+    resets = [r for r in resets if r is not None]
+    return max(resets) if resets else None
+
+
+class CircuitBreaker:
+    """Per-model breaker: opens after N consecutive transient failures.
+
+    While open, calls fail fast with CircuitOpenError. After the reset
+    timeout a single probe is let through (half-open); its outcome closes
+    or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout_s: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self._lock = threading.Lock()
+        self._failures: Dict[str, int] = {}
+        self._opened_at: Dict[str, float] = {}
+        self._probing: Dict[str, bool] = {}
+
+    def before_call(self, model: str) -> None:
+        with self._lock:
+            opened = self._opened_at.get(model)
+            if opened is None:
+                return
+            if time.monotonic() - opened < self.reset_timeout_s or self._probing.get(model):
+                raise CircuitOpenError(
+                    f"circuit open for {model} after {self._failures.get(model, 0)} failures"
+                )
+            self._probing[model] = True
+
+    def record_success(self, model: str) -> None:
+        with self._lock:
+            self._failures.pop(model, None)
+            self._opened_at.pop(model, None)
+            self._probing.pop(model, None)
+
+    def record_failure(self, model: str) -> None:
+        with self._lock:
+            n = self._failures.get(model, 0) + 1
+            self._failures[model] = n
+            if self._probing.pop(model, False) or n >= self.failure_threshold:
+                self._opened_at[model] = time.monotonic()
+
+    def state(self, model: str) -> str:
+        with self._lock:
+            if model not in self._opened_at:
+                return "closed"
+            return "half-open" if self._probing.get(model) else "open"
+
+
+class LatencyTracker:
+    """Sliding window of successful call latencies per model."""
+
+    def __init__(self, window: int = 200) -> None:
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def observe(self, model: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def quantile(self, model: str, q: float, min_samples: int) -> Optional[float]:
+        with self._lock:
+            xs = sorted(self._samples.get(model, ()))
+        if len(xs) < min_samples:
+            return None
+        return xs[min(len(xs) - 1, int(q * len(xs)))]
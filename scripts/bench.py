@@ -0,0 +1,354 @@
+"""Reproducible benchmarks for the local validation hot paths.
+
+Times the code that runs after the API call: grammar parsing for both
+experiments, safe_eval_arith, building/opening the sample DB, SQL
+execution and extracting the tool input from a response, plus the whole
+_math_result/_sql_result post-processing. Inputs are synthetic corpora
+sampled from the grammars at several sizes and expression depths, with a
+fixed seed, so runs on the same machine are comparable.
+
+    python scripts/bench.py --out bench.json
+    python scripts/bench.py --compare bench.json --threshold 0.1
+
+--compare exits with status 1 when any benchmark's median time per op is
+slower than the baseline by more than the threshold.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import math
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import lark  # noqa: E402
+from openai.types.responses import Response  # noqa: E402
+
+from experiments import cfg_math, cfg_sql  # noqa: E402
+from experiments.sql_canonical import canonical_sql  # noqa: E402
+from experiments.sql_dataset import generate_dataset, open_dataset  # noqa: E402
+from lib.grammar import PrefixValidator  # noqa: E402
+from lib.grammar_sampler import GrammarSampler  # noqa: E402
+from lib.mock_server import MockConfig, MockResponses  # noqa: E402
+from lib.openai_client import custom_tool_input  # noqa: E402
+
+
+FORMAT_VERSION = 1
+
+
+@dataclass
+class Bench:
+    name: str
+    # Runs `ops` operations once; timed as a whole
+    fn: Callable[[], Any]
+    ops: int
+    params: Dict[str, Any] = field(default_factory=dict)
+
+
+def _corpus(grammar: str, n: int, depth: int, seed: int) -> List[str]:
+    sampler = GrammarSampler(grammar, max_depth=depth)
+    rng = random.Random(seed)
+    return [sampler.sample(rng) for _ in range(n)]
+
+
+def _mean_len(texts: List[str]) -> float:
+    return round(sum(map(len, texts)) / max(1, len(texts)), 1)
+
+
+def _responses(
+    request: tuple, n: int, depth: int, seed: int, extra_items: int = 0
+) -> List[Response]:
+    inp, tools = request
+    mock = MockResponses(MockConfig(seed=seed, max_depth=depth))
+    out = []
+    for i in range(n):
+        data = mock.respond({"model": "bench", "input": inp, "tools": tools})
+        # Reasoning items ahead of the tool call, as real responses have
+        filler = [
+            {"type": "reasoning", "id": f"rs_{i}_{k}", "summary": []}
+            for k in range(extra_items)
+        ]
+        data["output"] = filler + data["output"]
+        out.append(Response.construct(**data))
+    return out
+
+
+def _parse_all(parser: lark.Lark, texts: List[str]) -> Callable[[], None]:
+    def run() -> None:
+        for t in texts:
+            parser.parse(t)
+
+    return run
+
+
+def _feed_all(parser: lark.Lark, texts: List[str], chunk: int) -> Callable[[], None]:
+    def run() -> None:
+        for t in texts:
+            v = PrefixValidator(parser)
+            for i in range(0, len(t), chunk):
+                v.feed(t[i : i + chunk])
+
+    return run
+
+
+def build_benchmarks(quick: bool, seed: int, workdir: Path) -> Iterator[Bench]:
+    n = 200 if quick else 2000
+    n_results = 100 if quick else 500
+
+    for depth in (2, 4, 8):
+        texts = _corpus(cfg_math.ARITH_LARK, n, depth, seed)
+        params = {"n": n, "depth": depth, "mean_chars": _mean_len(texts)}
+        yield Bench(f"parse.math[d={depth}]", _parse_all(cfg_math.parser, texts), n, params)
+        yield Bench(
+            f"eval.safe_eval_arith[d={depth}]",
+            lambda texts=texts: [cfg_math.safe_eval_arith(t) for t in texts],
+            n,
+            params,
+        )
+
+    for depth in (4, 6, 8):
+        texts = _corpus(cfg_sql.SQL_LARK, n, depth, seed)
+        params = {"n": n, "depth": depth, "mean_chars": _mean_len(texts)}
+        yield Bench(f"parse.sql[d={depth}]", _parse_all(cfg_sql.parser, texts), n, params)
+        trees = [cfg_sql.canonical_parser.parse(t) for t in texts]
+        yield Bench(
+            f"sql.canonicalize[d={depth}]",
+            lambda trees=trees: [canonical_sql(t, cfg_sql.SQL_COLUMNS) for t in trees],
+            n,
+            params,
+        )
+
+    # Streamed validation: 4-character deltas, as the mock server sends them
+    streamed = (
+        ("math", cfg_math.ARITH_LARK, cfg_math.parser, 4),
+        ("sql", cfg_sql.SQL_LARK, cfg_sql.parser, 6),
+    )
+    for name, grammar, parser, depth in streamed:
+        texts = _corpus(grammar, n, depth, seed)
+        yield Bench(
+            f"stream.prefix_validate.{name}[d={depth}]",
+            _feed_all(parser, texts, 4),
+            n,
+            {"n": n, "depth": depth, "chunk": 4, "mean_chars": _mean_len(texts)},
+        )
+
+    def init_db() -> None:
+        cfg_sql._init_sample_db().close()
+
+    def open_db() -> None:
+        cfg_sql.open_sample_db().close()
+
+    yield Bench("db.init_sample_db", init_db, 1)
+    yield Bench("db.open_sample_db", open_db, 1)
+
+    references = [ref for _prompt, ref in cfg_sql.SQL_REFERENCE_CASES]
+    con = cfg_sql.open_sample_db()
+    yield Bench(
+        "sql.execute[db=sample]",
+        lambda: [cfg_sql.execute_query(con, q) for q in references],
+        len(references),
+        {"queries": len(references)},
+    )
+    for users in (1000,) if quick else (1000, 20000):
+        path = generate_dataset(workdir / f"users-{users}.sqlite", users=users, seed=seed)
+        dcon = open_dataset(path)
+        yield Bench(
+            f"sql.execute[db=users-{users}]",
+            lambda dcon=dcon: [cfg_sql.execute_query(dcon, q) for q in references],
+            len(references),
+            {"queries": len(references), "users": users},
+        )
+
+    math_req = cfg_math._math_request("bench")
+    for extra in (0, 16):
+        resps = _responses(math_req, n_results, 4, seed, extra_items=extra)
+        yield Bench(
+            f"extract.custom_tool_input[items={extra + 1}]",
+            lambda resps=resps: [custom_tool_input(r, "math_exp") for r in resps],
+            n_results,
+            {"n": n_results, "output_items": extra + 1},
+        )
+
+    resps = _responses(math_req, n_results, 4, seed)
+    yield Bench(
+        "result.math",
+        lambda: [cfg_math._math_result("bench", None, "bench", r) for r in resps],
+        n_results,
+        {"n": n_results, "depth": 4},
+    )
+    sql_resps = _responses(cfg_sql._sql_request("bench"), n_results, 6, seed)
+
+    def sql_results(resps: List[Response], cache_entries: int) -> Callable[[], None]:
+        def run() -> None:
+            # Every run starts from an empty cache; repeats within a run hit it
+            cfg_sql.configure_execution_cache(cache_entries)
+            for r in resps:
+                cfg_sql._sql_result("bench", "bench", None, r)
+
+        return run
+
+    yield Bench("result.sql", sql_results(sql_resps, 0), n_results, {"n": n_results, "depth": 6})
+    # Half the responses repeated: the second copy of each is served from the cache
+    half = sql_resps[: n_results // 2]
+    yield Bench(
+        "result.sql[exec-cache,50% repeats]",
+        sql_results(half + half, 4096),
+        n_results,
+        {"n": n_results, "depth": 6, "repeats": 0.5},
+    )
+
+
+def measure(bench: Bench, repeat: int, min_time: float) -> Dict[str, Any]:
+    """Time `bench` like timeit: calibrated inner loops, GC off, `repeat` samples."""
+    bench.fn()  # warm-up (parser caches, DB template, page cache)
+    t0 = time.perf_counter()
+    bench.fn()
+    once = max(time.perf_counter() - t0, 1e-9)
+    loops = max(1, math.ceil(min_time / once))
+    samples: List[float] = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            for _ in range(loops):
+                bench.fn()
+            dt = time.perf_counter() - t0
+            samples.append(dt / (loops * bench.ops) * 1e6)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return {
+        "params": bench.params,
+        "ops": bench.ops,
+        "loops": loops,
+        "us_per_op": {
+            "min": min(samples),
+            "median": statistics.median(samples),
+            "mean": statistics.fmean(samples),
+            "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        },
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(args: argparse.Namespace) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory(prefix="cfg-bench-") as tmp:
+        for bench in build_benchmarks(args.quick, args.seed, Path(tmp)):
+            if args.filter and not any(f in bench.name for f in args.filter):
+                continue
+            results[bench.name] = measure(bench, args.repeat, args.min_time)
+            r = results[bench.name]["us_per_op"]
+            print(f"{bench.name:40s} {r['median']:10.2f} us/op  (min {r['min']:.2f})", flush=True)
+    return {
+        "version": FORMAT_VERSION,
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "lark": lark.__version__,
+            "quick": args.quick,
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "benchmarks": results,
+    }
+
+
+def compare(
+    current: Dict[str, Any],
+    baseline: Dict[str, Any],
+    threshold: float,
+    show_missing: bool = True,
+) -> List[str]:
+    """Print a comparison table and return the names that regressed."""
+    regressions: List[str] = []
+    base = baseline.get("benchmarks", {})
+    print(f"\n{'benchmark':40s} {'base us':>10s} {'now us':>10s} {'change':>8s}")
+    for name, res in current["benchmarks"].items():
+        if name not in base:
+            print(f"{name:40s} {'-':>10s} {res['us_per_op']['median']:10.2f}      new")
+            continue
+        old = base[name]["us_per_op"]["median"]
+        new = res["us_per_op"]["median"]
+        change = new / old - 1.0 if old > 0 else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  faster"
+        print(f"{name:40s} {old:10.2f} {new:10.2f} {change:+8.1%}{flag}")
+    missing = sorted(base.keys() - current["benchmarks"].keys()) if show_missing else []
+    for name in missing:
+        print(f"{name:40s} (in baseline only)")
+    if baseline.get("meta", {}).get("platform") != current["meta"]["platform"]:
+        print("\nnote: baseline was recorded on a different platform")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--out", default=None, help="Write results as JSON to this path")
+    ap.add_argument("--compare", default=None, help="Baseline JSON to compare against")
+    ap.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="Relative slowdown of the median that counts as a regression",
+    )
+    ap.add_argument("--quick", action="store_true", help="Smaller corpora and datasets")
+    ap.add_argument("--repeat", type=int, default=7, help="Timing samples per benchmark")
+    ap.add_argument(
+        "--min-time", type=float, default=0.1, help="Minimum seconds per timing sample"
+    )
+    ap.add_argument("--seed", type=int, default=0, help="Corpus seed")
+    ap.add_argument(
+        "--filter",
+        action="append",
+        default=[],
+        help="Only run benchmarks whose name contains this (repeatable)",
+    )
+    args = ap.parse_args(argv)
+
+    report = run_benchmarks(args)
+    if args.out:
+        out = Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"\nWrote {out}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare(report, baseline, args.threshold, show_missing=not args.filter)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
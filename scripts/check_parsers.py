@@ -0,0 +1,118 @@
+"""Check LALR validation against Earley on stored outputs and measure throughput.
+
+Outputs are read from the suite reports under docs/experiments by default,
+or from --input (one output per line, or JSONL with an "expression"/"query"
+field). With --workers N the LALR pass is spread over N processes, each of
+which loads the cached parser tables instead of rebuilding them.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import sys
+import time
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Any, Callable, Iterator, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from lib.grammar import load_parser, validate_many  # noqa: E402
+
+
+GRAMMARS = {
+    "math": ("experiments.cfg_math", "ARITH_LARK"),
+    "sql": ("experiments.cfg_sql", "SQL_LARK"),
+}
+_CELL = re.compile(r"\| `(.*?)` \|")
+_worker_parser = None
+
+
+def _grammar(kind: str) -> str:
+    import importlib
+
+    mod, name = GRAMMARS[kind]
+    return getattr(importlib.import_module(mod), name)
+
+
+def iter_report_outputs(kind: str) -> Iterator[str]:
+    for f in sorted(Path(f"docs/experiments/cfg-{kind}").glob("*.md")):
+        for line in f.read_text(encoding="utf-8").splitlines():
+            m = _CELL.search(line)
+            if m:
+                yield m.group(1).replace("\\|", "|")
+
+
+def iter_file_outputs(path: str) -> Iterator[str]:
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            line = line.rstrip("\n")
+            if line.startswith("{"):
+                obj = json.loads(line)
+                yield obj.get("expression") or obj.get("query") or ""
+            elif line:
+                yield line
+
+
+def _init_worker(kind: str) -> None:
+    global _worker_parser
+    _worker_parser = load_parser(_grammar(kind), parser="lalr", start="start")
+
+
+def _validate_chunk(chunk: List[str]) -> List[bool]:
+    return validate_many(_worker_parser, chunk)
+
+
+def _timed(label: str, fn: Callable[[], Any], n: int) -> Any:
+    t0 = time.perf_counter()
+    res = fn()
+    dt = time.perf_counter() - t0
+    print(f"{label:>8}: {n} outputs in {dt:.3f}s ({n / dt if dt else float('inf'):,.0f}/s)")
+    return res
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("kind", choices=sorted(GRAMMARS))
+    ap.add_argument("--input", help="File of stored outputs (default: report tables)")
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--repeat", type=int, default=1, help="Repeat the corpus N times")
+    ap.add_argument("--skip-earley", action="store_true", help="Only time LALR")
+    args = ap.parse_args()
+
+    texts = list(iter_file_outputs(args.input) if args.input else iter_report_outputs(args.kind))
+    texts *= args.repeat
+    grammar = _grammar(args.kind)
+
+    t0 = time.perf_counter()
+    lalr = load_parser(grammar, parser="lalr", start="start")
+    print(f"lalr load: {time.perf_counter() - t0:.3f}s")
+
+    if args.workers > 1:
+        size = max(1, len(texts) // (args.workers * 8))
+        chunks = [texts[i : i + size] for i in range(0, len(texts), size)]
+        with Pool(args.workers, initializer=_init_worker, initargs=(args.kind,)) as pool:
+            lalr_ok = _timed(
+                "lalr",
+                lambda: [ok for part in pool.map(_validate_chunk, chunks) for ok in part],
+                len(texts),
+            )
+    else:
+        lalr_ok = _timed("lalr", lambda: validate_many(lalr, texts), len(texts))
+    print(f"accepted: {sum(lalr_ok)}/{len(texts)}")
+
+    if args.skip_earley:
+        return 0
+    earley = load_parser(grammar, parser="earley", start="start")
+    earley_ok = _timed("earley", lambda: validate_many(earley, texts), len(texts))
+    diffs = [t for t, a, b in zip(texts, lalr_ok, earley_ok) if a != b]
+    for t in diffs[:20]:
+        print(f"MISMATCH: {t!r}")
+    print(f"mismatches: {len(diffs)}")
+    return 1 if diffs else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,209 @@
+"""Start-up time of the CLI and worker entry points, tracked like bench.py.
+
+Each target runs in a fresh interpreter with `-X importtime`, so every
+sample pays the full import cost a user or a cfg-worker process pays:
+wall time of the process, total import time, and the top-level modules
+that account for most of it. The first-parse targets also build a
+grammar's parser (from the lark table cache after the warm-up run).
+
+    python scripts/startup_bench.py --out .cache/bench/startup.json
+    python scripts/startup_bench.py --compare .cache/bench/startup.json --threshold 0.2
+
+--compare exits with status 1 when any target's median wall time is
+slower than the baseline by more than the threshold.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+FORMAT_VERSION = 1
+
+# name -> interpreter arguments after `python -X importtime`
+TARGETS: Dict[str, List[str]] = {
+    "python": ["-c", "pass"],
+    "cli_help": ["-m", "cli", "--help"],
+    "cli_compare_help": ["-m", "cli", "compare", "--help"],
+    "import_cli": ["-c", "import cli"],
+    "import_worker": ["-c", "import experiments.work_queue"],
+    "import_mock_server": ["-c", "import lib.mock_server"],
+    "first_parse_math": ["-c", "from experiments import cfg_math; cfg_math.parser.parse('1 + 2')"],
+    "first_parse_sql": [
+        "-c",
+        "from experiments import cfg_sql; cfg_sql.parser.parse('SELECT id FROM users LIMIT 1')",
+    ],
+}
+
+
+def _import_times(stderr: str) -> Tuple[float, Dict[str, float]]:
+    """Total import time and cumulative time per top-level import, in ms."""
+    top: Dict[str, float] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _self_us, cumulative, name = line[len("import time:") :].split("|")
+        # Skip the header and nested imports (indented below their importer)
+        if not cumulative.strip().isdigit() or name.startswith("  "):
+            continue
+        top[name.strip()] = int(cumulative) / 1000.0
+    return sum(top.values()), top
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_once(args: List[str]) -> Tuple[float, float, Dict[str, float]]:
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    wall = (time.perf_counter() - t0) * 1000.0
+    if proc.returncode != 0:
+        tail = "\n".join(
+            line for line in proc.stderr.splitlines() if not line.startswith("import time:")
+        )
+        raise SystemExit(f"{' '.join(args)} failed:\n{tail[-2000:]}")
+    total, top = _import_times(proc.stderr)
+    return wall, total, top
+
+
+def measure(args: List[str], repeat: int, top: int) -> Dict[str, Any]:
+    run_once(args)  # warm-up (bytecode, lark table cache, page cache)
+    walls: List[float] = []
+    imports: List[float] = []
+    modules: Dict[str, List[float]] = {}
+    for _ in range(repeat):
+        wall, total, mods = run_once(args)
+        walls.append(wall)
+        imports.append(total)
+        for name, ms in mods.items():
+            modules.setdefault(name, []).append(ms)
+    heaviest = sorted(
+        ((name, statistics.median(v)) for name, v in modules.items()),
+        key=lambda kv: kv[1],
+        reverse=True,
+    )[:top]
+    return {
+        "args": args,
+        "wall_ms": {
+            "min": min(walls),
+            "median": statistics.median(walls),
+            "stdev": statistics.stdev(walls) if len(walls) > 1 else 0.0,
+        },
+        "import_ms": statistics.median(imports),
+        "heaviest_imports_ms": dict(heaviest),
+    }
+
+
+def run_benchmarks(args: argparse.Namespace) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for name, target in TARGETS.items():
+        if args.filter and not any(f in name for f in args.filter):
+            continue
+        r = results[name] = measure(target, args.repeat, args.top)
+        heaviest = ", ".join(f"{m} {ms:.0f}" for m, ms in list(r["heaviest_imports_ms"].items())[:3])
+        print(
+            f"{name:22s} {r['wall_ms']['median']:8.1f} ms  imports {r['import_ms']:7.1f} ms"
+            f"  ({heaviest})",
+            flush=True,
+        )
+    return {
+        "version": FORMAT_VERSION,
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "benchmarks": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Print a comparison table and return the targets that regressed."""
+    regressions: List[str] = []
+    base = baseline.get("benchmarks", {})
+    print(f"\n{'target':22s} {'base ms':>9s} {'now ms':>9s} {'change':>8s}")
+    for name, res in current["benchmarks"].items():
+        new = res["wall_ms"]["median"]
+        if name not in base:
+            print(f"{name:22s} {'-':>9s} {new:9.1f}      new")
+            continue
+        old = base[name]["wall_ms"]["median"]
+        change = new / old - 1.0 if old > 0 else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  faster"
+        print(f"{name:22s} {old:9.1f} {new:9.1f} {change:+8.1%}{flag}")
+    if baseline.get("meta", {}).get("platform") != current["meta"]["platform"]:
+        print("\nnote: baseline was recorded on a different platform")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--out", default=None, help="Write results as JSON to this path")
+    ap.add_argument("--compare", default=None, help="Baseline JSON to compare against")
+    ap.add_argument(
+        "--threshold",
+        type=float,
+        default=0.20,
+        help="Relative slowdown of the median wall time that counts as a regression",
+    )
+    ap.add_argument("--repeat", type=int, default=9, help="Processes started per target")
+    ap.add_argument("--top", type=int, default=8, help="Heaviest imports recorded per target")
+    ap.add_argument(
+        "--filter",
+        action="append",
+        default=[],
+        help="Only run targets whose name contains this (repeatable)",
+    )
+    args = ap.parse_args(argv)
+
+    report = run_benchmarks(args)
+    if args.out:
+        out = Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"\nWrote {out}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
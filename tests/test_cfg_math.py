@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from fractions import Fraction
+
+import pytest
+from lark.exceptions import LarkError
+
+from experiments.cfg_math import (
+    ArithDivisionByZero,
+    MathEval,
+    evaluate,
+    evaluate_many,
+    safe_eval_arith,
+)
+from lib.metrics import phase_percentiles
+
+
+@pytest.mark.parametrize(
+    "expr, expected",
+    [
+        ("7", 7.0),
+        ("1 + 2 * 3", 7.0),
+        ("(1 + 2) * 3", 9.0),
+        ("2 * 3 + 4 * 5", 26.0),
+        ("20 / 4 + 2", 7.0),
+        ("20 / (4 + 1)", 4.0),
+        # - and / are left-associative
+        ("10 - 4 - 3", 3.0),
+        ("10 - (4 - 3)", 9.0),
+        ("64 / 8 / 2", 4.0),
+        ("64 / (8 / 2)", 16.0),
+        ("8 - 6 / 3 * 2", 4.0),
+        ("((((5))))", 5.0),
+        ("007 + 1", 8.0),
+        ("1 / 3", 1 / 3),
+    ],
+)
+def test_evaluate(expr: str, expected: float) -> None:
+    value = evaluate(expr)
+    assert isinstance(value, float)
+    assert value == pytest.approx(expected)
+
+
+@pytest.mark.parametrize(
+    "expr, expected",
+    [
+        ("1 / 3", Fraction(1, 3)),
+        ("1 / 3 + 1 / 6", Fraction(1, 2)),
+        ("7 / 2 - 1", Fraction(5, 2)),
+        ("2 * 3", Fraction(6)),
+    ],
+)
+def test_evaluate_exact(expr: str, expected: Fraction) -> None:
+    value = evaluate(expr, exact=True)
+    assert isinstance(value, Fraction)
+    assert value == expected
+
+
+@pytest.mark.parametrize(
+    "expr, column",
+    [
+        ("1 / 0", 3),
+        ("1/(2-2)", 2),
+        ("10 / (3 - 3) + 1", 4),
+        ("(1+2)/0*5", 6),
+        ("2*3/0", 4),
+        ("1/(2/0)", 5),
+        # The first division by zero is reported
+        ("1/0 + 2/0", 2),
+    ],
+)
+def test_division_by_zero_points_at_the_operator(expr: str, column: int) -> None:
+    with pytest.raises(ArithDivisionByZero, match=f"division by zero at column {column}$"):
+        evaluate(expr)
+    with pytest.raises(ZeroDivisionError):
+        evaluate(expr, exact=True)
+
+
+@pytest.mark.parametrize(
+    "expr",
+    ["", "1 +", "+ 1", "1 2", "(1 + 2", "1 + 2)", "1 ^ 2", "-1",
+     # A division by zero does not hide a later syntax error
+     "1/0 +", "1/0 2", "8/(4-4", "4 + (6/(1-1)"],
+)
+def test_syntax_errors_raise_lark_errors(expr: str) -> None:
+    with pytest.raises(LarkError):
+        evaluate(expr)
+    assert safe_eval_arith(expr) is None
+
+
+def test_evaluate_many() -> None:
+    assert evaluate_many(["1 + 2", "1/0", "1 +", "2/4"], exact=True) == [
+        MathEval(parsed_ok=True, value=Fraction(3)),
+        MathEval(parsed_ok=True, error="division by zero at column 2"),
+        MathEval(parsed_ok=False, error="UnexpectedToken"),
+        MathEval(parsed_ok=True, value=Fraction(1, 2)),
+    ]
+    assert evaluate_many([]) == []
+
+
+def test_safe_eval_arith() -> None:
+    assert safe_eval_arith("6 / 4") == 1.5
+    assert safe_eval_arith("6 / (4 - 4)") is None
+
+
+def test_old_eval_timings_fold_into_parse() -> None:
+    from experiments.cfg_math import MathRunResult
+
+    old = MathRunResult("p", "1", True, 1.0, 1.0, timings={"parse": 0.002, "eval": 0.001})
+    new = MathRunResult("p", "1", True, 1.0, 1.0, timings={"parse": 0.003})
+    stats = phase_percentiles([("m", ("p", 1.0), old, 0.1), ("m", ("p", 1.0), new, 0.1)])["m"]
+    assert set(stats) == {"parse", "total"}
+    assert stats["parse"][0] == pytest.approx(0.003)
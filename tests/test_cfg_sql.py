@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from experiments import cfg_sql
+
+
+def _response(query: str) -> Any:
+    call = SimpleNamespace(
+        type="custom_tool_call", name="sql_query", input=query, status="completed"
+    )
+    return SimpleNamespace(output=[call], model="m", usage=None)
+
+
+def test_valid_query_is_parsed_canonicalized_and_executed() -> None:
+    r = cfg_sql._sql_result("p", "m", None, _response("SELECT id FROM users LIMIT 2"))
+    assert r.parsed_ok and r.executed_ok
+    assert r.canonical_query == "SELECT users.id FROM users LIMIT 2"
+    assert r.canonical_error is None
+    assert {"parse", "canonicalize", "execute"} <= set(r.timings)
+
+
+def test_unparsable_query_is_not_parsed() -> None:
+    r = cfg_sql._sql_result("p", "m", None, _response("SELEC id FROM users"))
+    assert not r.parsed_ok
+    assert r.canonical_query is None and r.canonical_error is None
+
+
+def test_canonicalizer_failure_keeps_parsed_and_runs_uncached(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    def broken(tree: Any, columns: Any) -> str:
+        raise IndexError("boom")
+
+    monkeypatch.setattr(cfg_sql, "canonical_sql", broken)
+    r = cfg_sql._sql_result("p", "m", None, _response("SELECT id FROM users LIMIT 2"))
+    assert r.parsed_ok and r.executed_ok
+    assert r.canonical_query is None
+    assert r.canonical_error == "IndexError: boom"
+    assert not r.execution_cached
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import re
+
+import pytest
+
+from experiments.checkpoint import Checkpoint, checkpoint_path, new_run_id
+
+
+def test_run_ids_started_in_the_same_second_differ() -> None:
+    ids = [new_run_id() for _ in range(200)]
+    assert len(set(ids)) == len(ids)
+    assert all(re.fullmatch(r"\d{8}-\d{6}-[0-9a-f]{6}", i) for i in ids)
+
+
+def test_runs_started_together_get_their_own_checkpoints(tmp_path) -> None:
+    ckpts = []
+    for _ in range(5):
+        run_id = new_run_id()
+        header = {"run_id": run_id, "kind": "sql"}
+        ckpts.append(Checkpoint.create(checkpoint_path(tmp_path, run_id), header))
+    for c in ckpts:
+        c.close()
+    assert len({c.path for c in ckpts}) == 5
+    reopened = Checkpoint.open(ckpts[0].path)
+    assert reopened.header["run_id"] == ckpts[0].header["run_id"]
+    assert reopened.done() == set()
+    reopened.close()
+
+
+def test_create_never_overwrites(tmp_path) -> None:
+    path = checkpoint_path(tmp_path, "20250101-120000")
+    Checkpoint.create(path, {"run_id": "20250101-120000", "kind": "math"}).close()
+    with pytest.raises(FileExistsError):
+        Checkpoint.create(path, {"run_id": "20250101-120000", "kind": "sql"})
+    assert '"kind": "math"' in path.read_text(encoding="utf-8")
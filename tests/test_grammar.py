@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import pytest
+
+from experiments import cfg_math, cfg_sql
+from lib.grammar import PrefixValidator, _first_chars, _PrefixTables
+
+MATH_VALID = [
+    "1",
+    "12 + 3",
+    "(1+2)*3",
+    "12 / (3 - 4) * 5",
+    "((7))",
+    "100 - 20 - 3 * (4 + 5) / 6",
+]
+
+SQL_VALID = [
+    "SELECT * FROM users",
+    "SELECT id, name FROM users WHERE age >= 30 LIMIT 5",
+    "SELECT name FROM users WHERE city = 'New York' AND NOT age < 18",
+    "SELECT users.name, orders.amount FROM users JOIN orders ON users.id = orders.user_id "
+    "WHERE (orders.status != 'paid' OR orders.amount > 100) LIMIT 10",
+    "SELECT user_id FROM orders WHERE status = ''",
+]
+
+MATH_DEAD = ["*2", "1 + * 2", "1 2 ", "(1)) ", ") "]
+
+SQL_DEAD = [
+    "select",
+    "SELECT FROM ",
+    "SELECT id, FROM ",
+    "SELECT id FROM accounts",
+    "SELECT id FROM users WHERE age >> 3",
+    "SELECT id FROM users LIMIT 3 WHERE ",
+    "SELECT id FROM users JOIN orders users ",
+]
+
+
+def _feed_chars(parser, text: str) -> PrefixValidator:
+    v = PrefixValidator(parser)
+    for ch in text:
+        v.feed(ch)
+    return v
+
+
+def _cases(valid):
+    return [(text, k) for text in valid for k in range(1, len(text))]
+
+
+@pytest.mark.parametrize("text, k", _cases(MATH_VALID))
+def test_math_prefixes_of_valid_outputs_are_viable(text: str, k: int) -> None:
+    parser = cfg_math._parser()
+    assert _feed_chars(parser, text[:k]).viable
+    assert PrefixValidator(parser).feed(text[:k])
+
+
+@pytest.mark.parametrize("text, k", _cases(SQL_VALID))
+def test_sql_prefixes_of_valid_outputs_are_viable(text: str, k: int) -> None:
+    parser = cfg_sql._parser()
+    assert _feed_chars(parser, text[:k]).viable
+    assert PrefixValidator(parser).feed(text[:k])
+
+
+@pytest.mark.parametrize(
+    "parser_fn, text",
+    [(cfg_math._parser, t) for t in MATH_VALID] + [(cfg_sql._parser, t) for t in SQL_VALID],
+)
+def test_valid_outputs_stay_viable_and_parse(parser_fn, text: str) -> None:
+    parser = parser_fn()
+    v = _feed_chars(parser, text)
+    assert v.viable and v.text == text
+    fed, received = v.consumed()
+    assert fed <= received == len(text)
+    parser.parse(text)
+
+
+@pytest.mark.parametrize(
+    "parser_fn, text",
+    [(cfg_math._parser, t) for t in MATH_DEAD] + [(cfg_sql._parser, t) for t in SQL_DEAD],
+)
+def test_dead_prefixes_are_rejected(parser_fn, text: str) -> None:
+    parser = parser_fn()
+    v = _feed_chars(parser, text)
+    assert not v.viable and v.error
+    # Once dead, more text does not revive it
+    assert not v.feed(" 1")
+    assert not PrefixValidator(parser).feed(text)
+
+
+def test_delta_callback_abort() -> None:
+    v = PrefixValidator(cfg_math._parser())
+    assert v.delta_callback(abort=True)("* ") is False
+    w = PrefixValidator(cfg_math._parser())
+    assert w.delta_callback(abort=False)("* ") is True
+    assert not w.viable
+
+
+@pytest.mark.parametrize(
+    "pattern, expected",
+    [
+        ("[0-9]+", frozenset("0123456789")),
+        ("(?:[0-9])+", frozenset("0123456789")),
+        ("[a-c]", frozenset("abc")),
+        ("'[^']*'", frozenset("'")),
+        ("a|bc", frozenset("ab")),
+        ("(?:x)y", frozenset("x")),
+        # Unknown: negated sets, categories, optional starts, any char
+        ("[^a]", None),
+        (r"\d+", None),
+        ("x*", None),
+        (".", None),
+    ],
+)
+def test_first_chars(pattern: str, expected) -> None:
+    assert _first_chars(pattern) == expected
+
+
+def test_prefix_tables() -> None:
+    t = _PrefixTables(cfg_sql._parser())
+    assert t.longest == len("user_id")
+    assert t.regex_starts == frozenset("0123456789' \t")
+    for rest in ("SEL", "SELECT", "<", "<=", "us"):
+        assert t.may_extend(rest) and t.may_start(rest)
+    for rest in ("SELECTX", ">= 3", "user_ids"):
+        assert not t.may_extend(rest)
+    assert t.may_start("'abc") and t.may_start("9")
+    assert not t.may_start("x") and not t.may_start("#")
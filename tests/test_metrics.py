@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import pytest
+
+from lib.metrics import wilson_interval
+
+
+@pytest.mark.parametrize(
+    "passes, n, expected",
+    [
+        (0, 0, (0.0, 1.0)),
+        (0, 10, (0.0, 0.2775)),
+        (10, 10, (0.7225, 1.0)),
+        (5, 10, (0.2366, 0.7634)),
+        (1, 1, (0.2065, 1.0)),
+        (81, 100, (0.7222, 0.8749)),
+    ],
+)
+def test_wilson_interval(passes: int, n: int, expected) -> None:
+    lo, hi = wilson_interval(passes, n)
+    assert (lo, hi) == pytest.approx(expected, abs=1e-4)
+    assert 0.0 <= lo <= hi <= 1.0
+    if n:
+        assert lo <= passes / n <= hi
+
+
+def test_wilson_interval_narrows_with_more_samples() -> None:
+    lo10, hi10 = wilson_interval(8, 10)
+    lo100, hi100 = wilson_interval(80, 100)
+    assert hi100 - lo100 < hi10 - lo10
+
+
+def test_wilson_interval_wider_with_larger_z() -> None:
+    lo, hi = wilson_interval(5, 10, z=1.0)
+    lo2, hi2 = wilson_interval(5, 10, z=2.576)
+    assert lo2 < lo and hi2 > hi
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import time
+from types import SimpleNamespace
+
+from experiments import cfg_math, cfg_sql
+from lib.grammar import PrefixValidator
+from lib.openai_client import RequestStats, TokenUsage, _StreamReader, aborted_usage
+from lib.pricing import Spend
+from lib.rate_limit import approx_tokens, request_chars
+
+
+def _delta(text: str) -> SimpleNamespace:
+    return SimpleNamespace(type="response.custom_tool_call_input.delta", delta=text)
+
+
+def _completed(input_tokens: int, output_tokens: int) -> SimpleNamespace:
+    usage = SimpleNamespace(
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        input_tokens_details=SimpleNamespace(cached_tokens=0),
+        output_tokens_details=SimpleNamespace(reasoning_tokens=0),
+    )
+    return SimpleNamespace(type="response.completed", response=SimpleNamespace(usage=usage))
+
+
+def test_stream_reader_counts_deltas_until_abort() -> None:
+    stats = RequestStats()
+    validator = PrefixValidator(cfg_math._parser())
+    reader = _StreamReader(validator.delta_callback(abort=True), stats, time.perf_counter())
+    # ")" is only known to be wrong once more text follows it
+    events = [_delta("1 +"), _delta(" )"), _delta(" 2"), _delta(" 3"), _completed(50, 4)]
+    handled = 0
+    for event in events:
+        handled += 1
+        if not reader.handle(event):
+            break
+    assert stats.aborted and handled == 3
+    assert stats.deltas == 3 and stats.usage is None
+    assert reader.result() is None
+
+
+def test_aborted_usage_is_estimated_without_the_final_event() -> None:
+    inp, tools = cfg_sql._sql_request("users over 30")
+    stats = RequestStats(aborted=True, deltas=7)
+    usage, estimated = aborted_usage(stats, inp, tools)
+    assert estimated
+    assert usage == TokenUsage(input_tokens=approx_tokens(request_chars(inp, tools)), output_tokens=7)
+
+
+def test_aborted_usage_is_exact_once_the_final_event_arrived() -> None:
+    stats = RequestStats(aborted=True, deltas=7)
+    reader = _StreamReader(None, stats, time.perf_counter())
+    reader.handle(_completed(1200, 9))
+    usage, estimated = aborted_usage(stats, "x")
+    assert not estimated
+    assert (usage.input_tokens, usage.output_tokens, usage.cached_tokens) == (1200, 9, 0)
+
+
+def test_aborted_results_carry_billable_usage() -> None:
+    stats = RequestStats(aborted=True, deltas=5)
+    validator = PrefixValidator(cfg_math._parser())
+    validator.feed("1 + ) 2")
+    math = cfg_math._aborted_math_result("one plus", 1.0, "gpt-5", validator, stats)
+    sql_validator = PrefixValidator(cfg_sql._parser())
+    sql_validator.feed("SELECT FROM ")
+    sql = cfg_sql._aborted_sql_result("all users", "gpt-5", None, sql_validator, stats)
+    for r in (math, sql):
+        assert r.aborted and r.usage_estimated
+        assert r.usage_output_tokens == 5 and r.usage_input_tokens > 0
+        spend = Spend()
+        spend.add_result("gpt-5", r)
+        assert spend.tokens == r.usage_input_tokens + 5 and spend.usd > 0
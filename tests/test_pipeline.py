@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Any, Dict, Iterator, List
+
+import pytest
+
+from experiments import pipeline
+from experiments.pipeline import PipelineConfig, configure_pipeline, current_pipeline
+from experiments.suite import _run_suite_async
+
+
+@pytest.fixture
+def small_pipeline() -> Iterator[None]:
+    configure_pipeline(PipelineConfig(validate_workers=1, execute_workers=1, queue_size=1))
+    yield
+    configure_pipeline(PipelineConfig())
+
+
+def _run(arun: Any, n: int, concurrency: int, rows: Dict[Any, Any]) -> None:
+    pairs = [("m", i, (i,)) for i in range(n)]
+    asyncio.run(
+        _run_suite_async(
+            pairs, n, arun, concurrency, "test", 0, lambda i, row: rows.__setitem__(i, row)
+        )
+    )
+
+
+def test_full_execute_stage_stalls_generation(small_pipeline: None) -> None:
+    gate = threading.Event()
+    started: List[int] = []
+
+    async def arun(model: str, case: tuple) -> int:
+        started.append(case[0])
+        pipe = current_pipeline()
+        assert pipe is not None
+        await pipe.validate.submit(lambda: None)
+        await pipe.execute.submit(gate.wait, handoff=True)
+        return case[0]
+
+    rows: Dict[Any, Any] = {}
+    runner = threading.Thread(target=_run, args=(arun, 50, 2, rows))
+    runner.start()
+    try:
+        time.sleep(0.5)
+        # One executing, one queued for execution, and the two slots each
+        # holding a pair that waits for room in the execute queue
+        assert len(started) == 4
+    finally:
+        gate.set()
+        runner.join(10)
+    assert not runner.is_alive()
+    assert sorted(rows) == list(range(50))
+    assert [row[2] for _, row in sorted(rows.items())] == list(range(50))
+
+
+def test_slot_is_freed_at_the_last_handoff(small_pipeline: None) -> None:
+    gate = threading.Event()
+    started: List[int] = []
+
+    async def arun(model: str, case: tuple) -> int:
+        started.append(case[0])
+        pipe = current_pipeline()
+        assert pipe is not None
+        await pipe.execute.submit(gate.wait, handoff=True)
+        return case[0]
+
+    rows: Dict[Any, Any] = {}
+    runner = threading.Thread(target=_run, args=(arun, 10, 1, rows))
+    runner.start()
+    try:
+        time.sleep(0.5)
+        # With one slot, a second pair only starts because the first freed it
+        assert len(started) == 3
+    finally:
+        gate.set()
+        runner.join(10)
+    assert sorted(rows) == list(range(10))
+
+
+def test_stage_passes_base_exceptions_to_the_submitter() -> None:
+    async def main() -> None:
+        stage = pipeline.Stage("t", 1, 1)
+        try:
+
+            def boom() -> None:
+                raise KeyboardInterrupt
+
+            with pytest.raises(KeyboardInterrupt):
+                await stage.submit(boom)
+            # The worker survived and still serves items
+            assert await stage.submit(lambda: 42) == 42
+        finally:
+            stage.close()
+
+    asyncio.run(main())
+
+
+def test_close_stops_workers_with_more_workers_than_queue_room() -> None:
+    async def main() -> List[threading.Thread]:
+        stage = pipeline.Stage("t", 4, 1)
+        assert await stage.submit(lambda: 1) == 1
+        stage.close()
+        with pytest.raises(RuntimeError):
+            await stage.submit(lambda: 2)
+        return stage._threads
+
+    threads = asyncio.run(main())
+    for t in threads:
+        t.join(5)
+        assert not t.is_alive()
+
+
+@pytest.mark.parametrize(
+    "spec, expected",
+    [
+        ("2,4", PipelineConfig(2, 4, 64)),
+        ("1,8,16", PipelineConfig(1, 8, 16)),
+        ("off", PipelineConfig(0, 0)),
+    ],
+)
+def test_parse_config(spec: str, expected: PipelineConfig) -> None:
+    assert PipelineConfig.parse(spec) == expected
+
+
+@pytest.mark.parametrize("spec", ["", "2", "2,0", "a,b", "1,2,3,4"])
+def test_parse_config_rejects(spec: str) -> None:
+    with pytest.raises(ValueError):
+        PipelineConfig.parse(spec)
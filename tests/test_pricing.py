@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from experiments import cfg_math
+from experiments.report import usage_report_lines
+from lib.openai_client import configure_cache
+from lib.pricing import PRICES, Budget, Price, Spend, cache_savings_usd, cost_usd, price_for
+from lib.response_cache import request_key
+
+
+@pytest.mark.parametrize(
+    "spec, expected",
+    [
+        ("500k", Budget(tokens=500_000)),
+        ("2M", Budget(tokens=2_000_000)),
+        ("2M tokens", Budget(tokens=2_000_000)),
+        ("1.5k tok", Budget(tokens=1_500)),
+        ("200000", Budget(tokens=200_000)),
+        ("$5", Budget(usd=5.0)),
+        ("$ 0.50", Budget(usd=0.5)),
+        ("5usd", Budget(usd=5.0)),
+        ("5 USD", Budget(usd=5.0)),
+        ("2.5$", Budget(usd=2.5)),
+    ],
+)
+def test_budget_parse(spec: str, expected: Budget) -> None:
+    assert Budget.parse(spec) == expected
+
+
+@pytest.mark.parametrize("spec", ["", "five dollars", "5g", "$", "-5", "5 eur"])
+def test_budget_parse_rejects(spec: str) -> None:
+    with pytest.raises(ValueError):
+        Budget.parse(spec)
+
+
+@pytest.mark.parametrize(
+    "model, expected",
+    [
+        ("gpt-5", "gpt-5"),
+        ("gpt-5-mini", "gpt-5-mini"),
+        # Dated snapshots resolve to the longest matching prefix
+        ("gpt-5-2025-08-07", "gpt-5"),
+        ("gpt-5-mini-2025-08-07", "gpt-5-mini"),
+        ("gpt-5-nano-2025-08-07", "gpt-5-nano"),
+        # A prefix only counts up to a "-"
+        ("gpt-5x", None),
+        ("gpt-4o", None),
+        ("", None),
+        (None, None),
+    ],
+)
+def test_price_for(model, expected) -> None:
+    assert price_for(model) == (PRICES[expected] if expected else None)
+
+
+def test_price_for_prefers_longest_prefix(monkeypatch) -> None:
+    monkeypatch.setitem(PRICES, "gpt-5-mini-2025", Price(input=9.0, cached_input=9.0, output=9.0))
+    assert price_for("gpt-5-mini-2025-08-07") == PRICES["gpt-5-mini-2025"]
+    assert price_for("gpt-5-mini-2026-01-01") == PRICES["gpt-5-mini"]
+
+
+@pytest.mark.parametrize(
+    "model, inp, out, cached, expected",
+    [
+        ("gpt-5", 1_000_000, 0, None, 1.25),
+        ("gpt-5", 0, 1_000_000, None, 10.0),
+        ("gpt-5-mini-2025-08-07", 1_000_000, 1_000_000, None, 2.25),
+        # Cached input is billed at the cached rate
+        ("gpt-5", 1_000_000, 0, 400_000, 0.6 * 1.25 + 0.4 * 0.125),
+        # Never more cached tokens than input tokens
+        ("gpt-5-nano", 1_000, 0, 5_000, 1_000 * 0.005 / 1_000_000),
+        ("gpt-5", None, 10, None, None),
+        ("gpt-5", 10, None, None, None),
+        ("unknown-model", 10, 10, None, None),
+    ],
+)
+def test_cost_usd(model, inp, out, cached, expected) -> None:
+    got = cost_usd(model, inp, out, cached)
+    if expected is None:
+        assert got is None
+    else:
+        assert got == pytest.approx(expected)
+
+
+def test_cache_savings_usd() -> None:
+    assert cache_savings_usd("gpt-5", 1_000_000) == pytest.approx(1.125)
+    assert cache_savings_usd("gpt-5", None) is None
+    assert cache_savings_usd("unknown-model", 100) is None
+
+
+def test_spend_counts_cache_hits_apart() -> None:
+    spend = Spend(Budget(tokens=100))
+    spend.add("gpt-5", 1_000, 1_000, from_cache=True)
+    m = spend.models["gpt-5"]
+    assert (m.calls, m.cache_hits, spend.tokens, spend.usd) == (0, 1, 0, 0.0)
+    assert not spend.exhausted()
+    spend.add("gpt-5", 60, 40)
+    assert (m.calls, spend.tokens) == (1, 100)
+    assert spend.exhausted()
+
+
+@pytest.fixture
+def replay_cache(tmp_path):
+    cache = configure_cache("replay", str(tmp_path / "responses.sqlite"))
+    try:
+        yield cache
+    finally:
+        configure_cache("off")
+
+
+def test_cache_hit_uses_no_budget(replay_cache) -> None:
+    prompt, model = "add four plus four", "gpt-5-mini"
+    inp, tools = cfg_math._math_request(prompt)
+    payload = {
+        "id": "resp_1",
+        "object": "response",
+        "model": "gpt-5-mini-2025-08-07",
+        "output": [
+            {"type": "custom_tool_call", "id": "ctc_1", "call_id": "call_1",
+             "name": "math_exp", "input": "4 + 4", "status": "completed"}
+        ],
+        "usage": {"input_tokens": 900, "output_tokens": 300, "total_tokens": 1200},
+    }
+    stored = SimpleNamespace(model_dump_json=lambda: json.dumps(payload))
+    replay_cache.put(request_key(model, inp, tools), model, stored)
+
+    r = cfg_math.run_cfg_math(prompt, 8, model=model)
+    assert r.from_cache and r.value == 8
+    spend = Spend(Budget(tokens=1))
+    spend.add_result(model, r)
+    assert spend.tokens == 0 and spend.usd == 0.0 and not spend.exhausted()
+    assert spend.models[model].cache_hits == 1
+
+    lines = usage_report_lines([(model, (prompt, 8), r, 0.01)])
+    assert f"| {model} | 0 | 0 | 0 | 0 | 0 | 0.0000 |" in lines
+    assert f"Served from the response cache, not billed: {model} 1." in lines
+
+
+def test_stored_cache_hit_costs_nothing() -> None:
+    from experiments.cfg_math import MathRunResult
+    from experiments.checkpoint import result_to_dict
+    from experiments.results_store import _row
+
+    res = MathRunResult("p", "4 + 4", True, 8.0, 8.0, model="gpt-5", usage_input_tokens=900,
+                        usage_output_tokens=300)
+    rec = {"model": "gpt-5", "case_index": 0, "case": ["p", 8], "seconds": 0.1}
+    billed = _row("run", "math", {**rec, "result": result_to_dict(res)})
+    res.from_cache = True
+    replayed = _row("run", "math", {**rec, "result": result_to_dict(res)})
+    # cost_usd is the 14th column
+    assert billed[13] == pytest.approx(cost_usd("gpt-5", 900, 300))
+    assert replayed[13] == 0.0
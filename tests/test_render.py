@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import io
+from dataclasses import dataclass, field, fields, is_dataclass
+from types import SimpleNamespace
+from typing import Any, Dict
+
+import pytest
+from rich.console import Console
+
+from lib import render
+
+
+@pytest.fixture
+def output(monkeypatch: pytest.MonkeyPatch) -> io.StringIO:
+    buf = io.StringIO()
+    monkeypatch.setattr(render, "_console", Console(file=buf, width=120))
+    return buf
+
+
+def test_show_math_result(output: io.StringIO) -> None:
+    render.show_math_result("2 + 3 * 4")
+    assert "Expression" in output.getvalue()
+    assert "14" in output.getvalue()
+
+
+def test_show_arith_validation(output: io.StringIO) -> None:
+    render.show_arith_validation("add four plus four", "4 + 4", True, 8.0, 8.0)
+    text = output.getvalue()
+    assert "CFG Math Validation" in text
+    assert "pass" in text
+
+
+def test_show_sql_validation(output: io.StringIO) -> None:
+    render.show_sql_validation(
+        "users over 30",
+        "SELECT id FROM users WHERE age > 30 LIMIT 3",
+        True,
+        False,
+        ["id"],
+        0,
+        "no such table: users",
+        expected_rows=3,
+    )
+    text = output.getvalue()
+    assert "CFG SQL Validation" in text
+    assert "no such table" in text
+    assert "fail" in text
+
+
+def test_show_run_stats(output: io.StringIO) -> None:
+    render.show_run_stats(
+        "gpt-5", 1.25, 120, 30, {"api": 1.2, "parse": 0.001}, cached_tokens=64, reasoning_tokens=8
+    )
+    text = output.getvalue()
+    assert "cached=64" in text
+    assert "api=1.200" in text
+
+
+def test_show_custom_tool_calls(output: io.StringIO) -> None:
+    call = SimpleNamespace(type="custom_tool_call", name="sql_query", input="SELECT 1", status="completed")
+    render.show_custom_tool_calls(SimpleNamespace(output=[call]))
+    assert "sql_query" in output.getvalue()
+
+
+def test_print_helpers(output: io.StringIO) -> None:
+    render.print_text("hello")
+    render.print_markdown("## Heading\n\n| a | b |\n|---|---|\n| 1 | 2 |")
+    assert "hello" in output.getvalue()
+    assert "Heading" in output.getvalue()
+
+
+@dataclass
+class _Usage:
+    input_tokens: int = 120
+    output_tokens: int = 30
+
+
+@dataclass
+class _Run:
+    model: str = "gpt-5"
+    usage: _Usage = field(default_factory=_Usage)
+    timings: Dict[str, float] = field(default_factory=lambda: {"api": 1.2})
+
+
+def _dataclass_table(obj: Any) -> Any:
+    # Each nested dataclass gets its own field table inside the parent's
+    table = render._fields_table()
+    for f in fields(obj):
+        value = getattr(obj, f.name)
+        table.add_row(f.name, _dataclass_table(value) if is_dataclass(value) else str(value))
+    return table
+
+
+def test_nested_dataclass_renders(output: io.StringIO) -> None:
+    # _fields_table once called itself; building nested tables must terminate
+    outer = render._fields_table()
+    assert outer is not render._fields_table()
+    assert [c.header for c in outer.columns] == ["Field", "Value"]
+
+    render._print_panel(_dataclass_table(_Run()), "Run", "blue")
+    text = output.getvalue()
+    assert "gpt-5" in text
+    assert "input_tokens" in text and "120" in text
+    assert "{'api': 1.2}" in text
+
+
+def test_suite_result_renders_like_the_cli(output: io.StringIO) -> None:
+    from experiments.cfg_sql import SqlRunResult
+
+    res = SqlRunResult(
+        "users over 30", "SELECT id FROM users", True, True, ["id"], [(1,)], None,
+        model="gpt-5", usage_input_tokens=100, usage_output_tokens=5, expected_rows=1,
+        row_count=1, timings={"api": 0.5, "execute": 0.001},
+    )
+    render.show_sql_validation(
+        res.prompt, res.query, res.parsed_ok, res.executed_ok, list(res.columns),
+        res.row_count, res.error, res.expected_rows, truncated=res.truncated,
+    )
+    render.show_run_stats(res.model, 0.6, res.usage_input_tokens, res.usage_output_tokens, res.timings)
+    text = output.getvalue()
+    assert "pass" in text and "execute=0.001" in text
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import sqlite3
+from typing import List, Tuple
+
+import pytest
+
+from experiments.cfg_math import MathRunResult
+from experiments.checkpoint import Checkpoint, checkpoint_path
+from experiments.results_store import ResultsStore, compare_lines
+from lib.pricing import cost_usd
+
+# (model, case_index, passed, seconds)
+Pair = Tuple[str, int, bool, float]
+
+
+def _result(i: int, passed: bool) -> MathRunResult:
+    return MathRunResult(
+        prompt=f"case {i}",
+        expression=f"{i} + 1",
+        parsed_ok=True,
+        value=float(i + 1) if passed else float(i),
+        expected=float(i + 1),
+        model="gpt-5",
+        usage_input_tokens=100,
+        usage_output_tokens=10,
+    )
+
+
+def _append(ckpt: Checkpoint, pairs: List[Pair]) -> None:
+    for model, i, passed, sec in pairs:
+        ckpt.append(i, (model, (f"case {i}", float(i + 1)), _result(i, passed), sec))
+
+
+def _checkpoint(out_dir, run_id: str, pairs: List[Pair]) -> Checkpoint:
+    ckpt = Checkpoint.create(checkpoint_path(out_dir, run_id), {"run_id": run_id, "kind": "math"})
+    _append(ckpt, pairs)
+    return ckpt
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = ResultsStore(tmp_path / "results.sqlite")
+    yield s
+    s.close()
+
+
+def test_import_is_incremental(tmp_path, store) -> None:
+    ckpt = _checkpoint(tmp_path, "r1", [("a", 0, True, 1.0), ("a", 1, False, 2.0)])
+    assert store.import_checkpoint(ckpt.path) == ("r1", 2)
+    assert store.import_checkpoint(ckpt.path) == ("r1", 0)
+    _append(ckpt, [("a", 2, True, 3.0)])
+    assert store.import_checkpoint(ckpt.path) == ("r1", 1)
+    ckpt.close()
+    assert store.summary("r1")["a"].n == 3
+    assert [r["case_index"] for r in store.records("r1")] == [0, 1, 2]
+
+
+def test_torn_final_line_waits_for_the_rest(tmp_path, store) -> None:
+    ckpt = _checkpoint(tmp_path, "r1", [("a", 0, True, 1.0)])
+    ckpt.close()
+    whole = ckpt.path.read_bytes()
+    _append(Checkpoint.open(ckpt.path), [("a", 1, True, 1.0)])
+    line = ckpt.path.read_bytes()[len(whole):]
+    ckpt.path.write_bytes(whole + line[:10])
+    assert store.import_checkpoint(ckpt.path) == ("r1", 1)
+    ckpt.path.write_bytes(whole + line)
+    assert store.import_checkpoint(ckpt.path) == ("r1", 1)
+    assert store.summary("r1")["a"].n == 2
+
+
+def test_rewritten_checkpoint_of_equal_or_larger_size_is_reimported(tmp_path, store) -> None:
+    path = _checkpoint(tmp_path, "r1", [("a", 0, False, 1.0), ("a", 1, False, 1.0)]).path
+    store.import_checkpoint(path)
+    assert store.summary("r1")["a"].passes == 0
+    # Same run id, same number of bytes, different records
+    path.unlink()
+    ckpt = _checkpoint(tmp_path, "r1", [("a", 0, True, 1.0), ("a", 1, True, 1.0)])
+    ckpt.close()
+    assert store.import_checkpoint(path) == ("r1", 2)
+    assert store.summary("r1")["a"].passes == 2
+    # Larger: another record is in front of the old offset
+    path.unlink()
+    ckpt = _checkpoint(tmp_path, "r1", [("b", 0, True, 1.0), ("a", 0, False, 1.0), ("a", 1, True, 1.0)])
+    ckpt.close()
+    assert store.import_checkpoint(path) == ("r1", 3)
+    assert {m: s.passes for m, s in store.summary("r1").items()} == {"a": 1, "b": 1}
+
+
+def test_store_without_fingerprint_column_is_upgraded(tmp_path) -> None:
+    db = tmp_path / "old.sqlite"
+    con = sqlite3.connect(db)
+    con.execute(
+        "CREATE TABLE runs (run_id TEXT PRIMARY KEY, kind TEXT NOT NULL, header_json TEXT NOT NULL, "
+        "checkpoint TEXT, imported_bytes INTEGER NOT NULL DEFAULT 0, updated_at REAL NOT NULL)"
+    )
+    con.close()
+    store = ResultsStore(db)
+    ckpt = _checkpoint(tmp_path, "r1", [("a", 0, True, 1.0)])
+    assert store.import_checkpoint(ckpt.path) == ("r1", 1)
+    ckpt.close()
+    store.close()
+
+
+def test_run_models_follow_inserts_updates_and_deletes(tmp_path, store) -> None:
+    ckpt = _checkpoint(
+        tmp_path, "r1", [("a", i, i % 2 == 0, float(i + 1)) for i in range(10)] + [("b", 0, True, 5.0)]
+    )
+    store.import_checkpoint(ckpt.path)
+    a = store.summary("r1")["a"]
+    assert (a.n, a.passes, a.seconds_sum, a.tokens) == (10, 5, 55.0, 1100)
+    assert a.cost_usd == pytest.approx(10 * cost_usd("gpt-5", 100, 10))
+    assert (a.p50_s, a.p90_s) == (5.0, 9.0)
+    assert a.pass_rate == 0.5 and a.mean_s == 5.5
+
+    # The last record of a pair wins and the aggregates follow it
+    _append(ckpt, [("a", 1, True, 21.0)])
+    ckpt.close()
+    assert store.import_checkpoint(ckpt.path) == ("r1", 1)
+    a = store.summary("r1")["a"]
+    assert (a.n, a.passes, a.seconds_sum, a.p90_s) == (10, 6, 74.0, 10.0)
+
+    store._con.execute("DELETE FROM results WHERE run_id = 'r1' AND model = 'b'")
+    assert set(store.summary("r1")) == {"a"}
+    assert store._read("SELECT n, passes, tokens FROM run_models WHERE model = 'b'") == [(0, 0, 0)]
+
+
+def _two_runs(tmp_path, store) -> None:
+    for run_id, pairs in (
+        ("r1", [("a", 0, True, 1.0), ("a", 1, True, 1.0), ("a", 2, False, 1.0), ("b", 0, True, 2.0)]),
+        ("r2", [("a", 0, True, 3.0), ("a", 1, False, 3.0), ("a", 2, True, 3.0), ("c", 0, True, 1.0)]),
+    ):
+        ckpt = _checkpoint(tmp_path, run_id, pairs)
+        ckpt.close()
+        store.import_checkpoint(ckpt.path)
+
+
+def test_case_deltas(tmp_path, store) -> None:
+    _two_runs(tmp_path, store)
+    shared, changed, deltas = store.case_deltas("r1", "r2")
+    assert (shared, changed) == (3, 2)
+    assert sorted((d.model, d.case_index, d.rate_a, d.rate_b) for d in deltas) == [
+        ("a", 1, 1.0, 0.0),
+        ("a", 2, 0.0, 1.0),
+    ]
+    assert {d.prompt for d in deltas} == {"case 1", "case 2"}
+    assert len(store.case_deltas("r1", "r2", limit=1)[2]) == 1
+
+
+def test_compare_lines(tmp_path, store) -> None:
+    _two_runs(tmp_path, store)
+    summary = compare_lines(store, "r1", "r2", top=0)
+    assert summary[0] == "# Compare r1 -> r2 (math)"
+    rows = {line.split(" | ")[0]: line for line in summary[4:]}
+    assert set(rows) == {"| a", "| b", "| c"}
+    assert "| 3 → 3 | 66.7% → 66.7% | +0.0 pp | 1.00 → 3.00 | +2.00 |" in rows["| a"]
+    assert "| 1 → 0 | 100.0% →  |" in rows["| b"]
+    assert "| 0 → 1 |  → 100.0% |" in rows["| c"]
+
+    lines = compare_lines(store, "r1", "r2")
+    assert lines[: len(summary)] == summary
+    assert "Shared (model, case) pairs: 3, pass rate changed: 2" in lines
+    assert "| a | 1 | case 1 | 100% → 0% | -100 pp |" in lines
+
+
+def test_compare_lines_rejects_different_kinds(tmp_path, store) -> None:
+    _two_runs(tmp_path, store)
+    ckpt = Checkpoint.create(checkpoint_path(tmp_path, "s1"), {"run_id": "s1", "kind": "sql"})
+    ckpt.close()
+    store.import_checkpoint(ckpt.path)
+    with pytest.raises(ValueError):
+        compare_lines(store, "r1", "s1")
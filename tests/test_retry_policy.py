@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+import pytest
+
+from lib.retry_policy import retry_after
+
+
+def _exc(headers: Optional[Dict[str, str]]) -> Exception:
+    e = Exception("rate limited")
+    e.response = SimpleNamespace(headers=headers)  # type: ignore[attr-defined]
+    return e
+
+
+def _http_date(delta_s: float) -> str:
+    return format_datetime(datetime.now(timezone.utc) + timedelta(seconds=delta_s), usegmt=True)
+
+
+@pytest.mark.parametrize(
+    "headers, expected",
+    [
+        ({"retry-after": "7"}, 7.0),
+        ({"retry-after": "1.5"}, 1.5),
+        ({"retry-after-ms": "250"}, 0.25),
+        # The ms form is more precise and wins
+        ({"retry-after-ms": "1500", "retry-after": "2"}, 1.5),
+        ({"retry-after-ms": "soon", "retry-after": "2"}, 2.0),
+        # Rate-limit reset durations, the longer of the two
+        ({"x-ratelimit-reset-requests": "1s", "x-ratelimit-reset-tokens": "6m0s"}, 360.0),
+        ({"x-ratelimit-reset-tokens": "20ms"}, 0.02),
+        ({"x-ratelimit-reset-requests": "1h2m3.5s"}, 3723.5),
+        ({"retry-after": "later"}, None),
+        ({"x-ratelimit-reset-requests": "never"}, None),
+        ({}, None),
+        (None, None),
+    ],
+)
+def test_retry_after(headers, expected) -> None:
+    assert retry_after(_exc(headers)) == (None if expected is None else pytest.approx(expected))
+
+
+def test_retry_after_http_date() -> None:
+    assert retry_after(_exc({"retry-after": _http_date(30)})) == pytest.approx(30, abs=2)
+    # A date in the past means retry now
+    assert retry_after(_exc({"retry-after": _http_date(-30)})) == 0.0
+
+
+def test_retry_after_without_response() -> None:
+    assert retry_after(ValueError("no response")) is None
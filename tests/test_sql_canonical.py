@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import pytest
+
+from experiments import cfg_sql
+from experiments.sql_canonical import canonical_sql
+
+
+def canon(query: str) -> str:
+    return canonical_sql(cfg_sql._canonical_parser().parse(query), cfg_sql.SQL_COLUMNS)
+
+
+@pytest.mark.parametrize(
+    "a, b",
+    [
+        # Whitespace and leading zeros
+        ("SELECT id FROM users WHERE age > 030 LIMIT 03", "SELECT id  FROM users WHERE age>30 LIMIT 3"),
+        # Unambiguous columns get qualified
+        ("SELECT id, name FROM users", "SELECT users.id, users.name FROM users"),
+        ("SELECT name, amount FROM users JOIN orders ON users.id = orders.user_id",
+         "SELECT users.name, orders.amount FROM users JOIN orders ON users.id = orders.user_id"),
+        # AND/OR operand order
+        ("SELECT id FROM users WHERE city = 'Tokyo' AND age > 30",
+         "SELECT id FROM users WHERE age > 30 AND city = 'Tokyo'"),
+        ("SELECT id FROM users WHERE age < 10 OR age > 30",
+         "SELECT id FROM users WHERE age > 30 OR age < 10"),
+        # Nested groups of the same operator flatten, repeats collapse
+        ("SELECT id FROM users WHERE (age > 30 AND city = 'Tokyo') AND age > 30",
+         "SELECT id FROM users WHERE city = 'Tokyo' AND age > 30"),
+        ("SELECT id FROM users WHERE age = 1 OR (age = 2 OR age = 3)",
+         "SELECT id FROM users WHERE (age = 3 OR age = 1) OR age = 2"),
+        # Double negation and redundant parentheses
+        ("SELECT id FROM users WHERE NOT NOT age > 30", "SELECT id FROM users WHERE age > 30"),
+        ("SELECT id FROM users WHERE NOT (NOT age > 30)", "SELECT id FROM users WHERE ((age > 30))"),
+        # JOIN ... ON sides
+        ("SELECT users.name FROM users JOIN orders ON orders.user_id = users.id",
+         "SELECT users.name FROM users JOIN orders ON users.id = orders.user_id"),
+    ],
+)
+def test_equivalent_queries_canonicalize_the_same(a: str, b: str) -> None:
+    assert canon(a) == canon(b)
+
+
+@pytest.mark.parametrize(
+    "a, b",
+    [
+        # Select list order decides the result columns
+        ("SELECT id, name FROM users", "SELECT name, id FROM users"),
+        # Precedence: AND binds tighter than OR
+        ("SELECT id FROM users WHERE (age > 30 OR age < 10) AND city = 'Tokyo'",
+         "SELECT id FROM users WHERE age > 30 OR age < 10 AND city = 'Tokyo'"),
+        # NOT over a group is not NOT over its first operand
+        ("SELECT * FROM users WHERE NOT (age > 30 AND city = 'Tokyo')",
+         "SELECT * FROM users WHERE NOT age > 30 AND city = 'Tokyo'"),
+        # A single NOT is kept
+        ("SELECT id FROM users WHERE NOT age > 30", "SELECT id FROM users WHERE age > 30"),
+        # Different operators, values and limits
+        ("SELECT id FROM users WHERE age > 30", "SELECT id FROM users WHERE age >= 30"),
+        ("SELECT id FROM users WHERE city = 'Tokyo'", "SELECT id FROM users WHERE city = 'tokyo'"),
+        ("SELECT id FROM users LIMIT 3", "SELECT id FROM users LIMIT 4"),
+        ("SELECT id FROM users", "SELECT id FROM users LIMIT 3"),
+        # Table order is kept
+        ("SELECT * FROM users JOIN orders ON users.id = orders.user_id",
+         "SELECT * FROM orders JOIN users ON users.id = orders.user_id"),
+    ],
+)
+def test_different_queries_canonicalize_differently(a: str, b: str) -> None:
+    assert canon(a) != canon(b)
+
+
+def test_canonical_text() -> None:
+    assert canon(
+        "SELECT name FROM users WHERE NOT (city = 'Tokyo' OR city = 'Kyoto') AND age >= 033 LIMIT 010"
+    ) == (
+        "SELECT users.name FROM users WHERE NOT (users.city = 'Kyoto' OR users.city = 'Tokyo') "
+        "AND users.age >= 33 LIMIT 10"
+    )
+
+
+def test_column_in_two_tables_stays_unqualified() -> None:
+    # `id` exists in both users and orders
+    assert canon("SELECT id FROM users JOIN orders ON users.id = orders.user_id") == (
+        "SELECT id FROM users JOIN orders ON orders.user_id = users.id"
+    )
+
+
+def test_self_join_leaves_columns_unqualified() -> None:
+    # With users twice in scope even users-only columns are ambiguous
+    assert canon("SELECT name FROM users JOIN users ON users.id = users.id WHERE age > 3") == (
+        "SELECT name FROM users JOIN users ON users.id = users.id WHERE age > 3"
+    )
+
+
+def test_qualified_column_is_kept_as_written() -> None:
+    # Qualification is never removed or moved to another table
+    assert canon("SELECT orders.id FROM users JOIN orders ON users.id = orders.user_id") == (
+        "SELECT orders.id FROM users JOIN orders ON orders.user_id = users.id"
+    )
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from experiments import work_queue
+from experiments.cfg_math import MathRunResult
+from experiments.work_queue import DONE, FAILED, LEASED, PENDING, WorkerStats, WorkQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = WorkQueue(tmp_path / "run.queue.sqlite")
+    q.set_header({"run_id": "r1", "kind": "math"})
+    q.enqueue(["a", "b"], [(0, ("one", 1.0)), (1, ("two", 2.0))])
+    yield q
+    q.close()
+
+
+def _state(q: WorkQueue, task_id: int) -> tuple:
+    return q._read("SELECT state, worker, attempts, error FROM tasks WHERE id = ?", (task_id,))[0]
+
+
+def test_enqueue_skips_known_pairs(queue) -> None:
+    assert queue.counts() == {PENDING: 4, LEASED: 0, DONE: 0, FAILED: 0}
+    assert queue.enqueue(["a", "b", "c"], [(0, ("one", 1.0))], skip={("c", 0)}) == 0
+    assert queue.enqueue(["c"], [(1, ("two", 2.0))]) == 1
+    assert sorted(queue.keys()) == [("a", 0), ("a", 1), ("b", 0), ("b", 1), ("c", 1)]
+
+
+def test_leased_tasks_are_not_claimed_twice(queue) -> None:
+    w1 = queue.claim("w1", n=3)
+    assert [(t.model, t.case_index, t.case, t.attempts) for t in w1] == [
+        ("a", 0, ("one", 1.0), 1),
+        ("b", 0, ("one", 1.0), 1),
+        ("a", 1, ("two", 2.0), 1),
+    ]
+    w2 = queue.claim("w2", n=3)
+    assert [(t.model, t.case_index) for t in w2] == [("b", 1)]
+    assert queue.claim("w2") == []
+
+
+def test_expired_lease_is_claimed_again(queue) -> None:
+    (task,) = queue.claim("w1", lease_s=-1.0)
+    (again,) = queue.claim("w2")
+    assert again.id == task.id and again.attempts == 2
+    assert _state(queue, task.id)[:2] == (LEASED, "w2")
+    # The first worker lost the lease: it can neither renew nor fail the task
+    queue.renew("w1", [task.id])
+    queue.fail("w1", task.id, "TimeoutError: late")
+    assert _state(queue, task.id) == (LEASED, "w2", 2, None)
+    # ...but its result is still taken if it finishes first
+    queue.complete(task.id, {"value": 1}, 0.5)
+    queue.complete(task.id, {"value": 2}, 0.7)
+    assert _state(queue, task.id)[0] == DONE
+    assert queue.completed_since(0)[0][4:] == ({"value": 1}, 0.5)
+
+
+def test_retry_then_fail(queue) -> None:
+    for attempt in (1, 2, 3):
+        (task,) = queue.claim("w1")
+        assert task.attempts == attempt
+        queue.fail("w1", task.id, f"RuntimeError: {attempt}", max_attempts=3)
+    assert _state(queue, task.id) == (FAILED, "w1", 3, "RuntimeError: 3")
+    assert queue.failures() == [("a", 0, "RuntimeError: 3")]
+    assert queue.retry_failed() == 1
+    assert _state(queue, task.id)[0] == PENDING
+    assert queue.claim("w2")[0].attempts == 1
+
+
+def test_release_does_not_count_the_attempt(queue) -> None:
+    tasks = queue.claim("w1", n=2)
+    queue.release("w2", [t.id for t in tasks])  # not the holder
+    assert queue.counts()[LEASED] == 2
+    queue.release("w1", [t.id for t in tasks])
+    assert queue.counts()[PENDING] == 4
+    assert queue.claim("w1")[0].attempts == 1
+
+
+def test_completion_order_and_finished(queue) -> None:
+    tasks = queue.claim("w1", n=4)
+    assert not queue.finished()
+    for t, sec in zip(reversed(tasks), (1.0, 2.0, 3.0, 4.0)):
+        queue.complete(t.id, {"i": t.id}, sec)
+    done = queue.completed_since(0)
+    assert [row[0] for row in done] == [1, 2, 3, 4]
+    assert [row[4]["i"] for row in done] == [t.id for t in reversed(tasks)]
+    assert [row[0] for row in queue.completed_since(2)] == [3, 4]
+    assert queue.finished()
+
+
+def test_stopped_flag(queue) -> None:
+    assert not queue.stopped()
+    queue.set_stopped(True)
+    assert queue.stopped()
+    queue.set_stopped(False)
+    assert not queue.stopped()
+    assert queue.header() == {"run_id": "r1", "kind": "math"}
+
+
+def _run_worker(queue: WorkQueue, monkeypatch, arun, **kw) -> WorkerStats:
+    monkeypatch.setattr(work_queue, "suite_runners", lambda header: (None, arun))
+    stats = WorkerStats()
+    args = dict(concurrency=2, worker="w1", lease_s=30.0, poll_s=0.01, wait=False, max_attempts=2)
+    asyncio.run(work_queue._work(queue, stats, **{**args, **kw}))
+    return stats
+
+
+def test_worker_runs_every_task(queue, monkeypatch) -> None:
+    async def arun(model, case):
+        return MathRunResult(case[0], str(case[1]), True, case[1], case[1], model=model)
+
+    stats = _run_worker(queue, monkeypatch, arun)
+    assert (stats.done, stats.failed) == (4, 0)
+    assert queue.counts()[DONE] == 4
+
+
+def test_worker_retries_then_fails(queue, monkeypatch) -> None:
+    async def arun(model, case):
+        if model == "b":
+            raise RuntimeError("boom")
+        return MathRunResult(case[0], str(case[1]), True, case[1], case[1], model=model)
+
+    stats = _run_worker(queue, monkeypatch, arun)
+    assert (stats.done, stats.failed) == (2, 4)
+    assert queue.failures() == [("b", 0, "RuntimeError: boom"), ("b", 1, "RuntimeError: boom")]
+
+
+def test_worker_stops_when_the_queue_is_stopped(queue, monkeypatch) -> None:
+    calls = []
+
+    async def arun(model, case):
+        calls.append((model, case))
+        return MathRunResult(case[0], str(case[1]), True, case[1], case[1], model=model)
+
+    queue.set_stopped(True)
+    stats = _run_worker(queue, monkeypatch, arun, wait=True)
+    assert calls == [] and stats.done == 0
+    # Claimed but unstarted tasks were handed back without using an attempt
+    assert queue.counts()[PENDING] == 4
+    assert queue._read("SELECT MAX(attempts) FROM tasks") == [(0,)]